@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+from tlang.interpreter.core import ValueInterpreter
+from tlang.interpreter.vm import BytecodeInterpreter
+from tlang.interpreter.primitives import Primitives
+from tlang.compiler.bytecode import Compiler
+from utils import bench, report
+import os, sys, io, glob, contextlib
+
+__doc__ = """
+Compares the tree-walking interpreter with the bytecode interpreter on
+the example and test programs. The bytecode interpreter is measured when
+it compiles the program (`vm`), as a single run of `tlang --engine vm`
+does, and when the code is already compiled by a shared compiler
+(`cached`), as when a program is run repeatedly. Each run is done by a
+fresh interpreter, and the output of the programs is discarded.
+"""
+
+BASE = os.path.normpath(os.path.abspath(__file__) + "/../../")
+
+try:
+	from tlang.command import parseSource
+	import tlang.parser
+except ImportError as e:
+	parseSource = None
+	IMPORT_ERROR = e
+
+def programs():
+	"""Yields the name and AST of the example and test programs."""
+	for path in sorted(glob.glob(f"{BASE}/examples/*.tlang") + glob.glob(f"{BASE}/tests/tlang/*.tlang")):
+		ast, error = parseSource(path)
+		if ast is not None:
+			yield (os.path.basename(path), ast)
+
+def runs( tree, factory, count:int ):
+	"""Returns a functor that evaluates the tree with `count` interpreters
+	created by the factory, which are created beforehand."""
+	interpreters = []
+	for _ in range(count):
+		inter = factory()
+		Primitives().bind(inter.context)
+		interpreters.append(inter)
+	def functor():
+		for inter in interpreters:
+			try:
+				for _ in inter.feed(tree):
+					pass
+			# NOTE: Some programs fail, in the same way with both engines
+			except Exception as e:
+				pass
+	return functor
+
+def run( count=100, out=sys.stdout ):
+	if not parseSource:
+		out.write(f"Skipping, the parser is not available: {IMPORT_ERROR}\n")
+		return
+	report("program", "tree (ms)", "vm (ms)", "cached (ms)", "vm", "cached", out=out)
+	totals = [0.0, 0.0, 0.0]
+	for name, tree in programs():
+		compiler = Compiler()
+		times    = []
+		with contextlib.redirect_stdout(io.StringIO()):
+			for factory in (ValueInterpreter, BytecodeInterpreter, lambda:BytecodeInterpreter(compiler=compiler)):
+				# The runs need fresh interpreters, so the functor is made
+				# for each repeat.
+				times.append(min(bench(runs(tree, factory, count), repeat=1) for _ in range(3)) / count)
+		totals = [a + b for a, b in zip(totals, times)]
+		tree_t, vm_t, cached_t = times
+		report(name, f"{tree_t*1000:.3f}", f"{vm_t*1000:.3f}", f"{cached_t*1000:.3f}", f"{tree_t/vm_t:.1f}x", f"{tree_t/cached_t:.1f}x", out=out)
+	tree_t, vm_t, cached_t = totals
+	report("total", f"{tree_t*1000:.3f}", f"{vm_t*1000:.3f}", f"{cached_t*1000:.3f}", f"{tree_t/vm_t:.1f}x", f"{tree_t/cached_t:.1f}x", out=out)
+
+if __name__ == "__main__":
+	run(*[int(_) for _ in sys.argv[1:]])
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+from utils import report
+import os, sys, subprocess, re, time
+
+__doc__ = """
+Measures the import time of the `tlang` modules with `python -X importtime`
+and checks it against a budget, so that the grammar (or any other costly
+initialization) does not creep back into the import path. Exits with
+a non-zero status when a module is over budget.
+"""
+
+BASE    = os.path.normpath(os.path.abspath(__file__) + "/../../")
+PYTHON  = sys.executable
+
+# Cumulative import time budgets, in milliseconds.
+BUDGETS = {
+	"tlang"         : 10,
+	"tlang.command" : 150,
+}
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+def environment():
+	env  = dict(os.environ)
+	path = os.path.join(BASE, "src", "py")
+	env["PYTHONPATH"] = path + (os.pathsep + env["PYTHONPATH"] if env.get("PYTHONPATH") else "")
+	return env
+
+def importTime( module:str ) -> float:
+	"""Returns the cumulative import time of the given module, in
+	milliseconds, as reported by `-X importtime`."""
+	res = subprocess.run([PYTHON, "-X", "importtime", "-c", f"import {module}"],
+		env=environment(), capture_output=True, text=True, check=True)
+	cumulative = {}
+	for line in res.stderr.split("\n"):
+		m = IMPORT_TIME.match(line)
+		if m:
+			cumulative[m.group(4)] = int(m.group(2)) / 1000.0
+	return cumulative[module]
+
+def helpTime() -> float:
+	"""Returns the wall time (in milliseconds) of `tlang --help`."""
+	started = time.perf_counter()
+	subprocess.run([PYTHON, os.path.join(BASE, "bin", "tlang"), "--help"],
+		env=environment(), capture_output=True, check=True)
+	return (time.perf_counter() - started) * 1000.0
+
+def run( repeat=5, out=sys.stdout ) -> bool:
+	report("module", "best (ms)", "budget (ms)", "status", out=out)
+	success = True
+	for module, budget in BUDGETS.items():
+		best   = min(importTime(module) for _ in range(repeat))
+		status = "OK" if best <= budget else "OVER"
+		success = success and best <= budget
+		report(module, f"{best:.1f}", budget, status, out=out)
+	report("tlang --help (wall)", f"{min(helpTime() for _ in range(repeat)):.1f}", "", "", out=out)
+	return success
+
+if __name__ == "__main__":
+	sys.exit(0 if run() else 1)
+
+# EOF - vim: ts=4 sw=4 noet
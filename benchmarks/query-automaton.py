@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+from tlang.query.model import Select, With
+from tlang.compiler.query import QueryInterpreter, QuerySet, PathAutomaton
+from utils import makeWideTree, makeDeepTree, NAMES, bench, report
+import sys
+
+__doc__ = """
+Compares the rule-based `QueryInterpreter` with the path automaton used
+by `QuerySet` for simple downward paths, for a single query and for all
+the `//a/b` and `//a//b` paths of the benchmark names at once.
+"""
+
+QUERIES = {
+	"//invoice"       : lambda:Select.Descendants(With.Name("invoice")),
+	"//dir/file"      : lambda:Select.Descendants(With.Name("dir")).then(Select.Children(With.Name("file"))),
+	"//dir//file/item" : lambda:Select.Descendants(With.Name("dir")).then(Select.Descendants(With.Name("file")).then(Select.Children(With.Name("item")))),
+	"/dir/meta"       : lambda:Select.Children(With.Name("dir")).then(Select.Children(With.Name("meta"))),
+}
+
+def makePaths():
+	return [
+		(lambda a=a, b=b, axis=axis:Select.Descendants(With.Name(a)).then(axis(With.Name(b))))
+		for a in NAMES for b in NAMES for axis in (Select.Children, Select.Descendants)
+	]
+
+def run( sizes=(10_000, 100_000), out=sys.stdout ):
+	report("query", "nodes", "interpreter (s)", "automaton (s)", "speedup", out=out)
+	for size in sizes:
+		for shape, tree in (("wide", makeWideTree(size)), ("deep", makeDeepTree(size))):
+			# The interpreter is quadratic on deep trees, so we only run
+			# the many paths on wide trees.
+			for label, query in (dict(QUERIES, **{f"{len(makePaths())} paths":None}) if shape == "wide" else QUERIES).items():
+				queries  = [query] if query else makePaths()
+				walk     = bench(lambda:sum(sum(1 for _ in QueryInterpreter().register(q().captures("_")).run(tree)) for q in queries), repeat=1)
+				automaton = bench(lambda:sum(1 for _ in QuerySet().registerMany(q().captures("_") for q in queries).run(tree)))
+				report(f"{label} ({shape})", size, f"{walk:.3f}", f"{automaton:.3f}", f"{walk/automaton:.1f}x", out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (10_000, 100_000))
+
+# EOF - vim: ts=4 sw=4 noet
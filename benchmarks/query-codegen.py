@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+from tlang.query.model import Select, With
+from tlang.compiler.query import QueryInterpreter, CodegenQueryInterpreter, compileQueryFunction
+from utils import makeWideTree, makeDeepTree, bench, report
+import sys
+
+__doc__ = """
+Compares `QueryInterpreter.run` with queries compiled to Python functions
+(`CodegenQueryInterpreter`) on trees of 10^4 to 10^6 nodes. The time to
+generate and compile the function is reported separately, as compiled
+functions are cached.
+"""
+
+QUERIES = {
+	"//invoice"          : lambda:Select.Descendants(With.Name("invoice")),
+	"//dir/file"         : lambda:Select.Descendants(With.Name("dir")).then(Select.Children(With.Name("file"))),
+	"//dir//file[@size]" : lambda:Select.Descendants(With.Name("dir")).then(Select.Descendants(With.Name("file")).where(Select.Self(With.Attribute("size")))),
+	"/dir/meta"          : lambda:Select.Children(With.Name("dir")).then(Select.Children(With.Name("meta"))),
+}
+
+DEEP_LIMIT = 10_000
+
+def run( sizes=(10_000, 100_000, 1_000_000), out=sys.stdout ):
+	report("query", "nodes", "interpreter (s)", "codegen (s)", "speedup", out=out)
+	for size in sizes:
+		# The interpreter is slow on large trees, so we only run once
+		repeat = 3 if size <= 100_000 else 1
+		shapes = [("wide", makeWideTree(size)), ("binary", makeWideTree(size, fanout=2))]
+		# The interpreter is quadratic on deep trees, as it checks the
+		# matches of every ancestor, so we keep them small.
+		if size <= DEEP_LIMIT:
+			shapes.append(("deep", makeDeepTree(size)))
+		for shape, tree in shapes:
+			for label, query in QUERIES.items():
+				interpreter = QueryInterpreter().register(query().captures("_"))
+				compiled    = CodegenQueryInterpreter().register(query().captures("_"))
+				t_interpreter = bench(lambda:sum(1 for _ in interpreter.run(tree)), repeat)
+				t_compiled    = bench(lambda:sum(1 for _ in compiled.run(tree)), repeat)
+				report(f"{label} ({shape})", size, f"{t_interpreter:.3f}", f"{t_compiled:.3f}", f"{t_interpreter/t_compiled:.1f}x", out=out)
+	t_compile = bench(lambda:[compileQueryFunction(_().captures(str(i))) for i, _ in enumerate(QUERIES.values())], repeat=1)
+	report("compilation (all queries)", "", "", f"{t_compile:.4f}", "", out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (10_000, 100_000, 1_000_000))
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+from tlang.query.model import Select, With
+from tlang.compiler.query import QueryInterpreter, IndexedQueryInterpreter
+from tlang.tree.index import TreeIndex
+from utils import makeWideTree, makeDeepTree, bench, report
+import sys
+
+__doc__ = """
+Compares `QueryInterpreter.run`, which walks the whole tree, with
+`IndexedQueryInterpreter.run` on a prebuilt `TreeIndex`. The time to build
+the index is reported separately, as it is paid once per tree.
+"""
+
+QUERIES = {
+	"//invoice"        : lambda:Select.Descendants(With.Name("invoice")),
+	"//dir/file"       : lambda:Select.Descendants(With.Name("dir")).then(Select.Children(With.Name("file"))),
+	"//dir//item"      : lambda:Select.Descendants(With.Name("dir")).then(Select.Descendants(With.Name("item"))),
+	"//@size"          : lambda:Select.Descendants(With.Attribute("size")),
+}
+
+def run( sizes=(10_000, 100_000), out=sys.stdout ):
+	report("query", "nodes", "walk (s)", "index (s)", "speedup", out=out)
+	for size in sizes:
+		for shape, tree in (("wide", makeWideTree(size)), ("deep", makeDeepTree(size))):
+			t_build = bench(lambda:TreeIndex(tree), repeat=1)
+			index   = TreeIndex(tree)
+			report(f"build index ({shape})", size, "", f"{t_build:.3f}", "", out=out)
+			for label, query in QUERIES.items():
+				walk    = QueryInterpreter().register(query().captures("_"))
+				indexed = IndexedQueryInterpreter().register(query().captures("_"))
+				t_walk    = bench(lambda:sum(1 for _ in walk.run(tree)))
+				t_indexed = bench(lambda:sum(1 for _ in indexed.run(index)))
+				report(f"{label} ({shape})", size, f"{t_walk:.3f}", f"{t_indexed:.3f}", f"{t_walk/t_indexed:.1f}x", out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (10_000, 100_000))
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+from tlang.query.model import Select, With, NodeNamePredicate
+from tlang.compiler.query import QueryInterpreter
+from utils import makeWideTree, bench, report
+import sys
+
+__doc__ = """
+Compares `QueryInterpreter.run` with interned node names (where the name
+predicates compare integer ids) against string comparisons, which is how
+names were matched before interning.
+"""
+
+class StringNamePredicate(NodeNamePredicate):
+	"""Matches node names by comparing strings, like before interning."""
+
+	def match( self, node ) -> bool:
+		return node.name == self.name
+
+QUERIES = {
+	"//invoice"        : lambda With:Select.Descendants(With("invoice")),
+	"//dir/file"       : lambda With:Select.Descendants(With("dir")).then(Select.Children(With("file"))),
+	"//dir//item"      : lambda With:Select.Descendants(With("dir")).then(Select.Descendants(With("item"))),
+}
+
+def run( sizes=(10_000, 100_000), out=sys.stdout ):
+	report("query", "nodes", "strings (s)", "interned (s)", "speedup", out=out)
+	for size in sizes:
+		tree = makeWideTree(size)
+		for label, query in QUERIES.items():
+			interned = QueryInterpreter().register(query(With.Name).captures("_"))
+			strings  = QueryInterpreter().register(query(StringNamePredicate).captures("_"))
+			t_interned = bench(lambda:sum(1 for _ in interned.run(tree)))
+			t_strings  = bench(lambda:sum(1 for _ in strings.run(tree)))
+			report(label, size, f"{t_strings:.3f}", f"{t_interned:.3f}", f"{t_strings/t_interned:.2f}x", out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (10_000, 100_000))
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+from tlang.query.model import Select, With
+from tlang.compiler.query import runQuery
+from tlang.tree.index import TreeIndex
+from utils import makeWideTree, makeDeepTree, bench, report
+import sys
+
+__doc__ = """
+Compares the query engines on multi-step paths: the walking interpreter
+(`walk`), the set-at-a-time indexed interpreter (`index`) and the
+structural join interpreter (`join`), the last two sharing a prebuilt
+`TreeIndex`.
+"""
+
+QUERIES = {
+	"//dir//file[@size]" : lambda:Select.Descendants(With.Name("dir")).then(Select.Descendants(With.Name("file")).where(Select.Self(With.Attribute("size")))),
+	"//dir/file/item"    : lambda:Select.Descendants(With.Name("dir")).then(Select.Children(With.Name("file")).then(Select.Children(With.Name("item")))),
+	"//item[\\\\invoice]" : lambda:Select.Descendants(With.Name("item")).where(Select.Ancestors(With.Name("invoice"))),
+}
+
+ENGINES = ("walk", "index", "join")
+
+def run( sizes=(10_000, 100_000), out=sys.stdout ):
+	report("query", "nodes", *(f"{_} (s)" for _ in ENGINES), out=out)
+	for size in sizes:
+		for shape, tree in (("wide", makeWideTree(size)), ("deep", makeDeepTree(size))):
+			index = TreeIndex(tree)
+			for label, query in QUERIES.items():
+				times = []
+				for engine in ENGINES:
+					target = tree if engine == "walk" else index
+					times.append(bench(lambda:sum(1 for _ in runQuery(query().captures("_"), target, engine))))
+				report(f"{label} ({shape})", size, *(f"{_:.3f}" for _ in times), out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (10_000, 100_000))
+
+# EOF - vim: ts=4 sw=4 noet
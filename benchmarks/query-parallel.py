@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+from tlang.query.model import Select, With
+from tlang.compiler.query import runQuery
+from tlang.compiler.parallel import runQueryParallel, runQueryPartitioned
+from tlang.tree.binary import writeFile
+from utils import makeWideTree, bench, report
+import sys, os, tempfile
+
+__doc__ = """
+Measures how `runQueryParallel` scales from 1 to 8 worker processes on a
+forest of independent trees, given either as nodes (which are serialized
+for the workers) or as binary tree files (which the workers map), against
+running `runQuery` on each tree in the current process. A single tree
+of the same total size is then queried by partitioning it with
+`runQueryPartitioned`.
+"""
+
+QUERY = lambda:Select.Descendants(With.Name("dir")).then(Select.Descendants(With.Name("file")).where(Select.Self(With.Attribute("size")))).captures("_")
+
+WORKERS = (1, 2, 4, 8)
+
+def run( trees:int=1_000, size:int=1_000, out=sys.stdout ):
+	forest = [makeWideTree(size, fanout=10, seed=i) for i in range(trees)]
+	with tempfile.TemporaryDirectory() as base:
+		paths = []
+		for i, tree in enumerate(forest):
+			paths.append(os.path.join(base, f"{i}.tltree"))
+			writeFile(tree, paths[-1])
+		report("input", "trees", "sequential (s)", *(f"{_} workers (s)" for _ in WORKERS), out=out)
+		for label, inputs in (("nodes", forest), ("files", paths)):
+			sequential = bench(lambda:sum(1 for t in forest for _ in runQuery(QUERY(), t)), repeat=1)
+			times = [bench(lambda:sum(1 for _ in runQueryParallel(QUERY(), inputs, workers=n)), repeat=1) for n in WORKERS]
+			report(f"{label} ({os.cpu_count()} cores)", trees, f"{sequential:.3f}", *(f"{_:.3f} ({sequential/_:.1f}x)" for _ in times), out=out)
+	tree = makeWideTree(trees * size, fanout=10)
+	for depth in (2, 3):
+		sequential = bench(lambda:sum(1 for _ in runQuery(QUERY(), tree)), repeat=1)
+		times = [bench(lambda:sum(1 for _ in runQueryPartitioned(QUERY(), tree, depth, workers=n)), repeat=1) for n in WORKERS]
+		report(f"partitions at {depth} ({os.cpu_count()} cores)", 1, f"{sequential:.3f}", *(f"{_:.3f} ({sequential/_:.1f}x)" for _ in times), out=out)
+
+if __name__ == "__main__":
+	run(*[int(_) for _ in sys.argv[1:3]])
+
+# EOF - vim: ts=4 sw=4 noet
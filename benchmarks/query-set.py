@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+from tlang.query.model import Select, With
+from tlang.compiler.query import QueryInterpreter, QuerySet
+from utils import makeWideTree, NAMES, bench, report
+import sys
+
+__doc__ = """
+Compares running many queries one after the other with `QueryInterpreter`
+against running them in a single pass with a `QuerySet`. The queries are
+all the `//a/b` and `//a[@size]` pairs of the benchmark names, so that
+they have many terminals in common.
+"""
+
+def makeQueries( count:int ):
+	queries = []
+	for a in NAMES:
+		for b in NAMES:
+			queries.append(lambda a=a, b=b:Select.Descendants(With.Name(a)).then(Select.Children(With.Name(b))))
+		queries.append(lambda a=a:Select.Descendants(With.Name(a)).where(Select.Self(With.Attribute("size"))))
+	return queries[:count]
+
+def run( sizes=(10_000, 100_000), counts=(1, 7, 42), out=sys.stdout ):
+	report("queries", "nodes", "separate (s)", "set (s)", "speedup", out=out)
+	for size in sizes:
+		tree = makeWideTree(size)
+		for count in counts:
+			queries  = makeQueries(count)
+			separate = bench(lambda:sum(sum(1 for _ in QueryInterpreter().register(q().captures("_")).run(tree)) for q in queries))
+			combined = bench(lambda:sum(1 for _ in QuerySet().registerMany(q().captures("_") for q in queries).run(tree)))
+			report(f"{len(queries)} queries", size, f"{separate:.3f}", f"{combined:.3f}", f"{separate/combined:.1f}x", out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (10_000, 100_000))
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+from tlang.tree.model import Node
+from utils import makeWideTree, bench, report
+import sys
+
+__doc__ = """
+Compares eager deep copies of a tree (`copy` with a depth) with the
+default copy-on-write copies, for a clone that is discarded, a clone
+where one leaf is mutated and a clone that is fully traversed.
+"""
+
+# A depth that is never reached, so that `copy` is eager
+EAGER = sys.maxsize
+
+def clone( tree, depth ):
+	return tree.copy(depth)
+
+def mutate( tree, depth ):
+	copy = tree.copy(depth)
+	node = copy
+	while node.children:
+		node = node.children[-1]
+	node.attr("mutated", True)
+	return copy
+
+def traverse( tree, depth ):
+	return sum(1 for _ in tree.copy(depth).walk())
+
+def run( sizes=(10_000, 100_000), out=sys.stdout ):
+	report("operation", "nodes", "eager (s)", "cow (s)", "speedup", out=out)
+	for size in sizes:
+		for shape, tree in (("wide", makeWideTree(size, fanout=10)), ("binary", makeWideTree(size, fanout=2))):
+			for label, functor in (("clone", clone), ("mutate", mutate), ("traverse", traverse)):
+				eager = bench(lambda:functor(tree, EAGER))
+				cow   = bench(lambda:functor(tree, -1))
+				report(f"{label} ({shape})", size, f"{eager:.4f}", f"{cow:.4f}", f"{eager/cow:.1f}x", out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (10_000, 100_000))
+
+# EOF - vim: ts=4 sw=4 noet
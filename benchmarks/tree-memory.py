@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+from tlang.parser import getGrammar, Processor
+from tlang.tree.model import Node
+from collections import OrderedDict
+import os, sys, glob
+
+__doc__ = """
+Measures the memory used per node by the trees produced when parsing the
+examples in `examples/tlang`. The compact (slotted) `Node` is compared
+against the previous layout, where every node had its own `__dict__`,
+attributes `OrderedDict` and children list.
+"""
+
+BASE     = os.path.normpath(os.path.abspath(__file__) + "/../../")
+EXAMPLES = os.path.join(BASE, "examples", "tlang", "*.tlang")
+
+class LegacyNode:
+	"""Replicates the memory layout of the original `Node` implementation,
+	only the containers are relevant here."""
+
+	def __init__( self, node:Node ):
+		self.name = node.name
+		self.id   = node.id
+		self.parent = None
+		self.attributes = OrderedDict((k,v) for k,v in node._attributes.items()) if node._attributes else OrderedDict()
+		self._children = []
+		self.metadata = dict(node.metadata) if node.metadata else None
+		for child in node.children:
+			c = LegacyNode(child)
+			c.parent = self
+			self._children.append(c)
+
+	def walk( self ):
+		yield self
+		for c in self._children:
+			yield from c.walk()
+
+def nodeSize( node ) -> int:
+	"""Returns the number of bytes used by the node and its own containers,
+	excluding the values they reference (which are shared by both layouts)."""
+	size = sys.getsizeof(node)
+	if hasattr(node, "__dict__"):
+		size += sys.getsizeof(node.__dict__)
+	for name in ("_attributes", "attributes", "_children", "metadata"):
+		value = node.__dict__.get(name) if hasattr(node, "__dict__") else getattr(node, name, None)
+		if value is not None:
+			size += sys.getsizeof(value)
+	return size
+
+def treeSize( nodes ):
+	"""Returns `(count, bytes)` for the given iterable of nodes."""
+	count = 0
+	total = 0
+	for node in nodes:
+		count += 1
+		total += nodeSize(node)
+	return (count, total)
+
+def parse( path:str ) -> Node:
+	G   = getGrammar()
+	res = G.parsePath(path)
+	if not res.isSuccess():
+		raise Exception(f"Parsing failed for {path}: {res.describe()}")
+	return Processor(G).process(res)
+
+def run( paths=None, out=sys.stdout ):
+	paths = paths or sorted(glob.glob(EXAMPLES))
+	out.write(f"{'example':32s}\t{'nodes':>8s}\t{'compact B/n':>12s}\t{'legacy B/n':>12s}\t{'ratio':>6s}\n")
+	total = [0, 0, 0]
+	for path in paths:
+		tree = parse(path)
+		count, compact = treeSize(tree.walk())
+		_, legacy = treeSize(LegacyNode(tree).walk())
+		total[0] += count ; total[1] += compact ; total[2] += legacy
+		out.write(f"{os.path.basename(path):32s}\t{count:8d}\t{compact/count:12.1f}\t{legacy/count:12.1f}\t{legacy/compact:6.2f}\n")
+	count, compact, legacy = total
+	if count:
+		out.write(f"{'TOTAL':32s}\t{count:8d}\t{compact/count:12.1f}\t{legacy/count:12.1f}\t{legacy/compact:6.2f}\n")
+	return total
+
+if __name__ == "__main__":
+	run(sys.argv[1:])
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+from tlang.tree.reader import parseString, readTrees
+from tlang.tree.events import parseEvents, buildTrees, treeEvents, OPEN, ATTR, CLOSE
+from utils import makeWideTree, makeDeepTree, bench, report
+import sys, io, json
+
+__doc__ = """
+Measures the throughput (in MB/s) of the tree notation parsers: the
+hand-written reader (on the whole text and on chunks of it), the event
+scanner with `buildTrees` and, when `libparsing` is available, the
+grammar-based parser. The forest is made of the children of the wide
+tree, which the chunked reader can yield one by one.
+"""
+
+try:
+	from tlang.tree.parser import parseString as parseGrammar
+except ImportError:
+	parseGrammar = None
+
+def toSource( tree ) -> str:
+	"""Writes the given tree in the tree notation."""
+	res:list = []
+	hasAttributes = False
+	for type, name, value in treeEvents(tree):
+		if type == ATTR:
+			res.append(f"{' (@' if not hasAttributes else ''} ({name} {json.dumps(value)})")
+			hasAttributes = True
+			continue
+		if hasAttributes:
+			res.append(")")
+			hasAttributes = False
+		res.append(f"\n({name}" if type == OPEN else ")")
+	return "".join(res)
+
+def run( sizes=(10_000, 100_000), out=sys.stdout ):
+	parsers = [
+		("reader", parseString),
+		("chunked", lambda _:list(readTrees(io.StringIO(_), 64 * 1024))),
+		("events", lambda _:list(buildTrees(parseEvents(_)))),
+	]
+	if parseGrammar:
+		parsers.append(("grammar", parseGrammar))
+	report("parser", "nodes", "size (KB)", "time (s)", "MB/s", out=out)
+	for size in sizes:
+		wide = makeWideTree(size)
+		for shape, tree in (("wide", wide), ("deep", makeDeepTree(size)), ("forest", list(wide.children))):
+			source = toSource(tree)
+			mb     = len(source.encode("utf8")) / 1_000_000
+			for label, parse in parsers:
+				elapsed = bench(lambda:parse(source))
+				report(f"{label} ({shape})", size, len(source) // 1024, f"{elapsed:.3f}", f"{mb/elapsed:.1f}", out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (10_000, 100_000))
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+from tlang.tree.persistent import PersistentNode
+from utils import makeWideTree, bench, report
+import sys, random, tracemalloc
+
+__doc__ = """
+Compares the cost of keeping the successive versions of a tree where
+each version changes one attribute: (copy-on-write) copies of a `Node`
+tree against path copying with `PersistentNode`.
+"""
+
+def randomPaths( tree, count:int, seed=0 ):
+	rng = random.Random(seed)
+	res = []
+	for _ in range(count):
+		path, node = [], tree
+		while node.children and rng.random() < 0.8:
+			i = rng.randrange(len(node.children))
+			path.append(i)
+			node = node.children[i]
+		res.append(path)
+	return res
+
+def copies( tree, paths ):
+	versions = [tree]
+	for i, path in enumerate(paths):
+		v = versions[-1].copy()
+		node = v
+		for j in path:
+			node = node.children[j]
+		node.attr("version", i)
+		versions.append(v)
+	return versions
+
+def persistent( tree, paths ):
+	versions = [tree]
+	for i, path in enumerate(paths):
+		versions.append(versions[-1].update(path, lambda _:_.setAttribute("version", i)))
+	return versions
+
+def measure( functor ):
+	tracemalloc.start()
+	res = functor()
+	size = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	return size
+
+def run( sizes=(10_000, 100_000), versions:int=20, out=sys.stdout ):
+	report("model", "nodes", "versions", "time (s)", "memory (KB)", out=out)
+	for size in sizes:
+		tree  = makeWideTree(size, fanout=10)
+		ptree = PersistentNode.FromNode(tree)
+		paths = randomPaths(tree, versions)
+		for label, functor, root in (("copy", copies, tree), ("persistent", persistent, ptree)):
+			report(label, size, versions, f"{bench(lambda:functor(root, paths), repeat=1):.3f}", measure(lambda:functor(root, paths)) // 1024, out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (10_000, 100_000))
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+from tlang.compiler.query import Traversal, TraversalStep
+from tlang.tree.model import Node
+from utils import makeWideTree, bench, report
+import sys, tracemalloc
+
+__doc__ = """
+Compares the level-order traversal (`Traversal.DownBreadth`) with the
+previous recursive implementation and with the depth-first traversal on
+wide trees, measuring both the time and the peak memory of a traversal.
+"""
+
+def legacyBreadth( node:Node, depth:int=0, step:int=0 ):
+	"""The previous implementation, which recursed on each child after
+	yielding the children of a node."""
+	for i,c in enumerate(node.children):
+		yield TraversalStep(c, depth, i, step)
+		step += 1
+	for c in node.children:
+		yield from legacyBreadth(c, depth + 1, step)
+
+TRAVERSALS = {
+	"depth"          : Traversal.DownDepth,
+	"breadth"        : Traversal.DownBreadth,
+	"legacy breadth" : legacyBreadth,
+}
+
+def peak( functor ) -> int:
+	tracemalloc.start()
+	functor()
+	res = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return res
+
+def run( sizes=(100_000, 1_000_000), out=sys.stdout ):
+	report("traversal", "nodes", "fanout", "time (s)", "peak (KB)", out=out)
+	for size in sizes:
+		for fanout in (10, 1_000):
+			tree = makeWideTree(size, fanout=fanout)
+			for label, traversal in TRAVERSALS.items():
+				count = lambda:sum(1 for _ in traversal(tree))
+				report(label, size, fanout, f"{bench(count):.3f}", f"{peak(count) // 1024}", out=out)
+
+if __name__ == "__main__":
+	run([int(_) for _ in sys.argv[1:]] or (100_000, 1_000_000))
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,58 @@
+from tlang.tree.model import Node
+from typing import List, Callable, Optional
+import time, sys, random
+
+__doc__ = """
+Helpers shared by the benchmarks: synthetic tree generators and timing.
+"""
+
+NAMES = ("dir", "file", "link", "meta", "invoice", "item")
+
+def makeWideTree( count:int, fanout:int=100, names=NAMES, seed=0 ) -> Node:
+	"""Creates a shallow tree of about `count` nodes where every node has
+	up to `fanout` children."""
+	rng   = random.Random(seed)
+	root  = Node("dir")
+	queue = [root]
+	total = 1
+	while queue and total < count:
+		parent = queue.pop(0)
+		for _ in range(min(fanout, count - total)):
+			child = parent.add(Node(rng.choice(names)))
+			if rng.random() < 0.3:
+				child.attr("size", rng.randint(0, 1000))
+			queue.append(child)
+			total += 1
+	return root
+
+def makeDeepTree( count:int, fanout:int=2, names=NAMES, seed=0 ) -> Node:
+	"""Creates a deep tree of about `count` nodes, made of chains where
+	each node has up to `fanout` children."""
+	rng   = random.Random(seed)
+	root  = Node("dir")
+	stack = [root]
+	total = 1
+	while stack and total < count:
+		parent = stack.pop()
+		for _ in range(min(rng.randint(1, fanout), count - total)):
+			child = parent.add(Node(rng.choice(names)))
+			if rng.random() < 0.3:
+				child.attr("size", rng.randint(0, 1000))
+			stack.append(child)
+			total += 1
+	return root
+
+def bench( functor:Callable, repeat:int=3 ) -> float:
+	"""Returns the best time (in seconds) for running the given functor."""
+	best = None
+	for _ in range(repeat):
+		started = time.perf_counter()
+		functor()
+		elapsed = time.perf_counter() - started
+		best = elapsed if best is None else min(best, elapsed)
+	return best
+
+def report( label:str, *columns, out=sys.stdout ):
+	out.write(label.ljust(32) + "\t" + "\t".join(str(_).rjust(12) for _ in columns) + "\n")
+
+# EOF - vim: ts=4 sw=4 noet
@@ -1 +1,10 @@
-from .parser import parseString
+__version__ = "0.1.0"
+
+def __getattr__( name:str ):
+	# NOTE: The parser is imported on first access, so that importing
+	# `tlang` (and running `tlang --help`) stays cheap.
+	if name == "parseString":
+		from .parser import parseString
+		return parseString
+	else:
+		raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -0,0 +1,163 @@
+from typing import Optional,Any,List,Dict,Tuple,Sequence
+from tlang.tree.model import Node, NodeTemplate
+import tlang
+import os, sys, hashlib, json, tempfile
+
+__doc__ = """
+An on-disk cache of processed ASTs, so that sources that did not change
+don't need to be parsed again. Entries are keyed on the hash of the source
+content, of the grammar and on the TLang version, and preserve the node
+metadata (`line`, `offset`, `length`) used to report errors.
+
+Entries are JSON (and not pickles, as the cache directory may be shared)
+after a header with the format version and the digest of the JSON, so
+that corrupted entries are detected and treated as cache misses.
+"""
+
+# Bump when the format of the cache entries changes
+FORMAT = 2
+MAGIC  = b"TLAST"
+
+# The node classes, stored by index in the entries
+CLASSES = (Node, NodeTemplate)
+
+# The modules that define the grammar and the processing of the parse
+# results into an AST, along with the models of the stored nodes. Any
+# change to these invalidates the cache.
+GRAMMAR_MODULES = (
+	"tlang/parser.py",
+	"tlang/query/parser.py",
+	"tlang/expr/parser.py",
+	"tlang/utils.py",
+	"tlang/tree/model.py",
+	"tlang/query/model.py",
+)
+
+GRAMMAR_VERSION:Optional[str] = None
+
+def grammarVersion() -> str:
+	"""Returns a digest of the sources of `GRAMMAR_MODULES`."""
+	global GRAMMAR_VERSION
+	if not GRAMMAR_VERSION:
+		base   = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+		digest = hashlib.sha256()
+		for path in GRAMMAR_MODULES:
+			with open(os.path.join(base, path), "rb") as f:
+				digest.update(f.read())
+		GRAMMAR_VERSION = digest.hexdigest()[:16]
+	return GRAMMAR_VERSION
+
+def defaultPath() -> str:
+	base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+	return os.path.join(base, "tlang", "ast")
+
+# -----------------------------------------------------------------------------
+#
+# AST CACHE
+#
+# -----------------------------------------------------------------------------
+
+class ASTCache:
+	"""Stores processed ASTs in a directory, one file per source
+	content."""
+
+	def __init__( self, path:Optional[str]=None ):
+		self.path = path or defaultPath()
+
+	@staticmethod
+	def Dump( node:Node, context:Sequence[Node]=() ) -> bytes:
+		"""Serializes the given tree as a flat list of nodes in pre-order,
+		each entry being `(name index, parent index, attributes, metadata,
+		class index)`, along with the list of names. The list is flat so
+		that deep trees don't hit the recursion limit. The `context` nodes
+		are serialized as a path above the node, without their other
+		children. Attribute and metadata values must be JSON values."""
+		names:Dict[str,int] = {}
+		name  = lambda _:names.setdefault(_.name, len(names))
+		nodes:List[Tuple[int,int,Optional[dict],Optional[dict],int]] = [(
+			name(n), i - 1,
+			dict(n._attributes) if n.hasAttributes else None,
+			dict(n.metadata) if n.metadata else None,
+			CLASSES.index(n.__class__),
+		) for i, n in enumerate(context)]
+		stack = [(node, len(nodes) - 1)]
+		while stack:
+			n, parent = stack.pop()
+			index = len(nodes)
+			nodes.append((
+				name(n), parent,
+				dict(n._attributes) if n.hasAttributes else None,
+				dict(n.metadata) if n.metadata else None,
+				CLASSES.index(n.__class__),
+			))
+			children = n.children
+			for i in range(len(children) - 1, -1, -1):
+				stack.append((children[i], index))
+		payload = json.dumps((list(names), nodes), ensure_ascii=False, separators=(",", ":")).encode("utf8")
+		return b"%s %d %s\n" % (MAGIC, FORMAT, hashlib.sha256(payload).hexdigest().encode()) + payload
+
+	@staticmethod
+	def Load( data:bytes ) -> Node:
+		"""Loads a tree serialized with `Dump`, raising a `ValueError` if
+		the data is not a valid entry."""
+		header, _, payload = data.partition(b"\n")
+		fields = header.split(b" ")
+		if len(fields) != 3 or fields[0] != MAGIC:
+			raise ValueError("Not an AST cache entry")
+		elif fields[1] != str(FORMAT).encode():
+			raise ValueError(f"Unsupported AST cache format {fields[1].decode(errors='replace')}, expected {FORMAT}")
+		elif fields[2] != hashlib.sha256(payload).hexdigest().encode():
+			raise ValueError("Corrupted AST cache entry, its digest does not match")
+		names, entries = json.loads(payload)
+		nodes:List[Node] = []
+		for name, parent, attributes, metadata, kind in entries:
+			node = CLASSES[kind](names[name])
+			if attributes:
+				for k,v in attributes.items():
+					node.setAttribute(k, v)
+			if metadata:
+				node.metadata = metadata
+			if parent >= 0:
+				nodes[parent].add(node)
+			nodes.append(node)
+		return nodes[0]
+
+	def key( self, source:bytes ) -> str:
+		digest = hashlib.sha256()
+		digest.update(f"{FORMAT}:{tlang.__version__}:{grammarVersion()}:".encode())
+		digest.update(source)
+		return digest.hexdigest()
+
+	def entryPath( self, key:str ) -> str:
+		return os.path.join(self.path, key[:2], key[2:] + ".ast")
+
+	def get( self, source:bytes ) -> Optional[Node]:
+		"""Returns the cached AST for the given source, if any."""
+		path = self.entryPath(self.key(source))
+		if not os.path.exists(path):
+			return None
+		try:
+			with open(path, "rb") as f:
+				return self.Load(f.read())
+		except Exception as e:
+			# A corrupted or outdated entry is just a cache miss
+			return None
+
+	def set( self, source:bytes, node:Node ) -> Node:
+		"""Stores the given AST for the given source. The entry is written
+		atomically, so that concurrent runs don't see partial entries."""
+		path    = self.entryPath(self.key(source))
+		parent  = os.path.dirname(path)
+		try:
+			data = self.Dump(node)
+			os.makedirs(parent, exist_ok=True)
+			fd, temp = tempfile.mkstemp(dir=parent, suffix=".tmp")
+			with os.fdopen(fd, "wb") as f:
+				f.write(data)
+			os.replace(temp, path)
+		except (OSError, TypeError, ValueError) as e:
+			# The cache is an optimization, failing to write is not an error
+			sys.stderr.write(f" ! Could not write AST cache entry {path}: {e}\n")
+		return node
+
+# EOF - vim: ts=4 sw=4 noet
@@ -1,9 +1,11 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple, Iterator
+from concurrent.futures import ProcessPoolExecutor
 import os, sys, argparse, json
-from tlang.parser import parseString, parseFile, G, Processor
 from tlang.tree.model import Node,NodeError,Repr
 from tlang.interpreter.primitives import Primitives
 from tlang.interpreter.core import ValueInterpreter
+from tlang.interpreter.vm import BytecodeInterpreter
+from tlang.cache import ASTCache
 
 try:
 	import colorama
@@ -76,8 +78,14 @@ def onError( error, err=sys.stdout ):
 		err.write(f" {RED}⚠ {RESET} {BOLD}Internal error: {RED}{error.__class__.__name__}{RESET}\n")
 		raise (error)
 
-def run( tree:Node, logValues=False, out=sys.stdout, err=sys.stderr ):
-	inter = ValueInterpreter()
+# The interpreters that can evaluate the AST, by `--engine` name
+ENGINES = {
+	"tree" : ValueInterpreter,
+	"vm"   : BytecodeInterpreter,
+}
+
+def run( tree:Node, logValues=False, out=sys.stdout, err=sys.stderr, engine:str="tree" ):
+	inter = ENGINES[engine]()
 	Primitives().bind(inter.context)
 	def print_out(value):
 		if isinstance(value, Exception):
@@ -118,26 +126,105 @@ def command( args:Optional[List[str]]=None, name="tlang" ):
 		help='Outputs the AST')
 	oparser.add_argument("-vp", "--verbose-parsing", action="store_true",
 		help='Outputs detailed parsing information')
+	oparser.add_argument("--no-cache", action="store_true",
+		help='Does not use the parsed AST cache')
+	oparser.add_argument("--cache-dir", metavar="DIR", type=str, default=None,
+		help='The directory where parsed ASTs are cached')
+	oparser.add_argument("-j", "--jobs", metavar="N", type=int, default=1,
+		help='Parses the files in N processes')
+	oparser.add_argument("-e", "--engine", choices=tuple(ENGINES), default="tree",
+		help='The interpreter: tree-walking, or compiled to bytecode (vm)')
 	# We create the parse and register the options
 	opts = oparser.parse_args(args=args)
 	if opts.verbose_parsing:
-		G.setVerbose()
-	for path in opts.files:
-		res       = G.parseStream(sys.stdin) if path == "-" else G.parsePath(path)
-		processor = Processor(G)
-		if not res.isSuccess():
-			print (res.describe())
+		from tlang.parser import getGrammar
+		getGrammar().setVerbose()
+	# NOTE: The cache can't be used with verbose parsing, as the point
+	# is to see the parser's output.
+	cache = None if opts.no_cache or opts.verbose_parsing else ASTCache(opts.cache_dir)
+	# NOTE: Verbose parsing output would be interleaved, so it is done
+	# in this process.
+	jobs  = 1 if opts.verbose_parsing else opts.jobs
+	res   = None
+	# Files are evaluated in order, each as soon as it is parsed, so that
+	# the output and diagnostics are in file order.
+	for path, ast, error in parseFiles(opts.files, cache, jobs):
+		if ast is None:
+			print (error)
 			return None
+		ast.meta("source", path)
+		assert ast.meta("source") == path
+		if opts.ast:
+			for _ in Repr.Apply(ast, depth=-1):
+				sys.stdout.write(_)
+			res = ast
 		else:
-			ast = processor.process(res)
-			ast.meta("source", path)
-			assert ast.meta("source") == path
-			if opts.ast:
-				for _ in Repr.Apply(ast, depth=-1):
-					sys.stdout.write(_)
-				return ast
-			else:
-				return run(ast, opts.log)
+			res = run(ast, opts.log, engine=opts.engine)
+	return res
+
+def parse( path:str, cache:Optional[ASTCache]=None ) -> Optional[Node]:
+	"""Parses the given path (`-` being stdin) and returns the processed
+	AST, using the given cache if any. Returns `None` when parsing fails."""
+	ast, error = parseSource(path, cache)
+	if error:
+		print (error)
+	return ast
+
+def parseSource( path:str, cache:Optional[ASTCache]=None ) -> Tuple[Optional[Node],Optional[str]]:
+	"""Like `parse`, but returns the AST and the description of the
+	parsing error, if any, instead of printing it."""
+	source = None
+	# The standard input is not cached, as it's usually a one-off
+	if cache and path != "-":
+		with open(path, "rb") as f:
+			source = f.read()
+		ast = cache.get(source)
+		if ast:
+			return (ast, None)
+	# NOTE: The parser is imported here so that the grammar is only built
+	# when there is a cache miss.
+	from tlang.parser import getGrammar, Processor
+	G   = getGrammar()
+	# NOTE: When caching, we parse the source that we hashed, as the file
+	# may have changed since.
+	if source is not None:
+		res = G.parseString(source.decode("utf8"))
+	else:
+		res = G.parseStream(sys.stdin) if path == "-" else G.parsePath(path)
+	if not res.isSuccess():
+		return (None, res.describe())
+	ast = Processor(G).process(res)
+	return (cache.set(source, ast) if source is not None else ast, None)
+
+def parseWorker( path:str, cachePath:Optional[str] ) -> Tuple[Optional[bytes],Optional[str]]:
+	"""Parses the given path in a worker process, returning the AST
+	serialized with `ASTCache.Dump`."""
+	ast, error = parseSource(path, ASTCache(cachePath) if cachePath else None)
+	return (None if ast is None else ASTCache.Dump(ast), error)
+
+def parseFiles( paths:List[str], cache:Optional[ASTCache]=None, jobs:int=1 ) -> Iterator[Tuple[str,Optional[Node],Optional[str]]]:
+	"""Yields `(path, ast, error)` for each of the given paths, in order.
+	With more than one job, the files are parsed concurrently in a process
+	pool and each is yielded as soon as it and the previous ones are
+	parsed. The standard input is always parsed in this process."""
+	files = [_ for _ in paths if _ != "-"]
+	if jobs <= 1 or len(files) <= 1:
+		for path in paths:
+			yield (path,) + parseSource(path, cache)
+		return
+	with ProcessPoolExecutor(max_workers=jobs) as pool:
+		futures = {_:pool.submit(parseWorker, _, cache.path if cache else None) for _ in files}
+		try:
+			for path in paths:
+				if path == "-":
+					yield (path,) + parseSource(path, cache)
+				else:
+					data, error = futures[path].result()
+					yield (path, None if data is None else ASTCache.Load(data), error)
+		finally:
+			# The files that were not yielded yet don't need to be parsed
+			for future in futures.values():
+				future.cancel()
 
 if __name__ == '__main__':
 	res = command()
@@ -0,0 +1,493 @@
+from typing import Optional,Any,List,Dict,Set,Tuple,NamedTuple,Callable
+from tlang.tree.model import Node
+from tlang.interpreter.model import Context,Singleton,META_INVOCATION,NODE,DATA,LAZY
+
+__doc__ = """
+Compiles the expression AST (the `ex:*` nodes produced by `tlang.parser`)
+to a compact bytecode, run by the stack machine of `tlang.interpreter.vm`.
+
+The compiler is a nanopass pipeline, where each pass is a small rewrite
+of an intermediate tree of *forms*:
+
+- `Lower` rewrites the AST to core forms, `(out! "Hello")` becoming
+  `(invoke (resolve "out!") (const "Hello"))`;
+
+- `Fold` rewrites the quoted data made of lists, numbers and strings to
+  constants, copied on each evaluation instead of being interpreted;
+
+- `Resolve` rewrites the references to primitives that the program can't
+  shadow to `(primitive "out!")`, the primitive being given a slot in the
+  compiler's table of primitives, which interpreters link on first use;
+
+- `Specialize` rewrites the invocations of primitives to `call` forms,
+  where the invocation protocol of the primitive (eager, lazy, data or
+  node arguments) is applied at compile time instead of on each
+  invocation, and where the invocation context is only created when
+  something can observe it;
+
+- `Emit` flattens the forms to bytecode, a tuple of `(opcode, operand)`
+  pairs, the operand being a slot or an index in the constants.
+
+Only the `set!`, `let` and `lambda` primitives bind names: a program that
+binds names with another primitive may shadow a primitive that the
+compiler resolved statically.
+"""
+
+# -----------------------------------------------------------------------------
+#
+# BYTECODE
+#
+# -----------------------------------------------------------------------------
+
+# Pushes `consts[arg]`
+CONST     = 0
+# Pushes a copy of the list `consts[arg]`, and of its nested lists
+FRESH     = 1
+# Pushes the value bound to the name `consts[arg][0]` in the context
+RESOLVE   = 2
+# Pushes the primitive in the slot `arg` of the linked primitives
+PRIMITIVE = 3
+# Pushes the evaluation of the node `consts[arg]` as data
+LITERAL   = 4
+# Replaces the `arg` values on top of the stack by their list
+BUILD     = 5
+# Replaces the values on top of the stack by their template expansion,
+# `consts[arg]` telling which values are templates to flatten.
+TEMPLATE  = 6
+# Evaluates the result on top of the stack to its value, like `process`
+# does, `consts[arg]` being the node the result is for.
+VALUE     = 7
+# Replaces the `arg` arguments and the target by the invocation result
+CALL      = 8
+# Replaces the target by the result of its invocation with the argument
+# nodes `consts[arg][1]`, using the target's protocol at runtime.
+INVOKE    = 9
+# Creates the invocation context of the target on top of the stack
+ENTER     = 10
+# Binds the name `consts[arg]` to the value on top of the stack
+DEFINE    = 11
+# Leaves the invocation context
+LEAVE     = 12
+# Pushes the lazy evaluation of the node `consts[arg][0]`
+LAZY      = 13
+# Pushes the stream of values of the nodes `consts[arg]`
+SEQ       = 14
+# Pushes the result of the tree-walking handler for node `consts[arg]`
+EVAL      = 15
+
+OPCODES = ("CONST", "FRESH", "RESOLVE", "PRIMITIVE", "LITERAL", "BUILD",
+	"TEMPLATE", "VALUE", "CALL", "INVOKE", "ENTER", "DEFINE", "LEAVE", "LAZY",
+	"SEQ", "EVAL")
+
+# The invocation protocol of a primitive, as `(name, flags)` pairs
+TSignature = Tuple[Tuple[str,int],...]
+
+class Code(NamedTuple):
+	"""The bytecode for an AST node. Running it yields the same result
+	as the `ValueInterpreter` handler for the node, before it is fed."""
+
+	node:Node
+	ops:Tuple[int,...]
+	consts:Tuple[Any,...]
+	# The names of the primitives used by the code, and the number of
+	# slots of the compiler's table that must be linked to run it.
+	primitives:Tuple[str,...]
+	slots:int
+
+	def disassemble( self ) -> List[str]:
+		return [f"{OPCODES[self.ops[i]]} {self.ops[i + 1]}" for i in range(0, len(self.ops), 2)]
+
+def signature( value:Any ) -> Optional[TSignature]:
+	"""Returns the signature of the given invocable, if it is one."""
+	protocol = getattr(value, META_INVOCATION, None) if callable(value) else None
+	return None if protocol is None else tuple((_.name, _.flags) for _ in protocol)
+
+# -----------------------------------------------------------------------------
+#
+# FORMS
+#
+# -----------------------------------------------------------------------------
+
+class Form:
+	"""A node of the intermediate tree, standing for the AST `node`. The
+	meaning of `value` and `symbol` depends on the form:
+
+	- `const`, `fresh`: the constant
+	- `resolve`: the name as `symbol`
+	- `primitive`: the name as `symbol`, the primitive as `value`
+	- `literal`: the AST node to evaluate as data
+	- `template`: which children are templates to flatten
+	- `lazy`: whether the argument is data
+	- `call`: whether the invocation context is needed
+	- `arg`: the name to define as `symbol`, whether it is eager
+	"""
+
+	__slots__ = ("name", "node", "value", "symbol", "children")
+
+	def __init__( self, name:str, node:Node, value:Any=None, symbol:Optional[str]=None, children:Optional[List['Form']]=None ):
+		self.name     = name
+		self.node     = node
+		self.value    = value
+		self.symbol   = symbol
+		self.children = children or []
+
+	def walk( self ):
+		yield self
+		for _ in self.children:
+			yield from _.walk()
+
+	def __repr__( self ):
+		attributes = "".join(f" {k}={getattr(self, k)!r}" for k in ("symbol", "value") if getattr(self, k) is not None)
+		children   = "".join(f" {_!r}" for _ in self.children)
+		return f"({self.name}{attributes}{children})"
+
+class Pass:
+	"""A pass of the compiler, calling the `on_NAME` handler for a form
+	(or an AST node, given the `PREFIX`) and the `catchall` otherwise."""
+
+	PREFIX = ""
+
+	def __init__( self ):
+		self.handlers:Dict[str,Callable] = {}
+		for name in dir(self):
+			if name.startswith("on_"):
+				self.handlers[self.PREFIX + name[3:].replace("_","-")] = getattr(self, name)
+
+	def process( self, form:Form ):
+		return self.handlers.get(form.name, self.catchall)(form)
+
+	def rewrite( self, form:Form ) -> Form:
+		children = form.children
+		for i, _ in enumerate(children):
+			children[i] = self.process(_)
+		return form
+
+	def catchall( self, form:Form ):
+		return self.rewrite(form)
+
+# -----------------------------------------------------------------------------
+#
+# ANALYSIS
+#
+# -----------------------------------------------------------------------------
+
+def analyze( root:Node ) -> Tuple[Set[str],Set[str]]:
+	"""Returns the names that the given program binds, with `set!`, `let`
+	and `lambda`, and the names that it references."""
+	bound:Set[str]      = set()
+	referenced:Set[str] = set()
+	for node in root.walk():
+		name = node.name
+		if name == "ex:ref" or name == "ex:name":
+			referenced.add(node.attr("name"))
+		elif name == "ex:list" and node.head and node.head.name == "ex:ref":
+			head = node.head.attr("name")
+			args = [_ for _ in node.tail if _.name != "ex:comment"]
+			if head == "set!" and args:
+				bound.add(args[0].attr("name"))
+			elif head == "let":
+				bound.update(_.head.attr("name") for _ in args[:-1] if _.children)
+			elif head == "lambda" and args:
+				bound.update(_.attr("name") or "__" for _ in args[0].children)
+	return (bound, referenced)
+
+def protocolNames( context:Context ) -> Set[str]:
+	"""Returns the names of the arguments of the invocables reachable from
+	the given context, which invocations bind in their context."""
+	res:Set[str] = set()
+	while context:
+		for value in context.slots.values():
+			res.update(_.name for _ in getattr(value, META_INVOCATION, None) or ())
+		context = context.parent
+	return res
+
+# -----------------------------------------------------------------------------
+#
+# PASSES
+#
+# -----------------------------------------------------------------------------
+
+class Lower(Pass):
+	"""Rewrites the AST to core forms, following `ValueInterpreter`. The
+	nodes it has no handler for (or that are malformed) become `eval`
+	forms, evaluated by the interpreter's handler."""
+
+	PREFIX = "ex:"
+
+	def on_list( self, node:Node ) -> Form:
+		if not node.children:
+			return Form("fresh", node, [])
+		# Comments are not arguments
+		return Form("invoke", node, children=[self.process(_) for _ in node.children if _ is node.head or _.name != "ex:comment"])
+
+	def on_seq( self, node:Node ) -> Form:
+		# NOTE: The values of the sequence are fed one by one, so its
+		# children are compiled separately.
+		return Form("seq", node)
+
+	def on_comment( self, node:Node ) -> Form:
+		return Form("const", node, node)
+
+	def on_ref( self, node:Node ) -> Form:
+		return Form("resolve", node, symbol=node.attr("name")) if node.hasAttribute("name") else self.catchall(node)
+
+	def on_name( self, node:Node ) -> Form:
+		return self.on_ref(node)
+
+	def on_string( self, node:Node ) -> Form:
+		return Form("const", node, node.attr("value")) if node.hasAttribute("value") else self.catchall(node)
+
+	def on_number( self, node:Node ) -> Form:
+		return self.on_string(node)
+
+	def on_template( self, node:Node ) -> Form:
+		return Form("template", node, tuple(_.name == "ex:template" for _ in node.children), children=[self.process(_) for _ in node.children])
+
+	def on_quote( self, node:Node ) -> Form:
+		if len(node.children) == 1:
+			return Form("literal", node, node.head)
+		return Form("quote", node, children=[Form("literal", _, _) for _ in node.children])
+
+	def catchall( self, node:Node ) -> Form:
+		return Form("eval", node)
+
+class Fold(Pass):
+	"""Rewrites the `literal` forms of data that `LiteralInterpreter` maps
+	to lists, numbers, strings and singletons to constants."""
+
+	NOTHING = object()
+
+	def on_literal( self, form:Form ) -> Form:
+		value = self.fold(form.value)
+		if value is self.NOTHING:
+			return form
+		return Form("fresh" if isinstance(value, list) else "const", form.node, value)
+
+	def on_quote( self, form:Form ) -> Form:
+		self.rewrite(form)
+		if all(_.name in ("const", "fresh") for _ in form.children):
+			return Form("fresh", form.node, [_.value for _ in form.children])
+		return form
+
+	def fold( self, node:Node ) -> Any:
+		name = node.name
+		if name == "ex:list":
+			res = []
+			for _ in node.children:
+				value = self.fold(_)
+				if value is self.NOTHING:
+					return value
+				res.append(value)
+			return res
+		elif name in ("ex:number", "ex:string", "ex:name") and node.hasAttribute("value"):
+			return node.attr("value")
+		elif name == "ex:singleton" and node.hasAttribute("name"):
+			return Singleton.Get(node.attr("name")[1:])
+		else:
+			return self.NOTHING
+
+class Resolve(Pass):
+	"""Rewrites the `resolve` forms of the invocables bound outside of the
+	program to `primitive` forms, when the program can't shadow them."""
+
+	def apply( self, form:Form, context:Context, shadowed:Set[str] ) -> Form:
+		self.context    = context
+		self.shadowed   = shadowed
+		return self.process(form)
+
+	def on_resolve( self, form:Form ) -> Form:
+		name = form.symbol
+		if name in self.shadowed:
+			return form
+		value = self.context.resolve(name)
+		if not callable(value) or not hasattr(value, META_INVOCATION):
+			return form
+		return Form("primitive", form.node, value, name)
+
+class Specialize(Pass):
+	"""Rewrites the `invoke` forms of primitives to `call` forms, where
+	each argument is an `arg` form evaluated according to the protocol."""
+
+	def apply( self, form:Form, referenced:Set[str] ) -> Form:
+		self.referenced = referenced
+		return self.process(form)
+
+	def on_invoke( self, form:Form ) -> Form:
+		target = form.children[0]
+		if target.name != "primitive":
+			# The arguments are compiled when invoked, as the protocol is
+			# only known then.
+			form.children[0] = self.process(target)
+			return form
+		protocol = getattr(target.value, META_INVOCATION)
+		j        = len(protocol) - 1
+		has_rest = bool(protocol) and protocol[-1].name == "__"
+		args     = [target]
+		# The invocation context binds the arguments, it is only needed
+		# when the primitive gets its arguments unevaluated (and may use
+		# the context) or when the program references their names.
+		context  = False
+		for i, arg in enumerate(form.children[1:]):
+			# Extra arguments are skipped, unless there is a rest argument
+			if not has_rest and i > j:
+				break
+			meta   = protocol[min(i,j)]
+			define = meta.name if meta.name != "__" else None
+			eager  = False
+			if meta.flags & NODE == NODE:
+				value = Form("const", arg.node, arg.node)
+			elif meta.flags & LAZY == LAZY:
+				value = Form("lazy", arg.node, meta.flags & DATA == DATA)
+			elif meta.flags & DATA == DATA:
+				value = Form("literal", arg.node, arg.node)
+			else:
+				value = self.process(arg)
+				eager = True
+			context = context or not eager or define in self.referenced
+			args.append(Form("arg", arg.node, eager, define, [value]))
+		return Form("call", form.node, context, children=args)
+
+class Emit(Pass):
+	"""Flattens the forms to bytecode."""
+
+	def apply( self, form:Form, node:Node, compiler:'Compiler' ) -> Code:
+		self.ops:List[int]    = []
+		self.consts:List[Any] = []
+		self.compiler         = compiler
+		self.primitives:Dict[str,int] = {}
+		self.process(form)
+		return Code(node, tuple(self.ops), tuple(self.consts), tuple(self.primitives), max(self.primitives.values(), default=-1) + 1)
+
+	def emit( self, op:int, arg:int=0 ):
+		self.ops.append(op)
+		self.ops.append(arg)
+
+	def const( self, value:Any ) -> int:
+		self.consts.append(value)
+		return len(self.consts) - 1
+
+	def value( self, form:Form ):
+		"""Emits the given form followed by its evaluation to a value,
+		unless the form is known to be a value."""
+		self.process(form)
+		if form.name not in ("const", "fresh", "primitive"):
+			self.emit(VALUE, self.const(form.node))
+
+	def on_const( self, form:Form ):
+		self.emit(CONST, self.const(form.value))
+
+	def on_fresh( self, form:Form ):
+		self.emit(FRESH, self.const(form.value))
+
+	def on_resolve( self, form:Form ):
+		self.emit(RESOLVE, self.const((form.symbol, form.node)))
+
+	def on_primitive( self, form:Form ):
+		slot = self.primitives[form.symbol] = self.compiler.slot(form.symbol, form.value)
+		self.emit(PRIMITIVE, slot)
+
+	def on_literal( self, form:Form ):
+		self.emit(LITERAL, self.const(form.value))
+
+	def on_quote( self, form:Form ):
+		for _ in form.children:
+			self.process(_)
+		self.emit(BUILD, len(form.children))
+
+	def on_template( self, form:Form ):
+		for _ in form.children:
+			self.value(_)
+		self.emit(TEMPLATE, self.const(form.value))
+
+	def on_seq( self, form:Form ):
+		self.emit(SEQ, self.const(tuple(form.node.children)))
+
+	def on_eval( self, form:Form ):
+		self.emit(EVAL, self.const(form.node))
+
+	def on_lazy( self, form:Form ):
+		self.emit(LAZY, self.const((form.node, form.value)))
+
+	def on_invoke( self, form:Form ):
+		node = form.node
+		self.value(form.children[0])
+		self.emit(INVOKE, self.const((node, tuple(_ for _ in node.tail if _.name != "ex:comment"))))
+
+	def on_call( self, form:Form ):
+		context = form.value
+		self.process(form.children[0])
+		if context:
+			self.emit(ENTER)
+		for arg in form.children[1:]:
+			if arg.value:
+				self.value(arg.children[0])
+			else:
+				self.process(arg.children[0])
+			if context and arg.symbol:
+				self.emit(DEFINE, self.const(arg.symbol))
+		self.emit(CALL, len(form.children) - 1)
+		if context:
+			self.emit(LEAVE)
+
+	def catchall( self, form:Form ):
+		raise ValueError(f"Unexpected form: {form}")
+
+# -----------------------------------------------------------------------------
+#
+# COMPILER
+#
+# -----------------------------------------------------------------------------
+
+class Compiler:
+	"""Compiles AST nodes to bytecode, caching the code of each node and
+	the analysis of each program (the tree that the node is part of). The
+	code only depends on the primitives' protocols, so a compiler can be
+	shared by interpreters with the same primitives."""
+
+	def __init__( self ):
+		self.codes:Dict[Node,Code] = {}
+		self.programs:Dict[Node,Tuple[Set[str],Set[str]]] = {}
+		# The primitives' slots, and the protocol they were compiled for
+		self.slots:Dict[str,int] = {}
+		self.primitives:List[str] = []
+		self.signatures:List[TSignature] = []
+		self.lower      = Lower()
+		self.fold       = Fold()
+		self.resolve    = Resolve()
+		self.specialize = Specialize()
+		self.emitter    = Emit()
+
+	def compile( self, node:Node, context:Context ) -> Code:
+		"""Returns the code for the given node, the context being the one
+		where the primitives are resolved."""
+		code = self.codes.get(node)
+		if code is None:
+			code = self.codes[node] = self.compileNode(node, context)
+		return code
+
+	def slot( self, name:str, value:Any ) -> int:
+		"""Returns the slot of the given primitive."""
+		slot = self.slots.get(name)
+		if slot is None:
+			slot = self.slots[name] = len(self.primitives)
+			self.primitives.append(name)
+			self.signatures.append(signature(value))
+		return slot
+
+	def analyze( self, node:Node, context:Context ) -> Tuple[Set[str],Set[str]]:
+		root = node.root or node
+		res  = self.programs.get(root)
+		if res is None:
+			bound, referenced = analyze(root)
+			res = self.programs[root] = (bound | protocolNames(context), referenced)
+		return res
+
+	def compileNode( self, node:Node, context:Context ) -> Code:
+		shadowed, referenced = self.analyze(node, context)
+		res = self.lower.process(node)
+		res = self.fold.process(res)
+		res = self.resolve.apply(res, context, shadowed)
+		res = self.specialize.apply(res, referenced)
+		return self.emitter.apply(res, node, self)
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,226 @@
+from typing import Optional,Any,List,Tuple,Union,Iterator,Iterable,Deque,NamedTuple
+from concurrent.futures import ProcessPoolExecutor, Future
+from collections import deque
+from itertools import islice, chain
+from tlang.tree.model import Node
+from tlang.tree.columnar import ColumnarNode
+from tlang.tree.binary import MappedTree, openFile
+from tlang.query import Selection, Axis
+from tlang.compiler.query import QueryPlan, ENGINES, compileQuery, runQuery
+from tlang.cache import ASTCache
+import os
+
+__doc__ = """
+Runs queries in parallel over a forest of independent trees (or over the
+partitions of a single large tree), using a pool of worker processes. The
+compiled query plan is sent once to each worker, the trees are sent either
+serialized (see `ASTCache.Dump`) or as the path of a binary tree file (see
+`tlang.tree.binary`), which the worker maps.
+Workers send back the pre-order positions of the captured nodes, which
+are resolved against the original trees, so that the captures are the
+same as with `runQuery`.
+"""
+
+# The number of trees sent to a worker at once
+CHUNK_SIZE = 16
+
+# The plan and engine of the worker process, see `initWorker`
+WORKER_PLAN:Optional[QueryPlan] = None
+WORKER_ENGINE = "walk"
+
+TPositions = List[Tuple[str,int]]
+
+# The engines whose captures are nodes of the tree they are given, which
+# workers can send back as positions. The streaming engine captures new
+# nodes, built from the tree's events.
+PARALLEL_ENGINES = tuple(_ for _ in ENGINES if _ != "stream")
+
+# -----------------------------------------------------------------------------
+#
+# WORKER
+#
+# -----------------------------------------------------------------------------
+
+def initWorker( plan:QueryPlan, engine:str ):
+	global WORKER_PLAN, WORKER_ENGINE
+	WORKER_PLAN   = plan
+	WORKER_ENGINE = engine
+
+def runChunk( items:List[Union[bytes,str]] ) -> List[TPositions]:
+	"""Runs the worker's query on each of the given serialized trees or
+	binary tree paths, returning the captured positions for each."""
+	res:List[TPositions] = []
+	for item in items:
+		if isinstance(item, str):
+			with openFile(item) as tree:
+				res.append([(k, v.position) for k,v in runQuery(WORKER_PLAN, tree, WORKER_ENGINE)])
+		else:
+			tree = ASTCache.Load(item)
+			numbering = tree.number()
+			res.append([(k, numbering.preOf(v)) for k,v in runQuery(WORKER_PLAN, tree, WORKER_ENGINE)])
+	return res
+
+# -----------------------------------------------------------------------------
+#
+# HIGH LEVEL API
+#
+# -----------------------------------------------------------------------------
+
+def resolve( tree:Union[Node,str], positions:TPositions ) -> Iterator[Tuple[str,Union[Node,ColumnarNode]]]:
+	"""Yields the captures for the positions returned by a worker."""
+	if not positions:
+		return
+	elif isinstance(tree, str):
+		# The mapped tree stays open as long as its nodes are referenced
+		mapped = MappedTree(tree)
+		for capture, position in positions:
+			yield (capture, ColumnarNode(mapped, position))
+	else:
+		# The tree might be a subtree, positions being relative to it
+		numbering = tree.number()
+		nodes, start = numbering.nodes, numbering.preOf(tree)
+		for capture, position in positions:
+			yield (capture, nodes[start + position])
+
+def runItems( plan:QueryPlan, items:Iterable[Tuple[Any,Union[bytes,str]]], workers:Optional[int]=None, engine:str="walk", chunkSize:int=CHUNK_SIZE ) -> Iterator[Tuple[Any,TPositions]]:
+	"""Runs the given plan on the given `(key, serialized tree or path)`
+	items using a pool of workers, yielding `(key, positions)` in the
+	order of the items. Results are streamed: only a few chunks per
+	worker are in flight at once."""
+	checkEngine(engine)
+	workers = workers or os.cpu_count() or 1
+	items = iter(items)
+	with ProcessPoolExecutor(max_workers=workers, initializer=initWorker, initargs=(plan, engine)) as executor:
+		pending:Deque[Tuple[List[Any],Future]] = deque()
+		while True:
+			# We keep the pool busy while bounding the number of trees
+			# that are serialized and waiting.
+			while len(pending) < workers * 2:
+				chunk = list(islice(items, chunkSize))
+				if not chunk:
+					break
+				pending.append(([_[0] for _ in chunk], executor.submit(runChunk, [_[1] for _ in chunk])))
+			if not pending:
+				break
+			keys, future = pending.popleft()
+			yield from zip(keys, future.result())
+
+def checkEngine( engine:str ):
+	if engine not in PARALLEL_ENGINES:
+		raise ValueError(f"Unsupported query engine '{engine}' for parallel queries, expected one of: {', '.join(PARALLEL_ENGINES)}")
+
+def compilePlan( query:Union[str,Selection,QueryPlan] ) -> QueryPlan:
+	return compileQuery(query) if isinstance(query, str) else query if isinstance(query, QueryPlan) else QueryPlan.FromSelection(query)
+
+def runQueryParallel( query:Union[str,Selection,QueryPlan], trees:Iterable[Union[Node,str]], workers:Optional[int]=None, engine:str="walk", chunkSize:int=CHUNK_SIZE ) -> Iterator[Tuple[str,Union[Node,ColumnarNode]]]:
+	"""Runs the given query over the given trees (nodes or paths of binary
+	tree files) using a pool of `workers` processes, yielding the
+	`(capture, node)` couples in the order of the trees."""
+	# NOTE: The engine is checked before the trees are iterated
+	checkEngine(engine)
+	items = ((_, _ if isinstance(_, str) else ASTCache.Dump(_)) for _ in trees)
+	return chain.from_iterable(resolve(tree, positions) for tree, positions in runItems(compilePlan(query), items, workers, engine, chunkSize))
+
+# -----------------------------------------------------------------------------
+#
+# PARTITIONING
+#
+# -----------------------------------------------------------------------------
+
+class Partition(NamedTuple):
+	"""A subtree of a partitioned tree, along with the path of its
+	ancestors."""
+
+	position:int
+	path:List[Node]
+	node:Node
+
+# The axes that only look at a node and its ancestors
+UPWARD_AXES = (Axis.SELF, Axis.PARENT, Axis.ANCESTORS)
+
+def isPartitionable( selection:Selection, isWhere:bool=False ) -> bool:
+	"""Tells if the given selection can be evaluated on partitions, which is
+	the case when its steps go down the tree and its `where` clauses only
+	look at the ancestors, which are part of the partition's path."""
+	if selection.axis not in (UPWARD_AXES if isWhere else (Axis.SELF, Axis.CHILDREN, Axis.DESCENDANTS)):
+		return False
+	return all(isPartitionable(_, True) for _ in selection._where) and all(isPartitionable(_, isWhere) for _ in selection._then)
+
+def partitionTree( tree:Node, depth:int ) -> Tuple[List[int],List[Partition]]:
+	"""Splits the given tree into the subtrees rooted at the given depth,
+	returning the (pre-order) positions of the nodes above them along with
+	the partitions, in document order."""
+	if depth < 1:
+		raise ValueError(f"Partition depth must be at least 1, got: {depth}")
+	numbering = tree.number()
+	nodes, depths, sizes = numbering.nodes, numbering.depth, numbering.size
+	start = numbering.preOf(tree)
+	base  = depths[start]
+	end   = start + sizes[start]
+	top:List[int] = []
+	partitions:List[Partition] = []
+	path:List[Node] = []
+	i = start
+	while i < end:
+		d = depths[i] - base
+		del path[d:]
+		if d < depth:
+			top.append(i - start)
+			path.append(nodes[i])
+			i += 1
+		else:
+			partitions.append(Partition(i - start, list(path), nodes[i]))
+			i += sizes[i]
+	return top, partitions
+
+def runQueryPartitioned( query:Union[str,Selection,QueryPlan], tree:Node, depth:int=1, workers:Optional[int]=None, engine:str="walk", chunkSize:int=CHUNK_SIZE ) -> Iterator[Tuple[str,Node]]:
+	"""Runs the given query on a single large tree using a pool of `workers`
+	processes. The tree is split into the subtrees at the given depth, each
+	of them being sent with the path of its ancestors so that the parent
+	and ancestor axes work across partitions. The nodes above the
+	partitions are queried as a separate tree. The captures are yielded in
+	document order, like `runQuery`.
+
+	Queries with `where` clauses that look down the tree (like
+	`//dir[/file]`) need the siblings of the ancestors, so they are run
+	on the whole tree in the current process."""
+	# NOTE: The engine is checked before the query is run, like with
+	# `runQueryParallel`.
+	checkEngine(engine)
+	return partitionedQuery(query, tree, depth, workers, engine, chunkSize)
+
+def partitionedQuery( query:Union[str,Selection,QueryPlan], tree:Node, depth:int, workers:Optional[int], engine:str, chunkSize:int ) -> Iterator[Tuple[str,Node]]:
+	"""See `runQueryPartitioned`, once the engine is checked."""
+	if isinstance(query, str):
+		query = compileQuery(query)
+	if not isPartitionable(query.selection if isinstance(query, QueryPlan) else query):
+		yield from runQuery(query, tree, engine)
+		return
+	plan = compilePlan(query)
+	top, partitions = partitionTree(tree, depth)
+	numbering = tree.number()
+	nodes, start = numbering.nodes, numbering.preOf(tree)
+	# The top of the tree comes first, so that its captures can be merged
+	# with the ones of the partitions as they come.
+	items = chain(
+		((None, ASTCache.Dump(tree.copy(depth - 1))),),
+		((_, ASTCache.Dump(_.node, _.path)) for _ in partitions),
+	)
+	captures:List[Tuple[str,int]] = []
+	i = 0
+	for partition, positions in runItems(plan, items, workers, engine, chunkSize):
+		if partition is None:
+			captures = [(k, top[p]) for k, p in positions]
+			continue
+		while i < len(captures) and captures[i][1] < partition.position:
+			yield (captures[i][0], nodes[start + captures[i][1]])
+			i += 1
+		# The path's captures are the ones of the top of the tree
+		offset = len(partition.path)
+		for capture, p in positions:
+			if p >= offset:
+				yield (capture, nodes[start + partition.position + p - offset])
+	for capture, p in captures[i:]:
+		yield (capture, nodes[start + p])
+
+# EOF - vim: ts=4 sw=4 noet
@@ -1,7 +1,17 @@
 from enum import Enum
 from tlang.tree import Node
-from tlang.query import Selection, Predicate
-from typing import Optional, Iterator, NamedTuple, Tuple, Dict, List, Set, Union
+from tlang.tree.model import Repr, NodeTemplate, TreeCursor
+from tlang.tree.events import TEvent, OPEN, ATTR, CLOSE, TEMPLATE, parseEvents, treeEvents
+from tlang.tree.columnar import ColumnarTree, ColumnarNode, ColumnarCursor
+from tlang.tree.index import TreeIndex
+from tlang.query import Selection, Predicate, Axis
+from tlang.query.model import NodeNamePredicate, AttributeNamePredicate
+from typing import Optional, Iterator, Iterable, NamedTuple, Tuple, Dict, List, Set, Union, Sequence, Callable, Any, Deque
+from collections import OrderedDict, deque
+from itertools import repeat
+from array import array
+from bisect import bisect_left
+import re
 
 class Comparator(Enum):
 	NONE = -100
@@ -31,27 +41,99 @@ class Traversal:
 	detect if there is a match or not."""
 
 	@classmethod
-	def DownDepth(cls, node:Node) -> Iterator[TraversalStep]:
-		"""Walks down the given node and yields corresponding TraversalStep, starting
-		off the given `depth` and `step`. """
+	def DownDepth(cls, node:Union[Node,ColumnarTree,ColumnarNode]) -> Iterator[TraversalStep]:
+		"""Walks down the given node in pre-order and yields corresponding
+		TraversalStep, the given node being at depth 0."""
+		if isinstance(node, (ColumnarTree, ColumnarNode)):
+			yield from cls.ColumnarDepth(node)
+			return
+		elif node._numbering and node.numbering.position(node) >= 0:
+			yield from cls.NumberedDepth(node)
+			return
+		# NOTE: The cursor is moved along, so the only allocation is the
+		# step that is yielded.
+		cursor = TreeCursor(node)
 		i = 0
-		stack = [TraversalStep(node, 0, 0, 0)]
-		while stack:
-			step = stack.pop()
-			yield TraversalStep(step.node, step.depth, step.breadth, i)
+		while True:
+			yield TraversalStep(cursor.node, len(cursor.path), cursor.indexes[-1] if cursor.indexes else 0, i)
 			i += 1
-			for j,child in enumerate(step.node.children):
-				stack.append(TraversalStep(child, step.depth + 1, j, 0))
+			if not cursor.next():
+				break
+
+	@classmethod
+	def ColumnarDepth(cls, node:Union[ColumnarTree,ColumnarNode]) -> Iterator[TraversalStep]:
+		"""Walks a columnar tree (or a subtree of it) in pre-order. As the
+		columnar tree is already stored in pre-order, this is a linear scan
+		of its columns: the step's node is a single cursor that is moved
+		along, and no view is created per node."""
+		if isinstance(node, ColumnarTree):
+			tree, start, end = node, 0, len(node)
+		else:
+			tree, start = node.tree, node.position
+			end = start + tree.size[start]
+		cursor   = ColumnarCursor(tree, start)
+		depths   = tree.depth
+		base     = depths[start] if end > start else 0
+		# The breadth (sibling index) for each depth of the current path
+		breadths:List[int] = []
+		for i in range(start, end):
+			depth = depths[i] - base
+			if depth == len(breadths):
+				breadths.append(0)
+			else:
+				del breadths[depth + 1:]
+				breadths[depth] += 1
+			cursor.position = i
+			yield TraversalStep(cursor, depth, breadths[depth], i - start)
+
+	@classmethod
+	def NumberedDepth(cls, node:Node) -> Iterator[TraversalStep]:
+		"""Walks a numbered tree (or a subtree of it) in pre-order, which
+		is a scan of the numbering's nodes."""
+		numbering = node.numbering
+		start     = numbering.preOf(node)
+		end       = start + numbering.size[start]
+		nodes     = numbering.nodes
+		depths    = numbering.depth
+		base      = depths[start]
+		breadths:List[int] = []
+		for i in range(start, end):
+			depth = depths[i] - base
+			if depth == len(breadths):
+				breadths.append(0)
+			else:
+				del breadths[depth + 1:]
+				breadths[depth] += 1
+			yield TraversalStep(nodes[i], depth, breadths[depth], i - start)
 
 	@classmethod
-	def DownBreadth(cls, node:Node, depth:int=0, step:int=0) -> Iterator[TraversalStep]:
-		"""Walks the give node in a breadth-first mode, yielding corresponding
-		traversal steps."""
-		for i,c in enumerate(node.children):
-			yield TraversalStep(c, depth, i, step)
-			step += 1
-		for c in node.children:
-			yield from cls.DownBreadth(c, depth + 1, step)
+	def DownBreadth(cls, node:Node, maxDepth:Optional[int]=None, functor:Optional[Callable[[Node],Any]]=None) -> Iterator[TraversalStep]:
+		"""Walks down the given node in level order, yielding the steps
+		of all the nodes at depth 0 (the given node), then at depth 1,
+		and so on up to `maxDepth` (included), the breadth being the
+		index of the node within its parent. Like `Node.walk`, the nodes
+		for which the functor returns `False` are skipped along with their
+		descendants."""
+		if functor and functor(node) is False:
+			return
+		yield TraversalStep(node, 0, 0, 0)
+		# NOTE: Only the nodes with children are queued, so that the
+		# leaves (which are most of the nodes of a wide tree) are not
+		# kept in memory.
+		queue:Deque[Tuple[Node,int]] = deque()
+		if node._children and maxDepth != 0:
+			queue.append((node, 1))
+		i = 1
+		while queue:
+			parent, depth = queue.popleft()
+			isLast = maxDepth is not None and depth >= maxDepth
+			for j, child in enumerate(parent._children):
+				if functor and functor(child) is False:
+					continue
+				yield TraversalStep(child, depth, j, i)
+				i += 1
+				if child._children and not isLast:
+					queue.append((child, depth + 1))
 
 # -----------------------------------------------------------------------------
 #
@@ -114,29 +196,37 @@ class RuleDependency:
 	"""Represents a dependency between two rules. For instance, in the
 	selection `dir/file`, `file` depends on `dir`."""
 
-	@staticmethod
-	def FromRule( rule, axis ):
-
-	def __init__( self, rule:TraversalRule, axis:Axis )
+	def __init__( self, rule:TraversalRule, axis:Axis ):
 		self.rule = rule
-		self.axis:QueryAxis, self.comparator:Comparator, self.minDistance:int, self.maxDistance:int = self.parseAxis(axis)
+		self.axis:QueryAxis
+		self.comparator:Comparator
+		self.minDistance:int
+		self.maxDistance:int
+		self.axis, self.comparator, self.minDistance, self.maxDistance = self.parseAxis(axis)
 
 	def parseAxis( self, axis:Axis ):
-		if axis == Axis.CHILDREN:
-			return (QueryAxis.VERTICAL, Comparator.EQ, 1, 1)
-		elif axis == Axis.DESCENDANTS:
+		# NOTE: The distance is always measured from the dependency's
+		# match to the current step. `dir/file` means that `file` is one
+		# level below `dir`, while `file[\\dir]` means that `dir` is at
+		# least one level above `file`, which is the same distance.
+		if axis == Axis.SELF:
+			return (QueryAxis.VERTICAL, Comparator.EQ, 0, 0)
+		elif axis == Axis.CHILDREN or axis == Axis.PARENT:
 			return (QueryAxis.VERTICAL, Comparator.EQ, 1, 1)
+		elif axis == Axis.DESCENDANTS or axis == Axis.ANCESTORS:
+			return (QueryAxis.VERTICAL, Comparator.GTE, 1, -1)
+		else:
+			raise NotImplementedError(f"Axis not supported yet: {axis}")
 
 	def match( self, step:TraversalStep, matches:TMatches ) -> bool:
 		# NOTE: For performance, the conditional should be outside of the for
-		for match in matches.get(self.rule, ()):
-			if self.axis in Axis.VERTICAL:
-				# FIXME: This requires that the matches are popped when
-				# backtracking in the traversal
-				if self.matchDistance(step.depth - match.depth):
-					return True
-			else:
-				raise ValueError(f"Axis type not supported: {self.axis}")
+		if self.axis is not QueryAxis.VERTICAL:
+			raise ValueError(f"Axis type not supported: {self.axis}")
+		# The interpreter pops the matches when backtracking, so that
+		# the matches only contain the current step and its ancestors.
+		for match in reversed(matches.get(self.rule, ())):
+			if self.matchDistance(step.depth - match.depth):
+				return True
 		return False
 
 	def matchDistance( self, d ):
@@ -149,12 +239,15 @@ class RuleDependency:
 		elif self.comparator == Comparator.EQ:
 			return self.minDistance <= d and d <= self.maxDistance
 		elif self.comparator == Comparator.GT:
-			return d >= self.minDistance
-		elif self.comparator == Comparator.GTE:
 			return d > self.minDistance
+		elif self.comparator == Comparator.GTE:
+			return d >= self.minDistance
 		else:
 			raise ValueError(f"Comparator not supported: {self.comparator}")
 
+	def __repr__( self ):
+		return f"{self.axis.name}({self.comparator.name} {self.minDistance}):{self.rule.id}"
+
 # -----------------------------------------------------------------------------
 #
 # COMPOSITE
@@ -166,35 +259,27 @@ class Composite(TraversalRule):
 
 	IDS = 0
 
-	def __init__( self, selection, anchor=RootRule ):
+	def __init__( self, selection:Selection, captures:Optional[str]=None, query:Any=None ):
 		super().__init__(f"R{Composite.IDS}")
 		Composite.IDS += 1
 		self.selection:Selection = selection
-		self.dependencies:List[RuleDependency] = [
-			RuleDependency.FromSelection(selection)
-		]
+		self._captures = captures
+		# The id of the query the rule captures for, see `QuerySet`
+		self.query = query
+		self.dependencies:List[RuleDependency] = []
 
 	@property
 	def captures( self ):
-		return self.selection._captures
-
-	# def requires( self, rule:TraversalRule ):
-	# 	# We register a dependency between the required rule and this
-	# 	# rule. This is useful as terminals need to know which rules
-	# 	# shold be then checked.
-	# 	assert isinstance(rule, TraversalRule), f"Expected TraversalRule, got: {rule}"
-	# 	if self not in rule.usedBy:
-	# 		rule.usedBy.append(self)
-	# 	self.dependencies.append(RuleDependency(rule, axis, comparator, distance))
-	# 	return self
-
-	def compose( self, rule:'Composite' ):
-		assert isinstance(rule, Composite), f"Cannot compose with a terminal: {self} with {rule}"
-		# We transpose all the dependencies with respect to the new rule
-		# FIXME: This won't work for /file\\dir, for instance.
-		self.dependencies = [_.transpose(rule.selection.axis) for _ in self.dependencies]
-		# We add a new dependency for the given rule
-		self.requires(rule, axis=rule.selection.axis)
+		return self._captures
+
+	def requires( self, rule:TraversalRule, axis:Axis=Axis.SELF ):
+		# We register a dependency between the required rule and this
+		# rule. This is useful as terminals need to know which rules
+		# shold be then checked.
+		assert isinstance(rule, TraversalRule), f"Expected TraversalRule, got: {rule}"
+		if self not in rule.usedBy:
+			rule.usedBy.append(self)
+		self.dependencies.append(RuleDependency(rule, axis))
 		return self
 
 	def match( self, step:TraversalStep, matches:TMatches ):
@@ -219,20 +304,25 @@ class SelectionProcessor:
 	"""Processes selection object and registers rules (terminals and
 	composites) that can then be used by the query interpreter."""
 
+	# The axes that can be resolved in a `where` clause, as the
+	# interpreter only knows about the current step and its ancestors.
+	WHERE_AXES = (Axis.SELF, Axis.PARENT, Axis.ANCESTORS)
+
 	def __init__( self ):
 		self.terminals:Dict[str,Terminal] = {}
 		self.composites:List[Composite] = []
 
-	def process( self, selection:Selection ):
+	def process( self, selection:Selection, query:Any=None ):
 		# We extract the predicate from the selection and wrap it in a
 		# terminal. Note that throughout the whole process we use the
 		# string representation of a selection or predicate to get its
-		# identity/signature, so that we can reuse them.
-		self.processSelection(selection)
+		# identity/signature, so that we can reuse them. As the terminals
+		# are kept, processing more selections with the same processor
+		# shares their terminals.
+		self.processSelection(selection, RootRule, selection._captures, query)
 		return ([_ for _ in self.terminals.values()], self.composites)
 
-	def processSelection( self, selection:Selection ) -> Composite:
-		assert len(selection._then) <= 1
+	def processSelection( self, selection:Selection, anchor:Optional[TraversalRule], captures:Optional[str]=None, query:Any=None ) -> Composite:
 		# We wrap the selection predicate in a terminal. For
 		# instance, if we have `//dir` then we extract `dir`
 		# as a separate terminal rule. The terminals are shared amongst
@@ -240,18 +330,26 @@ class SelectionProcessor:
 		# predicate).
 		predicate = self.processPredicate(selection.predicate)
 		assert predicate, f"Selection must have predicate: {selection}"
-		# We create the composite that requires that predicate
-		composite = Composite(selection).requires(predicate)
+		# The captures are carried by the last selection of a `then`
+		# chain, as `dir/file` yields the `file` nodes.
+		composite = Composite(selection, None if selection._then else captures, query).requires(predicate)
 		self.composites.append(composite)
+		# The selection is relative to its anchor, which is the root
+		# for the query and the previous selection in `dir/file`.
+		if anchor:
+			composite.requires(anchor, selection.axis)
 		# Now we process the "where" rules (the one in []), like `@path`
 		# in `//dir[@path]`. These rules must be satified for this
 		# rule to happen.
 		for sub_sel in selection._where:
-			composite.requires(self.processSelection(sub_sel))
-		# And now we process the "then" rules, like `dir/file`
-		if selection._then:
-			assert (len(selection._then) == 1)
-			composite.compose(self.processSelection(selection._then[0]))
+			if sub_sel.axis not in self.WHERE_AXES or sub_sel._then:
+				raise NotImplementedError(f"Where clause not supported yet: {sub_sel} in {selection}")
+			composite.requires(self.processSelection(sub_sel, None), sub_sel.axis)
+		# And now we process the "then" rules, like `dir/file`, which are
+		# a chain where each selection is anchored on the previous one.
+		last = len(selection._then) - 1
+		for i, then in enumerate(selection._then):
+			composite = self.processSelection(then, composite, captures if i == last else None, query)
 		return composite
 
 	def processPredicate( self, predicate:Predicate ) -> Optional[Terminal]:
@@ -279,48 +377,70 @@ class QueryInterpreter:
 		self.transform = SelectionProcessor()
 		self.terminals = []
 		self.composites = []
-		self.isTracing = True
+		self.isTracing = False
 		self.trace = print
 
-	def register( self, query:Selection ):
-		(self.terminals, self.composites) = SelectionProcessor().process(query)
+	def register( self, query:Union[Selection,'QueryPlan'] ):
+		if isinstance(query, QueryPlan):
+			# Compiled plans already have their rules
+			self.terminals, self.composites = list(query.terminals), list(query.composites)
+		else:
+			(self.terminals, self.composites) = SelectionProcessor().process(query)
 		return self
 
-	def run( self, root:Node ):
-		matches:Dict[TraversalRule, List[TraversalStep]] = {
-			RootRule:[TraversalStep(root,0,0,0)],
+	def run( self, root:Union[Node,ColumnarTree,ColumnarNode] ):
+		for rule, node in self.matches(root):
+			yield (rule.captures, node)
+
+	def matches( self, root:Union[Node,ColumnarTree,ColumnarNode] ) -> Iterator[Tuple[Composite,Any]]:
+		"""Yields the `(rule, node)` pairs for each capturing rule that
+		matches a node, in document order."""
+		# The root rule matches the (virtual) parent of the root, so that
+		# `//dir` includes the root and `/dir` only matches the root.
+		matches:TMatches = {
+			RootRule:[TraversalStep(root,-1,0,-1)],
 		}
 		for step in Traversal.DownDepth(root):
-			if self.isTracing:
-				self.trace("―┄ Step:", step.index, "/", ",".join(str(_) for _ in matches.keys()))
-				self.trace("―┄┄ Node:", step.node)
-			# We seed the lis of rules to check with the terminals
-			to_check = [_ for _ in self.terminals]
-			# Some rules might be matched more than one, so we keep
-			# track of the matched ones.
-			matched = []
-			while to_check:
-				rule = to_check.pop(0)
-				if rule.match(step, matches) and rule not in matched:
-					if self.isTracing:
-						self.trace ("―┄┄ ✓ Match:", rule, "matched, captures?", rule.captures)
-					if rule.captures:
-						yield (rule.captures, step.node)
-					# The latest matches go first
-					matches.setdefault(rule,[]).insert(0, step)
-					# FIXME: This might lead ot testing the same rule
-					# multiple times and potentially having loops. Like
-					# for cells, we should pre-compute the transitive
-					# dependencies.
-					matched.append(rule)
-					for dep_rule in rule.usedBy:
-						if dep_rule not in matched:
-							to_check.append(dep_rule)
-				else:
-					if self.isTracing:
-						self.trace("―┄┄ ✗ No match:", rule)
+			yield from self.matchStep(step, matches)
+
+	def matchStep( self, step:TraversalStep, matches:TMatches ) -> Iterator[Tuple[Composite,Any]]:
+		"""Matches the rules against the given step, updating the matches
+		and yielding the capturing rules that matched."""
 		if self.isTracing:
-			self.traceMatchingTable(matches)
+			self.trace("―┄ Step:", step.index, "/", ",".join(str(_) for _ in matches.keys()))
+			self.trace("―┄┄ Node:", step.node)
+		# We pop the matches that are not ancestors of the current
+		# step anymore (ie. siblings and their descendants)
+		for rule_matches in matches.values():
+			while rule_matches and rule_matches[-1].depth >= step.depth:
+				rule_matches.pop()
+		# We seed the lis of rules to check with the terminals
+		to_check = deque(self.terminals)
+		# Some rules might be matched more than one, so we keep
+		# track of the matched ones.
+		matched:Set[TraversalRule] = set()
+		while to_check:
+			rule = to_check.popleft()
+			if rule not in matched and rule.match(step, matches):
+				if self.isTracing:
+					self.trace ("―┄┄ ✓ Match:", rule, "matched, captures?", rule.captures)
+				if rule.captures:
+					# Cursors are moved along the traversal, so we
+					# capture a view of the current position.
+					yield (rule, step.node.view() if isinstance(step.node, ColumnarCursor) else step.node)
+				# The matches are stacks, the latest match being last
+				matches.setdefault(rule,[]).append(step)
+				# FIXME: This might lead ot testing the same rule
+				# multiple times and potentially having loops. Like
+				# for cells, we should pre-compute the transitive
+				# dependencies.
+				matched.add(rule)
+				for dep_rule in rule.usedBy:
+					if dep_rule not in matched:
+						to_check.append(dep_rule)
+			else:
+				if self.isTracing:
+					self.trace("―┄┄ ✗ No match:", rule)
 
 	def traceMatchingTable( self, matches, trace=None ):
 		trace = self.trace
@@ -334,4 +454,819 @@ class QueryInterpreter:
 		for i in range(last_index + 1):
 			trace (f"{i:4d}\t" + "\t".join("✓" if _[i] else " " for _ in col_values))
 
+# -----------------------------------------------------------------------------
+#
+# PATH AUTOMATON
+#
+# -----------------------------------------------------------------------------
+
+class PathState:
+	"""A state of the path automaton's NFA. Each `/name` step is a
+	transition on the name id, and each `//` step goes through a *loop*
+	state, which stays active for all the descendants of the node that
+	activated it."""
+
+	__slots__ = ("transitions", "loop", "isLoop", "accepts")
+
+	def __init__( self, isLoop:bool=False ):
+		self.transitions:Dict[int,'PathState'] = {}
+		# The loop state reached by an ε-transition, for `//` steps
+		self.loop:Optional['PathState'] = None
+		self.isLoop = isLoop
+		# The `(query id, captures)` of the paths ending in this state
+		self.accepts:List[Tuple[Any,Optional[str]]] = []
+
+class PathDFAState:
+	"""A state of the (lazily built) DFA, which is a set of NFA states. The
+	transitions are filled on demand as names are encountered."""
+
+	__slots__ = ("states", "next", "accepts", "isDead")
+
+	def __init__( self, states:frozenset ):
+		self.states = states
+		self.next:Dict[int,'PathDFAState'] = {}
+		self.accepts:Tuple[Tuple[Any,Optional[str]],...] = tuple(_ for s in states for _ in s.accepts)
+		# No path can match in the subtree of a node in a dead state
+		self.isDead = not states
+
+class PathAutomaton:
+	"""Matches simple downward paths like `a/b//c` with a deterministic
+	automaton over node names, like streaming XPath engines (YFilter)
+	do. The paths of all the registered queries are merged in a single
+	NFA that shares their common prefixes, which is then determinized
+	lazily. A pre-order walk keeps the DFA state of each ancestor, so
+	that each node costs one table lookup whatever the number of
+	queries."""
+
+	def __init__( self ):
+		self.root = PathState()
+		self.count = 0
+		self.reset()
+
+	@staticmethod
+	def IsPath( selection:Selection ) -> bool:
+		"""Tells if the given selection is a chain of `/name` and `//name`
+		steps, without `where` clauses."""
+		for step in selection.steps():
+			if step.axis not in (Axis.CHILDREN, Axis.DESCENDANTS) or not isinstance(step.predicate, NodeNamePredicate):
+				return False
+			if step._where:
+				return False
+		return True
+
+	def reset( self ):
+		# The DFA needs to be rebuilt when paths are added
+		self.states:Dict[frozenset,PathDFAState] = {}
+		self.start = self.state(self.closure((self.root,)))
+
+	def add( self, selection:Selection, query:Any=None ) -> 'PathAutomaton':
+		"""Adds the path of the given selection, which must be a path
+		(see `IsPath`), captures being tagged with the given query id."""
+		assert self.IsPath(selection), f"Selection is not a simple path: {selection}"
+		state = self.root
+		for step in selection.steps():
+			if step.axis == Axis.DESCENDANTS:
+				if not state.loop:
+					state.loop = PathState(True)
+				state = state.loop
+			name = step.predicate.nameId
+			if name not in state.transitions:
+				state.transitions[name] = PathState()
+			state = state.transitions[name]
+		state.accepts.append((query, selection._captures))
+		self.count += 1
+		self.reset()
+		return self
+
+	def closure( self, states:Iterable[PathState] ) -> frozenset:
+		return frozenset(_ for s in states for _ in ((s, s.loop) if s.loop else (s,)))
+
+	def state( self, states:frozenset ) -> PathDFAState:
+		res = self.states.get(states)
+		if res is None:
+			res = PathDFAState(states)
+			self.states[states] = res
+		return res
+
+	def transition( self, state:PathDFAState, name:int ) -> PathDFAState:
+		"""Returns the state reached from the given state when entering
+		a node with the given name id."""
+		res = state.next.get(name)
+		if res is None:
+			reached = []
+			for s in state.states:
+				if s.isLoop:
+					reached.append(s)
+				t = s.transitions.get(name)
+				if t:
+					reached.append(t)
+			res = self.state(self.closure(reached))
+			state.next[name] = res
+		return res
+
+	def run( self, root:Union[Node,ColumnarTree,ColumnarNode] ) -> Iterator[Tuple[Any,Optional[str],Any]]:
+		"""Yields `(query id, captures, node)` for the nodes matched by
+		the paths, in document order. Subtrees of dead states are
+		skipped."""
+		if not isinstance(root, Node):
+			states = [self.start]
+			for step in Traversal.DownDepth(root):
+				del states[step.depth + 1:]
+				state = self.transition(states[step.depth], step.node.nameId)
+				states.append(state)
+				for query, captures in state.accepts:
+					yield (query, captures, step.node.view() if isinstance(step.node, ColumnarCursor) else step.node)
+			return
+		transition = self.transition
+		stack = [(root, self.start)]
+		pop   = stack.pop
+		push  = stack.extend
+		while stack:
+			node, parent = pop()
+			name  = node.nameId
+			state = parent.next.get(name) or transition(parent, name)
+			for query, captures in state.accepts:
+				yield (query, captures, node)
+			if not state.isDead and node.children:
+				push(zip(reversed(node.children), repeat(state)))
+
+# -----------------------------------------------------------------------------
+#
+# QUERY SET
+#
+# -----------------------------------------------------------------------------
+
+class QuerySet(QueryInterpreter):
+	"""Runs many queries in a single pass over the tree. The selections
+	are processed by the same `SelectionProcessor`, so that the terminals
+	they have in common (like `dir` in `//dir/file` and `//dir[@name]`)
+	are only tested once per node, and the captures are tagged with the
+	id of the query that produced them. Simple paths like `//dir/file`
+	are matched by a shared `PathAutomaton` instead of rules."""
+
+	def __init__( self ):
+		super().__init__()
+		self.queries:Dict[Any,Selection] = OrderedDict()
+		self.automaton = PathAutomaton()
+
+	def register( self, query:Union[Selection,'QueryPlan',str], id:Any=None ) -> 'QuerySet':
+		"""Registers the given query, which is identified by `id`, defaulting
+		to its registration index."""
+		id = len(self.queries) if id is None else id
+		if id in self.queries:
+			raise ValueError(f"Query already registered with id: {id!r}")
+		# Plans come with their own rules, so we process their selection
+		# again to share the terminals.
+		selection = compileQuery(query).selection if isinstance(query, str) else query.selection if isinstance(query, QueryPlan) else query
+		self.queries[id] = selection
+		if PathAutomaton.IsPath(selection):
+			self.automaton.add(selection, id)
+		else:
+			(self.terminals, self.composites) = self.transform.process(selection, id)
+		return self
+
+	def registerMany( self, queries:Union[Iterable[Any],Dict[Any,Any]] ) -> 'QuerySet':
+		"""Registers the given queries, the ids being the keys if a dict
+		is given."""
+		for id, query in (queries.items() if isinstance(queries, dict) else ((None, _) for _ in queries)):
+			self.register(query, id)
+		return self
+
+	def run( self, root:Union[Node,ColumnarTree,ColumnarNode] ):
+		"""Yields `(query id, captures, node)` for all the registered
+		queries, in document order."""
+		if not self.composites:
+			yield from self.automaton.run(root)
+			return
+		elif not self.automaton.count:
+			for rule, node in self.matches(root):
+				yield (rule.query, rule.captures, node)
+			return
+		# We have both paths and rules, so we drive the automaton along
+		# the rules' traversal, keeping the DFA state of each ancestor.
+		automaton = self.automaton
+		states = [automaton.start]
+		matches:TMatches = {
+			RootRule:[TraversalStep(root,-1,0,-1)],
+		}
+		for step in Traversal.DownDepth(root):
+			del states[step.depth + 1:]
+			state = automaton.transition(states[step.depth], step.node.nameId)
+			states.append(state)
+			for query, captures in state.accepts:
+				yield (query, captures, step.node.view() if isinstance(step.node, ColumnarCursor) else step.node)
+			for rule, node in self.matchStep(step, matches):
+				yield (rule.query, rule.captures, node)
+
+class PathQueryInterpreter(QuerySet):
+	"""Runs queries like `QueryInterpreter`, simple paths being matched
+	by the path automaton."""
+
+	def run( self, root:Union[Node,ColumnarTree,ColumnarNode] ):
+		for query, captures, node in super().run(root):
+			yield (captures, node)
+
+# -----------------------------------------------------------------------------
+#
+# INDEXED QUERY INTERPRETER
+#
+# -----------------------------------------------------------------------------
+
+class IndexedQueryInterpreter:
+	"""Evaluates queries against a `TreeIndex`, one set of positions at a
+	time: each step of the selection looks up the candidate positions for
+	its predicate in the index and keeps the ones that are in the right
+	relation with the current contexts, so that only the nodes that match
+	the predicates are visited. Results are yielded in document order,
+	like `QueryInterpreter`."""
+
+	def __init__( self ):
+		self.queries:List[Selection] = []
+		self.candidates:Dict[str,Sequence[int]] = {}
+
+	def register( self, query:Union[Selection,'QueryPlan'] ):
+		self.queries.append(query.selection if isinstance(query, QueryPlan) else query)
+		return self
+
+	def run( self, root:Union[TreeIndex,Node,ColumnarTree,List[Node]] ):
+		# The index should be built once and passed along when running
+		# more than one query against the same tree.
+		index = root if isinstance(root, TreeIndex) else TreeIndex(root)
+		self.candidates = {}
+		for query in self.queries:
+			if not query._captures:
+				continue
+			for position in self.select(index, query, [-1]):
+				yield (query._captures, index.node(position))
+
+	def select( self, index:TreeIndex, selection:Selection, contexts:Sequence[int] ) -> Sequence[int]:
+		"""Returns the sorted positions matched by the selection from
+		the given (sorted) context positions, `-1` being the document."""
+		positions = self.step(index, selection.axis, selection.predicate, contexts)
+		for where in selection._where:
+			positions = [_ for _ in positions if self.select(index, where, [_])]
+		for then in selection._then:
+			positions = self.select(index, then, positions)
+		return positions
+
+	def step( self, index:TreeIndex, axis:Axis, predicate:Predicate, contexts:Sequence[int] ) -> Sequence[int]:
+		if not contexts:
+			return []
+		candidates = self.lookup(index, predicate)
+		if axis == Axis.DESCENDANTS:
+			return index.descendants(candidates, contexts)
+		elif axis == Axis.CHILDREN:
+			return index.children(candidates, contexts)
+		elif axis == Axis.SELF:
+			return [_ for _ in contexts if _ >= 0 and self.contains(candidates, _)]
+		elif axis == Axis.PARENT:
+			return [_ for _ in index.parents(contexts) if self.contains(candidates, _)]
+		elif axis == Axis.ANCESTORS:
+			return [_ for _ in index.ancestors(contexts) if self.contains(candidates, _)]
+		else:
+			raise NotImplementedError(f"Axis not supported by the indexed interpreter: {axis}")
+
+	def lookup( self, index:TreeIndex, predicate:Predicate ) -> Sequence[int]:
+		"""Returns the sorted positions of the nodes matching the predicate,
+		using the inverted indexes when the predicate is supported, and
+		otherwise testing the predicate once per node and per run."""
+		if isinstance(predicate, NodeNamePredicate):
+			return index.withName(predicate.name)
+		elif isinstance(predicate, AttributeNamePredicate):
+			return index.withAttribute(predicate.attribute)
+		key = str(predicate)
+		res = self.candidates.get(key)
+		if res is None:
+			res = array("I", (i for i in range(len(index)) if predicate.match(index.node(i))))
+			self.candidates[key] = res
+		return res
+
+	def contains( self, candidates:Sequence[int], position:int ) -> bool:
+		i = bisect_left(candidates, position)
+		return i < len(candidates) and candidates[i] == position
+
+# -----------------------------------------------------------------------------
+#
+# STRUCTURAL JOIN INTERPRETER
+#
+# -----------------------------------------------------------------------------
+
+class StructuralJoinInterpreter(IndexedQueryInterpreter):
+	"""Evaluates queries by computing the candidate positions of each step
+	(filtered by its `where` clauses) and combining them with stack-based
+	structural joins over the pre/post numbers of a `TreeIndex`, in the
+	style of StackTree. Each join is a single merge of two sorted lists,
+	so a step costs `O(contexts + candidates)` regardless of the shape of
+	the tree."""
+
+	# The axis that relates the context to the result, seen from the result
+	INVERSE = {
+		Axis.SELF        : Axis.SELF,
+		Axis.CHILDREN    : Axis.PARENT,
+		Axis.DESCENDANTS : Axis.ANCESTORS,
+		Axis.PARENT      : Axis.CHILDREN,
+		Axis.ANCESTORS   : Axis.DESCENDANTS,
+	}
+
+	def select( self, index:TreeIndex, selection:Selection, contexts:Sequence[int] ) -> Sequence[int]:
+		if selection.axis not in self.INVERSE:
+			raise NotImplementedError(f"Axis not supported by the structural join interpreter: {selection.axis}")
+		positions = self.semijoin(index, self.filter(index, selection), contexts, self.INVERSE[selection.axis])
+		for then in selection._then:
+			positions = self.select(index, then, positions)
+		return positions
+
+	def filter( self, index:TreeIndex, selection:Selection ) -> Sequence[int]:
+		"""Returns the positions that match the selection's predicate and
+		satisfy its `where` clauses."""
+		positions = self.lookup(index, selection.predicate)
+		for where in selection._where:
+			positions = self.semijoin(index, positions, self.exists(index, where), where.axis)
+		return positions
+
+	def exists( self, index:TreeIndex, selection:Selection ) -> Sequence[int]:
+		"""Returns the positions from which the given (sub) selection,
+		including its `then` steps, has at least one match. This is how
+		`where` clauses like `[\\dir/file]` are resolved."""
+		positions = self.filter(index, selection)
+		for then in selection._then:
+			positions = self.semijoin(index, positions, self.exists(index, then), then.axis)
+		return positions
+
+	def semijoin( self, index:TreeIndex, left:Sequence[int], right:Sequence[int], axis:Axis ) -> Sequence[int]:
+		"""Returns the positions in `left` that have at least one position
+		of `right` along the given axis, `-1` in `right` denoting the
+		(virtual) document."""
+		if not left or not right:
+			return []
+		if axis == Axis.SELF:
+			return self.intersect(left, right)
+		elif axis == Axis.DESCENDANTS:
+			return self.stackJoin(index, left, right, False, True)
+		elif axis == Axis.CHILDREN:
+			return self.stackJoin(index, left, right, True, True)
+		elif right[0] < 0:
+			# The document is the ancestor of every node, and the parent
+			# of the roots.
+			if axis == Axis.ANCESTORS:
+				return list(left)
+			roots = [_ for _ in left if index.parent[_] < 0]
+			return self.union(roots, self.semijoin(index, left, right[1:], axis))
+		elif axis == Axis.ANCESTORS:
+			return self.stackJoin(index, right, left, False, False)
+		elif axis == Axis.PARENT:
+			return self.stackJoin(index, right, left, True, False)
+		else:
+			raise NotImplementedError(f"Axis not supported by the structural join interpreter: {axis}")
+
+	def stackJoin( self, index:TreeIndex, ancestors:Sequence[int], descendants:Sequence[int], isChild:bool, isAncestorOutput:bool ) -> List[int]:
+		"""Joins the sorted ancestor and descendant candidates, returning
+		either the ancestors that have a matching descendant or the
+		descendants that have a matching ancestor. The stack holds the
+		chain of nested ancestors that contain the current descendant,
+		which makes the parent check a test on the top of the stack."""
+		post, depth = index.post, index.depth
+		stack:List[int] = []
+		# For ancestor output, whether the stack entry has a match. A match
+		# is propagated to the entry below when popped, as the entries
+		# below are also ancestors of the matching descendant.
+		matched:List[bool] = []
+		res:List[int] = []
+		i, n = 0, len(ancestors)
+		for d in descendants:
+			while i < n and ancestors[i] < d:
+				a = ancestors[i]
+				i += 1
+				while stack and post[stack[-1]] < post[a]:
+					self.pop(stack, matched, res, isChild)
+				stack.append(a)
+				matched.append(False)
+			while stack and post[stack[-1]] < post[d]:
+				self.pop(stack, matched, res, isChild)
+			if stack and (not isChild or depth[stack[-1]] + 1 == depth[d]):
+				if isAncestorOutput:
+					matched[-1] = True
+				else:
+					res.append(d)
+		if isAncestorOutput:
+			while stack:
+				self.pop(stack, matched, res, isChild)
+			# Ancestors are popped in post-order
+			res.sort()
+		return res
+
+	def pop( self, stack:List[int], matched:List[bool], res:List[int], isChild:bool ):
+		a = stack.pop()
+		if matched.pop():
+			res.append(a)
+			if matched and not isChild:
+				matched[-1] = True
+
+	def intersect( self, a:Sequence[int], b:Sequence[int] ) -> List[int]:
+		res:List[int] = []
+		i, j = 0, 0
+		while i < len(a) and j < len(b):
+			if a[i] < b[j]:
+				i += 1
+			elif a[i] > b[j]:
+				j += 1
+			else:
+				res.append(a[i])
+				i += 1
+				j += 1
+		return res
+
+	def union( self, a:Sequence[int], b:Sequence[int] ) -> List[int]:
+		return sorted(set(a).union(b))
+
+# -----------------------------------------------------------------------------
+#
+# CODE GENERATION
+#
+# -----------------------------------------------------------------------------
+
+class QueryCodeGenerator:
+	"""Generates the Python source of a function that evaluates a selection
+	over a `Node` tree. The function does an iterative pre-order walk where
+	each node gets a frame of booleans telling which rules its parent
+	matched (`pm*`) and which rules its ancestors matched (`pa*`). The rules
+	are inlined as straight-line boolean expressions, names being compared
+	by id, so there is no dispatch per step. Subtrees where no step of the
+	selection can match anymore are pruned."""
+
+	def __init__( self ):
+		self.lines:List[str] = []
+		self.globals:Dict[str,Any] = {}
+		# The rules, in evaluation order, as `(id, condition)`
+		self.rules:List[Tuple[str,str]] = []
+		# The flags of the frame, as `(rule id, is ancestor flag)`
+		self.flags:List[Tuple[str,bool]] = []
+		# The flags of the steps of the main chain, used for pruning
+		self.chain:Set[str] = set()
+		self.isPrunable = True
+		self.hasAttributes = False
+
+	def generate( self, selection:Selection ) -> str:
+		"""Returns the source of the `query(root)` function, which walks
+		the tree, and of the `step(node, frame)` function, which matches a
+		single node given the frame of its parent, returning the frame for
+		its children, whether it matches and whether its descendants can
+		match. The frame of the root is `ROOT`."""
+		self.globals["CAPTURES"] = selection._captures
+		last = self.processChain(selection)
+		frame = self.tuple(self.flagName(_) for _ in self.flags)
+		child = self.tuple("False" if _[0] == "r" else ("a" if _[1] else "m") + _[0] for _ in self.flags)
+		self.globals["ROOT"] = tuple(_[0] == "r" and not _[1] for _ in self.flags)
+		# The children can only match if one of the steps of the chain
+		# matched this node or one of its ancestors.
+		pruning = " or ".join(("a" if _[1] else "m") + _[0] for _ in self.flags if _[0] in self.chain and _[0] != "r")
+		pruning = (pruning or "False") if self.isPrunable else "True"
+		lines = [
+			"def query( root ):",
+			"	stack = [(root, ROOT)]",
+			"	pop   = stack.pop",
+			"	push  = stack.extend",
+			"	while stack:",
+			f"		node, {frame} = pop()",
+		] + self.ruleLines("\t\t")
+		if selection._captures:
+			lines.append(f"		if m{last}:")
+			lines.append(f"			yield (CAPTURES, node)")
+		lines.append(f"		children = node._children")
+		lines.append(f"		if children and ({pruning}):")
+		lines.append(f"			push(zip(reversed(children), repeat({child})))")
+		lines += [
+			"",
+			"def step( node, frame ):",
+			f"	{frame} = frame",
+		] + self.ruleLines("\t") + [
+			f"	return ({child}, {'m' + last if selection._captures else 'False'}, {pruning})",
+		]
+		self.lines = lines
+		return "\n".join(lines) + "\n"
+
+	def ruleLines( self, indent:str ) -> List[str]:
+		lines = [f"{indent}nid = node.nameId"]
+		if self.hasAttributes:
+			lines.append(f"{indent}attrs = node._attributes")
+		for rule, condition in self.rules:
+			lines.append(f"{indent}m{rule} = {condition}")
+			if (rule, True) in self.flags:
+				lines.append(f"{indent}a{rule} = pa{rule} or m{rule}")
+		return lines
+
+	def tuple( self, items:Iterable[str] ) -> str:
+		items = list(items)
+		return f"({items[0]},)" if len(items) == 1 else f"({', '.join(items)})"
+
+	def flagName( self, flag:Tuple[str,bool] ) -> str:
+		return ("pa" if flag[1] else "pm") + flag[0]
+
+	def flag( self, rule:str, isAncestor:bool ) -> str:
+		"""Registers the given flag in the frame, returning its name."""
+		if (rule, isAncestor) not in self.flags:
+			self.flags.append((rule, isAncestor))
+		return self.flagName((rule, isAncestor))
+
+	def processChain( self, selection:Selection ) -> str:
+		"""Processes the steps of a `then` chain, returning the id of the
+		last one."""
+		previous = "r"
+		for step in selection.steps():
+			if step.axis == Axis.CHILDREN:
+				dependency = self.flag(previous, False)
+			elif step.axis == Axis.DESCENDANTS:
+				# The document is the ancestor of every node
+				dependency = "True" if previous == "r" else self.flag(previous, True)
+			else:
+				raise NotImplementedError(f"Axis not supported by the code generator: {step.axis} in {selection}")
+			if dependency == "True":
+				self.isPrunable = False
+			previous = self.processRule(step, dependency)
+			self.chain.add(previous)
+		self.chain.add("r")
+		return previous
+
+	def processRule( self, selection:Selection, dependency:str ) -> str:
+		"""Adds the rule for the given selection, returning its id. The
+		rules for its `where` clauses are added first, as they're used by
+		the rule's condition."""
+		conditions = [] if dependency == "True" else [dependency]
+		conditions.append(self.processPredicate(selection.predicate))
+		for where in selection._where:
+			if where.axis not in SelectionProcessor.WHERE_AXES or where._then:
+				raise NotImplementedError(f"Where clause not supported yet: {where} in {selection}")
+			rule = self.processRule(where, "True")
+			if where.axis == Axis.SELF:
+				conditions.append(f"m{rule}")
+			else:
+				conditions.append(self.flag(rule, where.axis == Axis.ANCESTORS))
+		rule = str(len(self.rules))
+		self.rules.append((rule, " and ".join(conditions)))
+		return rule
+
+	def processPredicate( self, predicate:Predicate ) -> str:
+		if isinstance(predicate, NodeNamePredicate):
+			return f"nid == {predicate.nameId}"
+		elif isinstance(predicate, AttributeNamePredicate):
+			self.hasAttributes = True
+			return f"(attrs is not None and {predicate.attribute!r} in attrs)"
+		else:
+			name = f"P{len(self.globals)}"
+			self.globals[name] = predicate
+			return f"{name}.match(node)"
+
+class CompiledQuery:
+	"""A selection compiled into a Python function by `QueryCodeGenerator`.
+	Calling it with a `Node` yields `(capture, node)` couples in document
+	order, like `QueryInterpreter.run`."""
+
+	def __init__( self, selection:Selection ):
+		generator     = QueryCodeGenerator()
+		self.source   = generator.generate(selection)
+		namespace     = dict(generator.globals, repeat=repeat)
+		exec(compile(self.source, f"<query {selection}>", "exec"), namespace)
+		self.function = namespace["query"]
+		self.step     = namespace["step"]
+		self.root     = namespace["ROOT"]
+		self.captures = selection._captures
+
+	def __call__( self, root:Node ) -> Iterator[Tuple[str,Node]]:
+		return self.function(root)
+
+# The compiled query functions, the least recently used first
+QUERY_FUNCTIONS:Dict[str,CompiledQuery] = OrderedDict()
+
+def compileQueryFunction( selection:Selection ) -> CompiledQuery:
+	"""Returns the compiled function for the given selection, which is
+	cached on the selection's text and captures."""
+	return cached(QUERY_FUNCTIONS, f"{selection._captures}:{selection}", lambda:CompiledQuery(selection))
+
+class CodegenQueryInterpreter:
+	"""Runs queries compiled to Python functions. Only `Node` trees
+	are supported by the generated code, other trees are given to
+	`QueryInterpreter`."""
+
+	def __init__( self ):
+		self.queries:List[Selection] = []
+
+	def register( self, query:Union[Selection,'QueryPlan'] ):
+		self.queries.append(query.selection if isinstance(query, QueryPlan) else query)
+		return self
+
+	def run( self, root:Union[Node,List[Node],ColumnarTree] ):
+		for query in self.queries:
+			if isinstance(root, Node):
+				yield from compileQueryFunction(query)(root)
+			elif isinstance(root, (list, tuple)):
+				function = compileQueryFunction(query)
+				for tree in root:
+					yield from function(tree)
+			else:
+				yield from QueryInterpreter().register(query).run(root)
+
+# -----------------------------------------------------------------------------
+#
+# STREAMING QUERY INTERPRETER
+#
+# -----------------------------------------------------------------------------
+
+class StreamEntry:
+	"""An open node of the event stream."""
+
+	__slots__ = ("node", "frames", "isActive", "isRetained", "matches")
+
+	def __init__( self, node:Node ):
+		self.node = node
+		# The frames for the children, one per query, set once the node
+		# is evaluated.
+		self.frames:Optional[List[tuple]] = None
+		# Tells if any query can match below this node
+		self.isActive = False
+		# Tells if the node is part of a matched subtree
+		self.isRetained = False
+		self.matches:List[list] = []
+
+class StreamingQueryInterpreter:
+	"""Evaluates queries over the events of `tlang.tree.events`, so that
+	matches are found while the source is scanned, without building the
+	tree. Only the open nodes and the subtrees of the matched nodes are
+	kept in memory, and subtrees where no query can match are skipped.
+	Each node is matched by the `step` function of the compiled query (see
+	`QueryCodeGenerator`) once its attributes are known, that is when its
+	first child is opened or when it is closed. The matches are yielded in
+	document order, once their subtree is complete."""
+
+	def __init__( self ):
+		self.queries:List[Selection] = []
+
+	def register( self, query:Union[Selection,'QueryPlan'] ):
+		self.queries.append(query.selection if isinstance(query, QueryPlan) else query)
+		return self
+
+	def run( self, source:Union[str,Node,List[Node],Iterable[TEvent]] ) -> Iterator[Tuple[str,Node]]:
+		"""Runs the queries on the given tree notation source, events or
+		tree. Matched nodes are new nodes, even when given a tree."""
+		if isinstance(source, str):
+			events = parseEvents(source)
+		elif isinstance(source, Node) or isinstance(source, list) and source and isinstance(source[0], Node):
+			events = treeEvents(source)
+		else:
+			events = source
+		compiled = [compileQueryFunction(_) for _ in self.queries]
+		stack:List[StreamEntry] = []
+		# The matches, in document order, as `[capture, node, isComplete]`
+		queue:Deque[list] = deque()
+		# The depth within a skipped subtree
+		skipped  = 0
+		for type, name, value in events:
+			if skipped:
+				if type == CLOSE:
+					skipped -= 1
+				elif type != ATTR:
+					skipped += 1
+			elif type == ATTR:
+				stack[-1].node.setAttribute(name, value)
+			elif type == CLOSE:
+				entry = stack.pop()
+				if entry.frames is None:
+					self.evaluate(entry, stack[-1] if stack else None, compiled, queue)
+				for match in entry.matches:
+					match[2] = True
+				while queue and queue[0][2]:
+					capture, node, _ = queue.popleft()
+					yield (capture, node)
+			else:
+				if stack:
+					parent = stack[-1]
+					if parent.frames is None:
+						self.evaluate(parent, stack[-2] if len(stack) > 1 else None, compiled, queue)
+					if not (parent.isActive or parent.isRetained):
+						skipped = 1
+						continue
+				stack.append(StreamEntry(NodeTemplate(name) if type == TEMPLATE else Node(name)))
+
+	def evaluate( self, entry:StreamEntry, parent:Optional[StreamEntry], compiled:List['CompiledQuery'], queue:Deque[list] ):
+		node       = entry.node
+		isRetained = parent.isRetained if parent else False
+		frames     = []
+		for i, query in enumerate(compiled):
+			frame, isMatch, isActive = query.step(node, parent.frames[i] if parent else query.root)
+			frames.append(frame)
+			entry.isActive = entry.isActive or isActive
+			if isMatch:
+				match = [query.captures, node, False]
+				queue.append(match)
+				entry.matches.append(match)
+				isRetained = True
+		entry.frames     = frames
+		entry.isRetained = isRetained
+		if isRetained and parent and parent.isRetained:
+			parent.node.add(node)
+
+# -----------------------------------------------------------------------------
+#
+# QUERY PLAN
+#
+# -----------------------------------------------------------------------------
+
+class QueryPlan(NamedTuple):
+	"""A compiled query: the selection along with the rules used by
+	`QueryInterpreter`. Plans are shared through the cache of `compileQuery`
+	and are reused across runs, so neither the selection nor the rules
+	should be mutated."""
+
+	text:str
+	selection:Selection
+	terminals:Tuple[Terminal,...]
+	composites:Tuple[Composite,...]
+
+	@classmethod
+	def FromSelection( cls, selection:Selection, text:Optional[str]=None ) -> 'QueryPlan':
+		terminals, composites = SelectionProcessor().process(selection)
+		return cls(text or str(selection), selection, tuple(terminals), tuple(composites))
+
+	def run( self, tree:Union[Node,ColumnarTree,TreeIndex], engine:str="walk" ) -> Iterator[Tuple[str,Union[Node,ColumnarNode]]]:
+		return runQuery(self, tree, engine)
+
+	def __reduce__( self ):
+		# Only the selection is pickled, the rules being rebuilt when
+		# the plan is loaded (typically in a worker process).
+		return (QueryPlan.FromSelection, (self.selection, self.text))
+
+	def __str__( self ):
+		return self.text
+
+# The number of compiled queries kept by `compileQuery`
+QUERY_CACHE_SIZE = 256
+
+# The compiled query plans, the least recently used first
+QUERY_PLANS:Dict[str,QueryPlan] = OrderedDict()
+
+# A string literal of the query grammar, or whitespace outside of them
+RE_QUERY_WHITESPACE = re.compile(r'("[^"]*")|[\s\n]+')
+
+def normalizeQuery( text:str ) -> str:
+	"""Normalizes the whitespace of the given query text, which the query
+	grammar skips, but within string literals."""
+	return RE_QUERY_WHITESPACE.sub(lambda _:_.group(1) or " ", text).strip()
+
+def compileQuery( query:Union[str,Node] ) -> QueryPlan:
+	"""Returns the plan for the given query text or parsed query node
+	(`q:query`), which is only parsed and compiled the first time it is
+	seen."""
+	if isinstance(query, Node):
+		key = "".join(Repr.Apply(query, pretty=False))
+	else:
+		key = normalizeQuery(query)
+	return cached(QUERY_PLANS, key, lambda:createQueryPlan(query, key))
+
+def createQueryPlan( query:Union[str,Node], key:str ) -> QueryPlan:
+	# NOTE: The query grammar is only imported when a query is compiled
+	from tlang.query.model import processQuery
+	if isinstance(query, Node):
+		return QueryPlan.FromSelection(processQuery(query))
+	else:
+		from tlang.query.parser import parseString
+		# NOTE: The key is only used to find the plan, the query is
+		# parsed as it was written.
+		return QueryPlan.FromSelection(processQuery(parseString(query)), key)
+
+def cached( cache:Dict[str,Any], key:str, factory:Callable[[],Any], size:Optional[int]=None ) -> Any:
+	"""Returns the value for the given key in the given LRU cache (an
+	`OrderedDict`), creating it with the factory when missing."""
+	value = cache.get(key)
+	if value is not None:
+		cache.move_to_end(key)
+		return value
+	value = factory()
+	cache[key] = value
+	if len(cache) > (size or QUERY_CACHE_SIZE):
+		cache.popitem(last=False)
+	return value
+
+# -----------------------------------------------------------------------------
+#
+# HIGH LEVEL API
+#
+# -----------------------------------------------------------------------------
+
+# The query engines, by name. The walking interpreter is the only one that
+# does not need an index, the others build one when given a tree.
+ENGINES = {
+	"walk"  : QueryInterpreter,
+	"index" : IndexedQueryInterpreter,
+	"join"  : StructuralJoinInterpreter,
+	"codegen" : CodegenQueryInterpreter,
+	"stream"  : StreamingQueryInterpreter,
+	"automaton" : PathQueryInterpreter,
+}
+
+def runQuery( query:Union[str,Selection,QueryPlan], tree:Union[Node,ColumnarTree,TreeIndex,str], engine:str="walk" ) -> Iterator[Tuple[str,Union[Node,ColumnarNode]]]:
+	"""Runs the given query (text, selection or plan) against the given
+	tree using the given engine, yielding `(capture, node)` couples."""
+	if engine not in ENGINES:
+		raise ValueError(f"Unsupported query engine '{engine}', expected one of: {', '.join(ENGINES)}")
+	return ENGINES[engine]().register(compileQuery(query) if isinstance(query, str) else query).run(tree)
+
 # EOF - vim: ts=4 sw=4 noet
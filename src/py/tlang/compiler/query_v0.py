@@ -1,7 +1,9 @@
 from enum import Enum
 from tlang.tree import Node
+from tlang.tree.model import TreeCursor
 from tlang.query import Selection, Predicate, Axis
 from typing import Optional, Iterator, NamedTuple, Tuple, Dict, List, Set
+from collections import deque
 
 ## The core principle of the query compiler/interpreter is that upon traveral
 ## we keep track of the rules that matched:
@@ -47,20 +49,23 @@ class Walk:
 	def DownDepth(node:Node, depth:int=0, step:int=0) -> Iterator['Walk.Step']:
 		"""Walks down the given node and yields corresponding WalkStep, starting
 		off the given `depth` and `step`. """
-		for i,c in enumerate(node.children):
-			yield Walk.Step(c, depth, i, step)
+		cursor = TreeCursor(node)
+		while cursor.next():
+			yield Walk.Step(cursor.node, depth + cursor.depth - 1, cursor.index, step)
 			step += 1
-			yield from Walk.DownDepth(c, depth + 1, step)
 
 	@staticmethod
 	def DownBreadth(node:Node, depth:int=0, step:int=0) -> Iterator['Walk.Step']:
 		"""Walks the give node in a breadth-first mode, yielding corresponding
 		WalkSteps."""
-		for i,c in enumerate(node.children):
-			yield Walk.Step(c, depth, i, step)
-			step += 1
-		for c in node.children:
-			yield from Walk.DownBreadth(c, depth + 1, step)
+		queue = deque([(node, depth)])
+		while queue:
+			parent, d = queue.popleft()
+			for i,c in enumerate(parent.children):
+				yield Walk.Step(c, d, i, step)
+				step += 1
+				if c.children:
+					queue.append((c, d + 1))
 
 # -----------------------------------------------------------------------------
 #
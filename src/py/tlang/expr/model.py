@@ -1,7 +1,7 @@
 
 from typing import Optional, Any, List, Dict
 from collections import OrderedDict
-from tlang.utils import NOTHING
+from tlang.tree.model import NOTHING
 
 __doc__ = """
 The core model representing selectors
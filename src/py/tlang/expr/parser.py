@@ -44,7 +44,11 @@ def grammar(g:Optional[Grammar]=None, isVerbose=False) -> Grammar:
 		if GRAMMAR:
 			return GRAMMAR
 		else:
-			g=Grammar("expr", isVerbose=isVerbose)
+			# NOTE: The grammar is the combined `tlang` grammar, which
+			# registers itself here when built, so that the parsers use
+			# the same grammar whichever is used first.
+			from tlang.parser import getGrammar
+			return getGrammar(isVerbose)
 
 	s = symbols(g)
 
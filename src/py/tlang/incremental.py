@@ -0,0 +1,169 @@
+from typing import Optional,List,NamedTuple
+from tlang.tree.model import Node
+
+__doc__ = """
+Incremental reparsing of TLang sources: given the AST of a source and an
+edit of that source, only the smallest list (`ExprList`) or top-level form
+that encloses the edit is parsed again. Its new content is spliced into
+the existing AST, so that the nodes outside of it keep their identity,
+and the `offset`, `length` and `line` metadata of the nodes that follow
+the edit are shifted.
+
+When the edited region can't be parsed on its own (for instance when the
+edit unbalances the parens), the enclosing lists are tried, then the
+whole source is parsed again.
+"""
+
+class TextEdit(NamedTuple):
+	"""Replaces the `length` characters at `offset` by `text`."""
+
+	offset:int
+	length:int
+	text:str
+
+	@property
+	def end( self ) -> int:
+		return self.offset + self.length
+
+	@property
+	def delta( self ) -> int:
+		return len(self.text) - self.length
+
+	def apply( self, source:str ) -> str:
+		return source[:self.offset] + self.text + source[self.end:]
+
+# -----------------------------------------------------------------------------
+#
+# HELPERS
+#
+# -----------------------------------------------------------------------------
+
+def span( node:Node, source:str ) -> Optional[range]:
+	"""Returns the range of the given node in the source, without the
+	trailing whitespace that its match may include."""
+	offset = node.meta("offset")
+	length = node.meta("length")
+	if offset is None or length is None:
+		return None
+	end = offset + length
+	while end > offset and source[end - 1].isspace():
+		end -= 1
+	return range(offset, end)
+
+def isSelfContained( node:Node, offset:int, end:int ) -> bool:
+	"""Tells if all the descendants of the node are within the given range,
+	which is not the case of nodes that absorb the following values, like
+	`ex:rest`."""
+	for _ in node.walk():
+		o = _.meta("offset")
+		if o is not None and (o < offset or o + (_.meta("length") or 0) > end):
+			return False
+	return True
+
+def parseFragment( text:str ) -> Optional[Node]:
+	"""Parses the given fragment of a source, returning `None` unless it
+	is a single value that spans the whole fragment."""
+	from tlang.parser import getGrammar, Processor
+	result = getGrammar().parseString(text)
+	# NOTE: Syntax errors are reported by the result, the processor only
+	# failing on bugs, which must not pass for a fragment to reparse.
+	if not result.isSuccess():
+		return None
+	node = Processor.Get().process(result)
+	if not isinstance(node, Node) or node.meta("offset") != 0 or node.meta("length") != len(text):
+		return None
+	return node
+
+def relocate( node:Node, offset:int, line:Optional[int] ):
+	"""Makes the metadata of a parsed fragment relative to the source, the
+	fragment starting at the given offset and line."""
+	base = node.meta("line")
+	for _ in node.walk():
+		o = _.meta("offset")
+		if o is not None:
+			_.meta("offset", o + offset)
+		l = _.meta("line")
+		if l is not None and line is not None and base is not None:
+			_.meta("line", l - base + line)
+
+def shift( tree:Node, edit:TextEdit, lines:int ):
+	"""Updates the metadata of the nodes that follow or enclose the edit,
+	the root enclosing the whole source."""
+	for _ in tree.walk():
+		o = _.meta("offset")
+		if o is None:
+			continue
+		elif _ is tree or (o <= edit.offset and o + (_.meta("length") or 0) > edit.end):
+			_.meta("length", _.meta("length") + edit.delta)
+		elif o >= edit.end:
+			_.meta("offset", o + edit.delta)
+			if lines and _.meta("line") is not None:
+				_.meta("line", _.meta("line") + lines)
+
+def spliceList( tree:Node, node:Node, fragment:Node, edit:TextEdit, lines:int ) -> Node:
+	"""Replaces the children of the given list of the tree by the ones of
+	the fragment, which is the list parsed again after the edit, the edit
+	adding the given number of lines."""
+	shift(tree, edit, lines)
+	relocate(fragment, node.meta("offset"), node.meta("line"))
+	for child in list(node.children):
+		node.remove(child)
+	node.merge(fragment)
+	return tree
+
+# -----------------------------------------------------------------------------
+#
+# API
+#
+# -----------------------------------------------------------------------------
+
+def reparseString( tree:Node, source:str, edit:TextEdit ) -> Node:
+	"""Returns the AST of `edit.apply(source)`, `tree` being the AST of
+	`source`. The given tree is updated in place and returned, unless the
+	whole source had to be parsed again."""
+	text  = edit.apply(source)
+	lines = edit.text.count("\n") - source.count("\n", edit.offset, edit.end)
+	# The lists that enclose the edit, strictly inside of their parens,
+	# from the innermost.
+	lists:List[Node] = []
+	form:Optional[Node] = None
+	for node in tree.walk():
+		r = span(node, source)
+		if not r or edit.offset < r.start or edit.end > r.stop:
+			continue
+		elif node.name == "ex:list" and r.start < edit.offset and edit.end < r.stop and source[r.start] == "(":
+			lists.append(node)
+		elif node.parent is tree and tree.name == "ex:seq" and isSelfContained(node, r.start, r.stop):
+			form = node
+	lists.sort(key=lambda _:_.meta("length"))
+	for node in lists:
+		r = span(node, source)
+		fragment = parseFragment(text[r.start:r.stop + edit.delta])
+		if fragment is None or fragment.name != "ex:list":
+			continue
+		return spliceList(tree, node, fragment, edit, lines)
+	# A top-level form is reparsed only if it is still separated from its
+	# siblings, as otherwise it would join them.
+	if form:
+		r     = span(form, source)
+		start = r.start
+		stop  = r.stop + edit.delta
+		# The edit may have added whitespace around the form
+		while start < stop and text[start].isspace():
+			start += 1
+		while stop > start and text[stop - 1].isspace():
+			stop -= 1
+		if start < stop and (start == 0 or text[start - 1].isspace()) and (stop >= len(text) or text[stop].isspace()):
+			fragment = parseFragment(text[start:stop])
+			if fragment is not None and fragment.name != "ex:seq" and isSelfContained(fragment, 0, stop - start):
+				shift(tree, edit, lines)
+				line = form.meta("line")
+				relocate(fragment, start, None if line is None else line + text.count("\n", r.start, start))
+				index = tree.index(form)
+				tree.remove(form)
+				tree.insert(index, fragment)
+				return tree
+	from tlang.parser import parseString
+	return parseString(text)
+
+# EOF - vim: ts=4 sw=4 noet
@@ -31,7 +31,7 @@ class ValueInterpreter(TreeProcessor):
 		self.context = self.context.parent
 		return res
 
-	def derive( self, reference ):
+	def derive( self, reference=None ):
 		return self.__class__(self.context.derive(reference), self.literalInterpreter, self.treeInterpreter)
 
 	#NOTE: This is a direct invocation
@@ -230,7 +230,9 @@ class TreeInterpreter(TreeTransform):
 		elif isinstance(value, float):
 			return Node("#float").attr("value", value)
 		elif isinstance(value, Node):
-			return value
+			# The value may be expanded more than once, or be part of
+			# another tree, so we add a (copy-on-write) clone.
+			return value.copy()
 		else:
 			raise ValueError(f"Expected value to be node, string or number, got: {value}")
 
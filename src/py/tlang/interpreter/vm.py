@@ -0,0 +1,248 @@
+from .model import Context,META_INVOCATION,NODE,DATA,LAZY
+from .core import ValueInterpreter
+from tlang.tree.model import Node,NodeError,SemanticError,TreeProcessorError
+from tlang.compiler.bytecode import Code,Compiler,signature
+from tlang.compiler.bytecode import CONST,FRESH,RESOLVE,PRIMITIVE,LITERAL,BUILD,TEMPLATE,VALUE,CALL,INVOKE,ENTER,DEFINE,LEAVE,LAZY as LAZY_OP,SEQ,EVAL
+from typing import List,Dict,Optional,Any,Callable,Iterable,Tuple
+# NOTE: The ABC is used for the `isinstance` checks, as it is faster than
+# the `typing` alias.
+from collections.abc import Iterator
+
+__doc__ = """
+A stack machine that runs the bytecode of `tlang.compiler.bytecode`. It
+is a drop-in replacement for `ValueInterpreter`, which primitives get as
+their interpreter: feeding or processing a node runs its code, compiled
+the first time the node is evaluated.
+"""
+
+# The types of the results that evaluate to themselves
+PLAIN = frozenset((int, float, str, bool, list, dict, tuple, Node))
+
+def fresh( value:List[Any] ) -> List[Any]:
+	"""Returns a copy of the given list and of its nested lists."""
+	return [fresh(_) if _.__class__ is list else _ for _ in value]
+
+def valueOf( result:Any, node:Node ) -> Any:
+	"""Returns the value of the given result, like `TreeProcessor.process`
+	does with the result of the handler for the node."""
+	if isinstance(result, Iterator):
+		value = None
+		for value in result:
+			if isinstance(value, Exception):
+				raise value
+		return value
+	elif isinstance(result, Exception):
+		raise TreeProcessorError(node, result)
+	else:
+		return result
+
+# -----------------------------------------------------------------------------
+#
+# BYTECODE INTERPRETER
+#
+# -----------------------------------------------------------------------------
+
+class BytecodeInterpreter(ValueInterpreter):
+	"""Evaluates the AST by compiling it to bytecode, with the same results
+	as `ValueInterpreter`."""
+
+	def __init__( self, context:Context=None, literalInterpreter=None, treeInterpreter=None, compiler:Optional[Compiler]=None ):
+		super().__init__(context, literalInterpreter, treeInterpreter)
+		self.compiler = compiler or Compiler()
+		# The primitives in the slots of the compiler's table, which is
+		# linked as it grows.
+		self.linked:List[Any] = []
+
+	def derive( self, reference=None ):
+		# NOTE: The derived interpreter shares everything but the context,
+		# which saves building the handlers of a new tree processor.
+		res = object.__new__(self.__class__)
+		res.__dict__.update(self.__dict__)
+		res.context = self.context.derive(reference)
+		return res
+
+	def feed( self, node:Node ) -> Iterable[Any]:
+		result = self.execute(self.compiler.compile(node, self.context))
+		if result is None:
+			pass
+		elif isinstance(result, Iterator):
+			yield from result
+		elif isinstance(result, Exception):
+			yield TreeProcessorError(node, result)
+		else:
+			yield result
+
+	def process( self, node:Node ):
+		if isinstance(node, Node):
+			return valueOf(self.execute(self.compiler.compile(node, self.context)), node)
+		else:
+			return super().process(node)
+
+	def link( self, code:Code ) -> List[Any]:
+		"""Resolves the primitives of the compiler's table that are not
+		linked yet, which must have the protocol that the code was
+		compiled for."""
+		linked   = self.linked
+		compiler = self.compiler
+		for i in range(len(linked), len(compiler.primitives)):
+			name  = compiler.primitives[i]
+			value = self.context.resolve(name)
+			if signature(value) != compiler.signatures[i]:
+				raise NodeError(code.node, SemanticError(f"Primitive '{name}' does not have the invocation protocol it was compiled for"))
+			linked.append(value)
+		return linked
+
+	def execute( self, code:Code ) -> Any:
+		"""Runs the given code, returning the result of the handler for its
+		node, which is yet to be fed or processed."""
+		ops    = code.ops
+		consts = code.consts
+		table  = self.linked
+		if len(table) < code.slots:
+			self.link(code)
+		stack:List[Any] = []
+		push   = stack.append
+		pop    = stack.pop
+		pc     = 0
+		end    = len(ops)
+		while pc < end:
+			op  = ops[pc]
+			arg = ops[pc + 1]
+			pc += 2
+			if op == CONST:
+				push(consts[arg])
+			elif op == VALUE:
+				value = stack[-1]
+				if value is not None and value.__class__ not in PLAIN:
+					stack[-1] = valueOf(value, consts[arg])
+			elif op == PRIMITIVE:
+				push(table[arg])
+			elif op == CALL:
+				if arg:
+					argv = stack[-arg:]
+					del stack[-arg:]
+				else:
+					argv = []
+				target = pop()
+				push(target(self, argv))
+			elif op == RESOLVE:
+				name, node = consts[arg]
+				value = self.context.resolve(name)
+				if value is None:
+					raise NodeError(node, SemanticError(
+						f"Cannot resolve symbol '{name}'",
+						f"reachable slots are: {','.join(sorted(self.context.listReachableSlots()))}"))
+				push(value)
+			elif op == INVOKE:
+				node, args = consts[arg]
+				push(self.invokeNodes(pop(), node, args))
+			elif op == ENTER:
+				self.pushContext(("invocation", stack[-1]))
+			elif op == DEFINE:
+				self.context.define(consts[arg], stack[-1])
+			elif op == LEAVE:
+				self.popContext()
+			elif op == LITERAL:
+				push(self.literalInterpreter.process(consts[arg]))
+			elif op == FRESH:
+				push(fresh(consts[arg]))
+			elif op == LAZY_OP:
+				node, isData = consts[arg]
+				push((self.literalInterpreter if isData else self).derive().feed(node))
+			elif op == BUILD:
+				if arg:
+					value = stack[-arg:]
+					del stack[-arg:]
+				else:
+					value = []
+				push(value)
+			elif op == TEMPLATE:
+				push(self.template(stack, consts[arg]))
+			elif op == SEQ:
+				push(self.sequence(consts[arg]))
+			elif op == EVAL:
+				node = consts[arg]
+				func = self.matches.get(node.name)
+				# NOTE: The handlers are bound to the interpreter that was
+				# derived from, so we call them on this one.
+				push(func.__func__(self, node) if func else self.catchall(node))
+			else:
+				raise ValueError(f"Unknown opcode {op} in {code.node}")
+		return stack[-1]
+
+	# =========================================================================
+	# OPERATIONS
+	# =========================================================================
+
+	def invokeNodes( self, target, node:Node, args:Tuple[Node,...] ):
+		"""Invokes the target with the given argument nodes, like
+		`on_list` does, the protocol of the target being only known now."""
+		if target is None:
+			raise NodeError(node.children[0], SemanticError("Target resolved to None"))
+		elif not isinstance(target, Callable):
+			raise NodeError(node, SemanticError(f"Invocation target is not a function or invocable, got: {target}"))
+		elif not hasattr(target, META_INVOCATION):
+			raise NodeError(node, SemanticError("Invocation target is missing invocation protocol meta-information"))
+		protocol = getattr(target, META_INVOCATION)
+		argv     = []
+		j        = len(protocol) - 1
+		has_rest = protocol and protocol[-1].name == "__"
+		self.pushContext(("invocation", target))
+		for i, arg_node in enumerate(args):
+			if not has_rest and i > j:
+				break
+			arg_meta = protocol[min(i,j)]
+			flags    = arg_meta.flags
+			if flags & NODE == NODE:
+				value = arg_node
+			elif flags & LAZY == LAZY:
+				value = (self.literalInterpreter if flags & DATA == DATA else self).derive().feed(arg_node)
+			elif flags & DATA == DATA:
+				value = self.literalInterpreter.process(arg_node)
+			else:
+				value = valueOf(self.execute(self.compiler.compile(arg_node, self.context)), arg_node)
+			if arg_meta.name != "__":
+				self.context.define(arg_meta.name, value)
+			argv.append(value)
+		res = target(self, argv)
+		self.popContext()
+		return res
+
+	def template( self, stack:List[Any], flatten:Tuple[bool,...] ):
+		"""Pops the values of the template's children, like `on_template`."""
+		res = []
+		count = len(flatten)
+		if count:
+			values = stack[-count:]
+			del stack[-count:]
+			for value, isTemplate in zip(values, flatten):
+				if not isTemplate:
+					res.append(value)
+				elif value == None:
+					pass
+				elif isinstance(value, list):
+					res += value
+				else:
+					res.append(value)
+		return None if len(res) == 0 else (res[0] if len(res) == 1 else res)
+
+	def sequence( self, nodes:Tuple[Node,...] ):
+		"""Yields the values of the given nodes, like `on_seq`."""
+		for node in nodes:
+			result = self.execute(self.compiler.compile(node, self.context))
+			if result is None:
+				pass
+			elif result.__class__ in PLAIN:
+				yield result
+			elif isinstance(result, Iterator):
+				for _ in result:
+					if isinstance(_, Exception):
+						raise _
+					else:
+						yield _
+			elif isinstance(result, Exception):
+				raise TreeProcessorError(node, result)
+			else:
+				yield result
+
+# EOF - vim: ts=4 sw=4 noet
@@ -3,15 +3,38 @@ from tlang.utils import ParserUtils
 from libparsing  import Grammar
 
 Processor = QueryProcessor
-G = grammar(Grammar("tlang"), suffixed=False)
-G.axiom = G.symbols.ExprValue
-P = Processor(G)
+
+# NOTE: The combined grammar is built on first use (see `getGrammar`), as
+# building it dominates the time it takes to import `tlang`.
+GRAMMAR = None
+
+def getGrammar( isVerbose=False ) -> Grammar:
+	"""Returns the combined query and expression grammar, building it
+	on first use. This is also the grammar of `tlang.query.parser` and
+	`tlang.expr.parser`, whichever is used first."""
+	global GRAMMAR
+	if not GRAMMAR:
+		GRAMMAR = grammar(Grammar("tlang"), suffixed=False)
+		GRAMMAR.axiom = GRAMMAR.symbols.ExprValue
+	if isVerbose:
+		GRAMMAR.setVerbose(isVerbose)
+	return GRAMMAR
+
+def __getattr__( name:str ):
+	# `G` and `P` used to be created on import, they're now created
+	# on first access.
+	if name == "G":
+		return getGrammar()
+	elif name == "P":
+		return Processor(getGrammar())
+	else:
+		raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 def parseString( text:str, isVerbose=False, process=True ):
-	return ParserUtils.ParseString(grammar, text, isVerbose, processor=QueryProcessor.Get() if process else None)
+	return ParserUtils.ParseString(getGrammar, text, isVerbose, processor=QueryProcessor.Get() if process else None)
 
 def parseFile( path:str, isVerbose=False, process=True ):
-	return ParserUtils.ParseFile(grammar, path, isVerbose, processor=QueryProcessor.Get() if process else None)
+	return ParserUtils.ParseFile(getGrammar, path, isVerbose, processor=QueryProcessor.Get() if process else None)
 
 if __name__ == "__main__":
 	import os, sys
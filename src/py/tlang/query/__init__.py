@@ -1,3 +1,10 @@
-from .parser import parseFile, parseString
 from .model import Select, With, Selection, Predicate, Axis
 
+def __getattr__( name:str ):
+	# NOTE: The parser is imported on first access, as it needs
+	# `libparsing`, which the query model and engines don't.
+	if name in ("parseFile", "parseString"):
+		from . import parser
+		return getattr(parser, name)
+	else:
+		raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
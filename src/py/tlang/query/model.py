@@ -1,8 +1,7 @@
 from enum import Enum
 from typing import Optional, Any, List, Dict, cast
 from collections import OrderedDict
-from tlang.utils import NOTHING
-from tlang.tree.model import Node,TreeProcessor
+from tlang.tree.model import Node,TreeProcessor,Names,NOTHING
 
 __doc__ = """
 Defines a model to represent selector and queries.
@@ -45,13 +44,20 @@ class NodeNamePredicate(Predicate):
 	def __init__( self, name:str ):
 		super().__init__()
 		self.name = name
+		self.nameId = Names.Id(name)
 
 	def match( self, node:Node ) -> bool:
-		return node.name == self.name
+		# Names are interned, so we compare their ids
+		return node.nameId == self.nameId
 
 	def clone( self ):
 		return self.__class__(self.name)
 
+	def __reduce__( self ):
+		# Name ids are specific to a process, so predicates are pickled
+		# by name.
+		return (self.__class__, (self.name,))
+
 	def __str__( self ):
 		return self.name
 
@@ -59,7 +65,7 @@ class AttributeNamePredicate(Predicate):
 
 	def __init__( self, attribute:str ):
 		super().__init__()
-		self.attribute = attribute
+		self.attribute = Names.Intern(attribute)
 
 	def match( self, node:Node ) -> bool:
 		return node.hasAttribute(self.attribute)
@@ -114,6 +120,17 @@ class Selection:
 		self._then.append(selection)
 		return self
 
+	def steps( self ) -> List['Selection']:
+		"""Returns the chain of steps of this selection: this one followed
+		by its `then` selections (and theirs), in order. The query parser
+		gives the steps of `a/b//c` as the `then` list of `a`, while
+		`Select.Children(a).then(Select.Children(b).then(…))` nests them,
+		both meaning the same chain."""
+		res = [self]
+		for _ in self._then:
+			res += _.steps()
+		return res
+
 	def clone( self ):
 		res = self.__class__(self.axis, self.predicate.clone())
 		res._then = [_.clone() for _ in self._then]
@@ -48,7 +48,11 @@ def grammar(g:Optional[Grammar]=None, isVerbose=False, suffixed=False) -> Gramma
 		if GRAMMAR:
 			return GRAMMAR
 		else:
-			g=Grammar("query", isVerbose=isVerbose)
+			# NOTE: The grammar is the combined `tlang` grammar, which
+			# registers itself here when built, so that the parsers use
+			# the same grammar whichever is used first.
+			from tlang.parser import getGrammar
+			return getGrammar(isVerbose)
 	g = expr_grammar(g)
 	s = symbols(g)
 
@@ -0,0 +1,317 @@
+from typing import Optional,Any,List,Dict,Union,Iterable,BinaryIO,Tuple
+from array import array
+from tlang.tree.model import Node, Names
+from tlang.tree.columnar import ColumnarTree
+import struct, json, mmap, sys
+
+__doc__ = """
+A compact binary format for trees, so that large trees can be cached and
+reused across processes. The format is a serialized `ColumnarTree`: a
+header followed by the node table, the attribute table and the string
+table, each column being stored contiguously. Files are opened by
+memory-mapping them, so that opening is constant time and pages are only
+read when the corresponding nodes are accessed.
+"""
+
+# -----------------------------------------------------------------------------
+#
+# FORMAT
+#
+# -----------------------------------------------------------------------------
+
+MAGIC   = b"TLTREE\x00\x00"
+VERSION = 2
+
+# The sections, in the order in which they're stored, along with the
+# type code of their elements.
+SECTIONS:Tuple[Tuple[str,str],...] = (
+	# Node table
+	("name",        "I"),
+	("parent",      "i"),
+	("firstChild",  "i"),
+	("nextSibling", "i"),
+	("depth",       "I"),
+	("size",        "I"),
+	("flags",       "B"),
+	("attrStart",   "I"),
+	# Attribute table
+	("attrKey",     "I"),
+	("attrType",    "B"),
+	("attrData",    "q"),
+	# Forest
+	("roots",       "I"),
+	# String table, the blob being UTF-8 encoded strings
+	("strOffsets",  "Q"),
+	("strBlob",     "B"),
+)
+
+# The header is the magic, the version and the (offset, count) of each
+# section.
+HEADER = struct.Struct("<8sII" + "QQ" * len(SECTIONS))
+
+# The types of attribute values, the attribute data being either the
+# value itself (bool, int, float) or a string id (str, JSON).
+T_NONE   = 0
+T_BOOL   = 1
+T_INT    = 2
+T_FLOAT  = 3
+T_STRING = 4
+T_JSON   = 5
+
+INT64_MIN = -(2 ** 63)
+INT64_MAX = 2 ** 63 - 1
+
+ALIGNMENT = 8
+
+class BinaryTreeError(Exception):
+	pass
+
+# -----------------------------------------------------------------------------
+#
+# WRITER
+#
+# -----------------------------------------------------------------------------
+
+class BinaryTreeWriter:
+	"""Writes trees in the binary format."""
+
+	def __init__( self ):
+		self.strings:Dict[str,int] = {}
+		self.blob     = bytearray()
+		self.offsets  = array("Q", [0])
+
+	def string( self, value:str ) -> int:
+		"""Returns the id of the given string in the file's string table."""
+		i = self.strings.get(value)
+		if i is None:
+			i = len(self.strings)
+			self.strings[value] = i
+			self.blob += value.encode("utf8")
+			self.offsets.append(len(self.blob))
+		return i
+
+	def encode( self, value:Any ) -> Tuple[int,int]:
+		"""Returns the `(type, data)` encoding of the given attribute value."""
+		if value is None:
+			return (T_NONE, 0)
+		elif isinstance(value, bool):
+			return (T_BOOL, int(value))
+		elif isinstance(value, int) and INT64_MIN <= value <= INT64_MAX:
+			return (T_INT, value)
+		elif isinstance(value, float):
+			return (T_FLOAT, struct.unpack("<q", struct.pack("<d", value))[0])
+		elif isinstance(value, str):
+			return (T_STRING, self.string(value))
+		else:
+			try:
+				return (T_JSON, self.string(json.dumps(value)))
+			except TypeError as e:
+				raise BinaryTreeError(f"Attribute value cannot be serialized: {value!r}")
+
+	def write( self, tree:Union[Node,Iterable[Node],ColumnarTree], stream:BinaryIO ) -> int:
+		"""Writes the given node, forest or columnar tree to the given
+		binary stream, returning the number of bytes written."""
+		if not isinstance(tree, ColumnarTree):
+			tree = ColumnarTree.FromNode(tree)
+		count = len(tree)
+		# The node and attribute names are remapped from the global table
+		# to the file's string table.
+		name     = array("I", (self.string(tree.nodeName(i)) for i in range(count)))
+		attrKey  = array("I", (self.string(tree.attributeKey(j)) for j in range(len(tree.attrKey))))
+		attrType = array("B")
+		attrData = array("q")
+		for value in tree.attrValue:
+			t, d = self.encode(value)
+			attrType.append(t)
+			attrData.append(d)
+		columns = {
+			"name"        : name,
+			"parent"      : tree.parent,
+			"firstChild"  : tree.firstChild,
+			"nextSibling" : tree.nextSibling,
+			"depth"       : tree.depth,
+			"size"        : tree.size,
+			"flags"       : tree.flags,
+			"attrStart"   : tree.attrStart,
+			"attrKey"     : attrKey,
+			"attrType"    : attrType,
+			"attrData"    : attrData,
+			"roots"       : tree.roots,
+			"strOffsets"  : self.offsets,
+			"strBlob"     : self.blob,
+		}
+		# We compute the layout of the sections, aligning each of them
+		# so that they can be directly cast from the mapped memory.
+		layout = []
+		offset = HEADER.size
+		for key, code in SECTIONS:
+			offset += (-offset) % ALIGNMENT
+			data    = columns[key]
+			layout.append((offset, len(data)))
+			offset += len(data) * array(code).itemsize
+		stream.write(HEADER.pack(MAGIC, VERSION, 0, *(_ for o in layout for _ in o)))
+		written = HEADER.size
+		for (key, code), (offset, length) in zip(SECTIONS, layout):
+			stream.write(b"\x00" * (offset - written))
+			data = columns[key]
+			if isinstance(data, bytearray):
+				stream.write(data)
+			else:
+				data = data if data.typecode == code else array(code, data)
+				if sys.byteorder != "little":
+					data = array(code, data) ; data.byteswap()
+				stream.write(data.tobytes())
+			written = offset + length * array(code).itemsize
+		return written
+
+# -----------------------------------------------------------------------------
+#
+# MAPPED TREE
+#
+# -----------------------------------------------------------------------------
+
+class MappedStrings:
+	"""The string table of a mapped tree, decoding strings on access."""
+
+	def __init__( self, offsets:memoryview, blob:memoryview ):
+		self.offsets = offsets
+		self.blob    = blob
+
+	def __getitem__( self, index:int ) -> str:
+		return str(self.blob[self.offsets[index]:self.offsets[index + 1]], "utf8")
+
+	def __len__( self ):
+		return max(0, len(self.offsets) - 1)
+
+class MappedValues:
+	"""The attribute values of a mapped tree, decoded on access."""
+
+	def __init__( self, types:memoryview, data:memoryview, strings:MappedStrings ):
+		self.types   = types
+		self.data    = data
+		self.strings = strings
+
+	def __getitem__( self, index:int ) -> Any:
+		t = self.types[index]
+		d = self.data[index]
+		if t == T_NONE:
+			return None
+		elif t == T_BOOL:
+			return bool(d)
+		elif t == T_INT:
+			return d
+		elif t == T_FLOAT:
+			return struct.unpack("<d", struct.pack("<q", d))[0]
+		elif t == T_STRING:
+			return self.strings[d]
+		elif t == T_JSON:
+			return json.loads(self.strings[d])
+		else:
+			raise BinaryTreeError(f"Unsupported attribute type {t} for attribute #{index}")
+
+	def __iter__( self ):
+		for i in range(len(self)):
+			yield self[i]
+
+	def __len__( self ):
+		return len(self.types)
+
+class MappedTree(ColumnarTree):
+	"""A columnar tree backed by a memory-mapped binary file. The columns
+	are memory views on the file, so the tree is read-only."""
+
+	def __init__( self, path:str ):
+		# NOTE: We don't call the parent constructor, as the columns are
+		# views on the mapped file.
+		self.path   = path
+		self.file   = open(path, "rb")
+		try:
+			self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError as e:
+			self.file.close()
+			raise BinaryTreeError(f"Cannot map empty file: {path}")
+		if sys.byteorder != "little":
+			self.close()
+			raise BinaryTreeError("Mapped trees are only supported on little-endian platforms")
+		if len(self.mmap) < HEADER.size:
+			self.close()
+			raise BinaryTreeError(f"File is too small to be a binary tree: {path}")
+		header = HEADER.unpack_from(self.mmap, 0)
+		magic, version = header[0], header[1]
+		if magic != MAGIC or version != VERSION:
+			self.close()
+			raise BinaryTreeError(f"Not a binary tree file (version {VERSION}): {path}")
+		self.memory = memoryview(self.mmap)
+		self.views:List[memoryview] = []
+		for i, (key, code) in enumerate(SECTIONS):
+			offset, count = header[3 + i * 2], header[4 + i * 2]
+			view = self.memory[offset:offset + count * array(code).itemsize]
+			view = view if code == "B" else view.cast(code)
+			self.views.append(view)
+			setattr(self, key, view)
+		self.strings   = MappedStrings(self.strOffsets, self.strBlob)
+		self.attrValue = MappedValues(self.attrType, self.attrData, self.strings)
+		# Maps the file's string ids to the global `Names` ids, populated
+		# as names are accessed.
+		self.nameIds:Dict[int,int] = {}
+		self.keyIds:Dict[str,int] = {}
+
+	def intern( self, name:str ) -> int:
+		raise BinaryTreeError("Mapped trees are read-only")
+
+	def append( self, root:Node ) -> int:
+		raise BinaryTreeError("Mapped trees are read-only")
+
+	def nodeName( self, index:int ) -> str:
+		return Names.ALL[self.nodeNameId(index)]
+
+	def nodeNameId( self, index:int ) -> int:
+		i = self.name[index]
+		res = self.nameIds.get(i)
+		if res is None:
+			res = Names.Id(self.strings[i])
+			self.nameIds[i] = res
+		return res
+
+	def attributeKey( self, index:int ) -> str:
+		return Names.Intern(self.strings[self.attrKey[index]])
+
+	def attributeIndex( self, node:int, name:str ) -> int:
+		for j in range(self.attrStart[node], self.attrStart[node + 1]):
+			if self.attributeKey(j) == name:
+				return j
+		return -1
+
+	def close( self ):
+		for view in getattr(self, "views", ()):
+			view.release()
+		self.views = []
+		for key in ("strings", "attrValue"):
+			if hasattr(self, key): delattr(self, key)
+		if hasattr(self, "memory"):
+			self.memory.release()
+		self.mmap.close()
+		self.file.close()
+
+	def __enter__( self ):
+		return self
+
+	def __exit__( self, *args ):
+		self.close()
+
+# -----------------------------------------------------------------------------
+#
+# HIGH-LEVEL API
+#
+# -----------------------------------------------------------------------------
+
+def writeFile( tree:Union[Node,Iterable[Node],ColumnarTree], path:str ) -> int:
+	"""Writes the given tree or forest to the given path."""
+	with open(path, "wb") as f:
+		return BinaryTreeWriter().write(tree, f)
+
+def openFile( path:str ) -> MappedTree:
+	"""Memory-maps the binary tree at the given path."""
+	return MappedTree(path)
+
+# EOF - vim: ts=4 sw=4 noet
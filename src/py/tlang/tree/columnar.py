@@ -0,0 +1,354 @@
+from typing import Optional,Any,List,Dict,Union,Iterator,Iterable,Sequence,Tuple
+from array import array
+from tlang.tree.model import Node, NodeTemplate, Names, Repr, NOTHING
+
+__doc__ = """
+A columnar (struct-of-arrays) tree store, an alternative to the pointer-based
+`Node` implementation. Nodes are stored in pre-order and identified by their
+index, each node property being stored in its own column.
+"""
+
+# TODO: Support NumPy buffers, which would allow for vectorized predicates
+
+# The flags of a node, stored in the `flags` column
+F_TEMPLATE = 1
+
+# -----------------------------------------------------------------------------
+#
+# COLUMNAR TREE
+#
+# -----------------------------------------------------------------------------
+
+class ColumnarTree:
+	"""Stores a forest of trees as columns indexed by the pre-order position
+	of the nodes:
+
+	- `name`: the id of the node name in the global `Names` table
+	- `parent`, `firstChild`, `nextSibling`: node indexes, `-1` when none
+	- `depth`: the depth of the node within its tree
+	- `size`: the number of nodes in the subtree, including the node
+	- `flags`: the node's flags, like `F_TEMPLATE` for a `NodeTemplate`
+
+	Attributes are stored in the `attrKey` (name id) and `attrValue`
+	columns, the attributes of node `i` being in the range
+	`attrStart[i]:attrStart[i+1]`."""
+
+	def __init__( self ):
+		self.name        = array("I")
+		self.parent      = array("i")
+		self.firstChild  = array("i")
+		self.nextSibling = array("i")
+		self.depth       = array("I")
+		self.size        = array("I")
+		self.flags       = array("B")
+		self.attrStart   = array("I", [0])
+		self.attrKey     = array("I")
+		self.attrValue:List[Any] = []
+		self.roots       = array("I")
+
+	@classmethod
+	def FromNode( cls, node:Union[Node,Iterable[Node]] ) -> 'ColumnarTree':
+		"""Creates a columnar tree from the given node or forest."""
+		return cls().extend([node] if isinstance(node, Node) else node)
+
+	@property
+	def names( self ) -> List[str]:
+		return Names.ALL
+
+	def intern( self, name:str ) -> int:
+		"""Returns the id of the given name in the names table."""
+		return Names.Id(name)
+
+	# NOTE: The views access names and attribute keys through the following
+	# methods, so that stores with their own string table can implement them.
+
+	def nodeName( self, index:int ) -> str:
+		return Names.ALL[self.name[index]]
+
+	def nodeNameId( self, index:int ) -> int:
+		"""Returns the id of the node name in the global `Names` table."""
+		return self.name[index]
+
+	def attributeKey( self, index:int ) -> str:
+		return Names.ALL[self.attrKey[index]]
+
+	def attributeIndex( self, node:int, name:str ) -> int:
+		"""Returns the index of the attribute with the given name for the
+		given node, or `-1` if the node has no such attribute."""
+		key = Names.IDS.get(name)
+		if key is not None:
+			for j in range(self.attrStart[node], self.attrStart[node + 1]):
+				if self.attrKey[j] == key:
+					return j
+		return -1
+
+	def extend( self, nodes:Iterable[Node] ) -> 'ColumnarTree':
+		"""Appends the given trees to this forest."""
+		for node in nodes:
+			self.roots.append(len(self.name))
+			self.append(node)
+		return self
+
+	def append( self, root:Node ) -> int:
+		"""Appends the given tree, returning the index of its root."""
+		# We do an iterative pre-order walk, so that deep trees don't hit
+		# the recursion limit. Each entry is (node, parent index, depth),
+		# sibling links and sizes are resolved once the tree is added.
+		start = len(self.name)
+		stack:List[Tuple[Node,int,int]] = [(root, -1, 0)]
+		while stack:
+			node, parent, depth = stack.pop()
+			i = len(self.name)
+			self.name.append(self.intern(node.name))
+			self.parent.append(parent)
+			self.firstChild.append(-1)
+			self.nextSibling.append(-1)
+			self.depth.append(depth)
+			self.size.append(1)
+			self.flags.append(F_TEMPLATE if isinstance(node, NodeTemplate) else 0)
+			if node.hasAttributes:
+				for k,v in node._attributes.items():
+					self.attrKey.append(self.intern(k))
+					self.attrValue.append(v)
+			self.attrStart.append(len(self.attrKey))
+			children = node.children
+			for j in range(len(children) - 1, -1, -1):
+				stack.append((children[j], i, depth + 1))
+		self._link(start)
+		return start
+
+	def _link( self, start:int ):
+		"""Resolves the sibling links and subtree sizes for the nodes
+		added from `start`, which are in pre-order."""
+		end  = len(self.name)
+		last:Dict[int,int] = {}
+		# Sizes are computed bottom-up by walking the nodes backwards
+		for i in range(end - 1, start - 1, -1):
+			p = self.parent[i]
+			if p >= 0:
+				self.size[p] += self.size[i]
+		# Sibling links are computed by remembering the last seen child
+		# of each parent.
+		for i in range(start, end):
+			p = self.parent[i]
+			if p < 0:
+				continue
+			previous = last.get(p)
+			if previous is None:
+				self.firstChild[p] = i
+			else:
+				self.nextSibling[previous] = i
+			last[p] = i
+
+	def node( self, index:int ) -> 'ColumnarNode':
+		"""Returns a view on the node at the given index."""
+		return ColumnarNode(self, index)
+
+	def toNode( self, index:int=0 ) -> Node:
+		"""Materializes the subtree at the given index as a `Node`."""
+		end   = index + self.size[index]
+		nodes:Dict[int,Node] = {}
+		for i in range(index, end):
+			node = (NodeTemplate if self.flags[i] & F_TEMPLATE else Node)(self.nodeName(i))
+			for j in range(self.attrStart[i], self.attrStart[i + 1]):
+				node.setAttribute(self.attributeKey(j), self.attrValue[j])
+			nodes[i] = node
+			if i != index:
+				nodes[self.parent[i]].add(node)
+		return nodes[index]
+
+	def walk( self, index:Optional[int]=None ) -> Iterator['ColumnarNode']:
+		"""Yields views on the nodes of the subtree at the given index,
+		or of the whole forest if no index is given."""
+		start, end = (0, len(self.name)) if index is None else (index, index + self.size[index])
+		for i in range(start, end):
+			yield ColumnarNode(self, i)
+
+	@property
+	def trees( self ) -> List['ColumnarNode']:
+		return [ColumnarNode(self, _) for _ in self.roots]
+
+	def __len__( self ):
+		return len(self.name)
+
+# -----------------------------------------------------------------------------
+#
+# COLUMNAR NODE
+#
+# -----------------------------------------------------------------------------
+
+class ColumnarNode:
+	"""A lightweight, read-only view on a node of a columnar tree that
+	implements the read API of `Node`."""
+
+	__slots__ = ("tree", "position")
+
+	def __init__( self, tree:ColumnarTree, position:int ):
+		self.tree     = tree
+		self.position = position
+
+	@property
+	def name( self ) -> str:
+		return self.tree.nodeName(self.position)
+
+	@property
+	def nameId( self ) -> int:
+		return self.tree.nodeNameId(self.position)
+
+	@property
+	def id( self ) -> int:
+		return self.position
+
+	@property
+	def parent( self ) -> Optional['ColumnarNode']:
+		p = self.tree.parent[self.position]
+		return ColumnarNode(self.tree, p) if p >= 0 else None
+
+	@property
+	def attributes( self ) -> Dict[str,Any]:
+		tree = self.tree
+		return dict(
+			(tree.attributeKey(j), tree.attrValue[j])
+			for j in range(tree.attrStart[self.position], tree.attrStart[self.position + 1]))
+
+	@property
+	def metadata( self ) -> Optional[Dict[str,Any]]:
+		return None
+
+	@property
+	def head( self ) -> Optional['ColumnarNode']:
+		c = self.tree.firstChild[self.position]
+		return ColumnarNode(self.tree, c) if c >= 0 else None
+
+	@property
+	def tail( self ) -> List['ColumnarNode']:
+		return self.children[1:]
+
+	@property
+	def children( self ) -> List['ColumnarNode']:
+		res = []
+		tree = self.tree
+		c = tree.firstChild[self.position]
+		while c >= 0:
+			res.append(ColumnarNode(tree, c))
+			c = tree.nextSibling[c]
+		return res
+
+	@property
+	def childrenCount( self ) -> int:
+		count = 0
+		tree = self.tree
+		c = tree.firstChild[self.position]
+		while c >= 0:
+			count += 1
+			c = tree.nextSibling[c]
+		return count
+
+	@property
+	def root( self ) -> Optional['ColumnarNode']:
+		# NOTE: Like `Node.root`, a tree has no root
+		tree = self.tree
+		if tree.parent[self.position] < 0:
+			return None
+		i = self.position
+		while tree.parent[i] >= 0:
+			i = tree.parent[i]
+		return ColumnarNode(tree, i)
+
+	@property
+	def isTree( self ) -> bool:
+		return self.tree.parent[self.position] < 0
+
+	@property
+	def isEmpty( self ) -> bool:
+		return self.isLeaf and not self.hasAttributes
+
+	@property
+	def isSubtree( self ) -> bool:
+		return self.tree.parent[self.position] >= 0
+
+	@property
+	def isLeaf( self ) -> bool:
+		return self.tree.firstChild[self.position] < 0
+
+	@property
+	def isNode( self ) -> bool:
+		return self.tree.firstChild[self.position] >= 0
+
+	@property
+	def hasAttributes( self ) -> bool:
+		return self.tree.attrStart[self.position] != self.tree.attrStart[self.position + 1]
+
+	def hasAttribute( self, name:str ) -> bool:
+		return self.attr(name, NOTHING) is not NOTHING
+
+	def attr( self, name:str, default=None ):
+		j = self.tree.attributeIndex(self.position, name)
+		return self.tree.attrValue[j] if j >= 0 else default
+
+	def meta( self, name:str ):
+		return None
+
+	def index( self, node:'ColumnarNode' ) -> int:
+		for i,c in enumerate(self.children):
+			if c == node:
+				return i
+		raise ValueError(f"Node {node} is not a child of {self}")
+
+	def walk( self, functor=None ):
+		# NOTE: Pruned subtrees are skipped using the subtree size
+		tree = self.tree
+		i    = self.position
+		end  = i + tree.size[i]
+		while i < end:
+			node = ColumnarNode(tree, i)
+			if not functor or functor(node) is not False:
+				yield node
+				i += 1
+			else:
+				i += tree.size[i]
+
+	def toNode( self ) -> Node:
+		return self.tree.toNode(self.position)
+
+	def toPrimitive( self ):
+		res  = [self.name]
+		attr = self.attributes
+		if attr:
+			res.append(attr)
+		for _ in self.children:
+			res.append(_.toPrimitive())
+		return res
+
+	def __getitem__( self, index:Union[int,str] ):
+		if isinstance(index, str):
+			value = self.attr(index, NOTHING)
+			if value is NOTHING:
+				raise IndexError(f"Node has no attribute '{index}': {self}")
+			return value
+		else:
+			return self.children[index]
+
+	def __eq__( self, other ):
+		return isinstance(other, ColumnarNode) and other.tree is self.tree and other.position == self.position
+
+	def __hash__( self ):
+		return hash((id(self.tree), self.position))
+
+	def __str__( self ):
+		return "".join(Repr.Apply(self))
+
+	def __repr__( self ):
+		return f"<ColumnarNode:{self.name} {' '.join(str(k)+'='+repr(v) for k,v in self.attributes.items())}{' …' + str(self.childrenCount) if self.isNode else ''}>"
+
+class ColumnarCursor(ColumnarNode):
+	"""A node view whose position is moved along by a traversal, so that
+	a single object is used for the whole traversal. Use `view` to get
+	a stable view of the current position."""
+
+	__slots__ = ()
+
+	def view( self ) -> ColumnarNode:
+		return ColumnarNode(self.tree, self.position)
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,239 @@
+from typing import Optional,Any,List,Dict,Iterator,Iterable,Tuple,Union
+from collections import OrderedDict
+from tlang.tree.model import Node,NodeTemplate,Names
+import re
+
+__doc__ = """
+A SAX-like event stream for the tree notation, so that trees can be
+processed while the source is scanned, without building them. Events are
+`(type, name, value)` triples:
+
+- `(OPEN, name, None)` when a node starts, `TEMPLATE` for template nodes
+- `(ATTR, key, value)` for each attribute of the node that was opened last
+- `(CLOSE, name, None)` when a node ends
+
+The scanner produces the same trees as the grammar-based parser in
+`tlang.tree.parser`, and only keeps the stack of open nodes in memory.
+"""
+
+OPEN     = 0
+ATTR     = 1
+CLOSE    = 2
+TEMPLATE = 3
+
+TEvent = Tuple[int,str,Any]
+
+class TreeSyntaxError(Exception):
+
+	def __init__( self, message:str, offset:int, text:str, base:int=0, lines:int=0 ):
+		# The text may be a part of the source that starts at offset
+		# `base`, after `lines` lines (see `tlang.tree.reader.readTrees`).
+		line = lines + text.count("\n", 0, offset) + 1
+		super().__init__(f"{message} at line {line}, offset {base + offset}: {text[offset:offset+20]!r}")
+		self.offset = base + offset
+		self.line   = line
+
+# -----------------------------------------------------------------------------
+#
+# SCANNER
+#
+# -----------------------------------------------------------------------------
+
+# The tokens of the tree notation, which the grammar of `tlang.tree.parser`
+# and the scanners below are built from, so that they can't differ.
+TOKENS = {
+	"WS"                   : r"[\s\n]+",
+	"NUMBER"               : r"[0-9]+(\.[0-9]+)?",
+	"STRING_DQ"            : r"\"[^\"]*\"",
+	"NODE_NAME"            : r"[a-z][\-a-z0-9]*",
+	"NODE_COMMENT"         : r";;[^\n]*[\n]?",
+	"NODE_SYMBOL_Q"        : r"'([a-zA-Z][\-_A-Za-z0-9]*)",
+	"NODE_ATTRIBUTE_VALUE" : r"[^\s\)\(\[\]\{\}]+",
+	"NODE_TEMPLATE"        : r"(…|\.\.\.)?([A-Z][_A-Z]*)",
+}
+
+RE_SKIP = re.compile(r"[\s\n]*")
+
+# A child of the current node (or a top-level tree), after whitespace.
+# The alternatives follow the order of the grammar (`NodeChild`), and only
+# one of them can match a given first character. The kind of child is
+# given by the match's `lastindex` (see `K_CLOSE` and others), as the
+# token groups close before the named group that wraps them.
+RE_CHILD = re.compile(r"[\s\n]*(?:" + "|".join((
+	r"(?P<close>\))",
+	f"(?P<symbol>{TOKENS['NODE_SYMBOL_Q']})",
+	f"(?P<number>{TOKENS['NUMBER']})",
+	f"(?P<string>{TOKENS['STRING_DQ']})",
+	rf"\([\s\n]*(?P<node>{TOKENS['NODE_NAME']})(?P<attributes>[\s\n]*\([\s\n]*@)?",
+	f"(?P<template>{TOKENS['NODE_TEMPLATE']})",
+	f"(?P<leaf>{TOKENS['NODE_NAME']})",
+	# Comments are only allowed between trees
+	f"(?P<comment>{TOKENS['NODE_COMMENT']})",
+)) + ")?")
+
+K_CLOSE, K_SYMBOL, K_NUMBER, K_STRING, K_NODE, K_ATTRIBUTES, K_TEMPLATE, K_LEAF, K_COMMENT = (RE_CHILD.groupindex[_] for _ in (
+	"close", "symbol", "number", "string", "node", "attributes", "template", "leaf", "comment"))
+
+# The start of an attribute or the end of the attributes
+RE_ATTRIBUTE       = re.compile(rf"[\s\n]*(?:(?P<end>\))|\([\s\n]*(?P<key>{TOKENS['NODE_NAME']}))")
+RE_ATTRIBUTE_VALUE = re.compile(rf"[\s\n]*(?:(?P<string>{TOKENS['STRING_DQ']})|(?P<number>{TOKENS['NUMBER']})|(?P<symbol>{TOKENS['NODE_ATTRIBUTE_VALUE']}))")
+RE_ATTRIBUTE_END   = re.compile(r"[\s\n]*\)")
+
+def parseNumber( text:str ):
+	value = float(text)
+	return int(value) if int(value) == value else value
+
+class TreeScanner:
+	"""The tokenizer shared by `TreeEventParser` and the tree reader of
+	`tlang.tree.reader`: both match the children of nodes with `RE_CHILD`
+	and the attributes with `attributes`. The text starts at offset `base`
+	of the source, after `lines` lines, so that errors are reported
+	relative to the source."""
+
+	def __init__( self, text:str="" ):
+		self.text   = text
+		self.offset = 0
+		self.base   = 0
+		self.lines  = 0
+
+	def error( self, message:str, offset:Optional[int]=None ):
+		offset = self.offset if offset is None else offset
+		raise TreeSyntaxError(message, RE_SKIP.match(self.text, offset).end(), self.text, self.base, self.lines)
+
+	def attributes( self, offset:int ) -> Tuple[Dict[str,Any],int]:
+		"""Parses the attributes like `(@ (key value) …)`, starting after
+		the `@`, and returns them along with the offset after them."""
+		text       = self.text
+		attributes:Dict[str,Any] = OrderedDict()
+		while True:
+			m = RE_ATTRIBUTE.match(text, offset)
+			if not m:
+				self.error("Expected attribute", offset)
+			offset = m.end()
+			if m.lastgroup == "end":
+				break
+			key = Names.Intern(m.group("key"))
+			m   = RE_ATTRIBUTE_VALUE.match(text, offset)
+			if not m:
+				self.error("Expected attribute value", offset)
+			attributes[key] = parseNumber(m.group("number")) if m.lastgroup == "number" else m.group(m.lastgroup)
+			m = RE_ATTRIBUTE_END.match(text, m.end())
+			if not m:
+				self.error("Expected end of attribute", offset)
+			offset = m.end()
+		if not attributes:
+			self.error("Expected at least one attribute", offset - 1)
+		return (attributes, offset)
+
+class TreeEventParser(TreeScanner):
+	"""Scans tree notation source and yields events. The scanner is
+	iterative, so that deeply nested trees don't hit the recursion
+	limit."""
+
+	def __init__( self, text:str="" ):
+		super().__init__(text)
+		# The names of the open nodes
+		self.stack:List[str] = []
+
+	def events( self ) -> Iterator[TEvent]:
+		"""Yields the events for the whole text, which is a forest."""
+		text   = self.text
+		end    = len(text)
+		match  = RE_CHILD.match
+		stack  = self.stack
+		offset = self.offset
+		while True:
+			m      = match(text, offset)
+			kind   = m.lastindex
+			offset = self.offset = m.end()
+			if kind is None:
+				if offset < end:
+					self.error("Unexpected character", offset)
+				elif stack:
+					self.error(f"Unexpected end of input, unclosed node '{stack[-1]}'", offset)
+				return
+			elif kind == K_CLOSE:
+				if not stack:
+					self.error("Unexpected ')'", offset - 1)
+				yield (CLOSE, stack.pop(), None)
+			elif kind == K_COMMENT:
+				if stack:
+					self.error("Unexpected comment in node", m.start(K_COMMENT))
+			elif kind == K_NODE or kind == K_ATTRIBUTES:
+				name = Names.Intern(m.group(K_NODE))
+				stack.append(name)
+				yield (OPEN, name, None)
+				if kind == K_ATTRIBUTES:
+					attributes, offset = self.attributes(offset)
+					for k, v in attributes.items():
+						yield (ATTR, k, v)
+			elif kind == K_LEAF:
+				name = Names.Intern(m.group(K_LEAF))
+				yield (OPEN, name, None)
+				yield (CLOSE, name, None)
+			elif kind == K_SYMBOL:
+				yield from self.leaf("symbol", m.group(K_SYMBOL + 1))
+			elif kind == K_NUMBER:
+				yield from self.leaf("number", parseNumber(m.group(K_NUMBER)))
+			elif kind == K_STRING:
+				# NOTE: Like the grammar processor, the quotes are kept
+				yield from self.leaf("string", m.group(K_STRING))
+			else:
+				# The groups of the template token follow its own
+				yield (TEMPLATE, "template", None)
+				yield (ATTR, "value", m.group(K_TEMPLATE + 2))
+				if m.group(K_TEMPLATE + 1):
+					yield (ATTR, "expand", True)
+				yield (CLOSE, "template", None)
+
+	def leaf( self, name:str, value:Any ) -> Iterator[TEvent]:
+		yield (OPEN, name, None)
+		yield (ATTR, "value", value)
+		yield (CLOSE, name, None)
+
+# -----------------------------------------------------------------------------
+#
+# BUILDER
+#
+# -----------------------------------------------------------------------------
+
+def buildTrees( events:Iterable[TEvent] ) -> Iterator[Node]:
+	"""Builds the trees for the given events, yielding each top-level node
+	once it is closed."""
+	stack:List[Node] = []
+	for type, name, value in events:
+		if type == ATTR:
+			stack[-1].setAttribute(name, value)
+		elif type == CLOSE:
+			node = stack.pop()
+			if not stack:
+				yield node
+		else:
+			node = NodeTemplate(name) if type == TEMPLATE else Node(name)
+			if stack:
+				stack[-1].add(node)
+			stack.append(node)
+
+def treeEvents( tree:Union[Node,Iterable[Node]] ) -> Iterator[TEvent]:
+	"""Yields the events for the given tree or forest, as if it was
+	parsed from its source."""
+	stack:List[Tuple[Node,bool]] = [(_, False) for _ in reversed([tree] if isinstance(tree, Node) else list(tree))]
+	while stack:
+		node, isClosing = stack.pop()
+		if isClosing:
+			yield (CLOSE, node.name, None)
+			continue
+		yield (TEMPLATE if isinstance(node, NodeTemplate) else OPEN, node.name, None)
+		if node.hasAttributes:
+			for k,v in node._attributes.items():
+				yield (ATTR, k, v)
+		stack.append((node, True))
+		children = node.children
+		for i in range(len(children) - 1, -1, -1):
+			stack.append((children[i], False))
+
+def parseEvents( text:str ) -> Iterator[TEvent]:
+	"""Yields the events for the given tree notation source."""
+	return TreeEventParser(text).events()
+
+# EOF - vim: ts=4 sw=4 noet
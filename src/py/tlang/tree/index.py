@@ -0,0 +1,201 @@
+from typing import Optional,Any,List,Dict,Union,Iterator,Iterable,Tuple
+from array import array
+from bisect import bisect_left, bisect_right
+from tlang.tree.model import Node, Names, TreeNumbering
+from tlang.tree.columnar import ColumnarTree, ColumnarNode
+
+__doc__ = """
+Inverted indexes over a tree, so that queries can look up the nodes with
+a given name or attribute instead of walking the whole tree.
+"""
+
+# -----------------------------------------------------------------------------
+#
+# TREE INDEX
+#
+# -----------------------------------------------------------------------------
+
+class TreeIndex:
+	"""An index of a tree (or forest), built once and then used to answer
+	queries. Nodes are identified by their pre-order *position*, and the
+	index stores for each position:
+
+	- `depth`, `size` (of the subtree) and `parent` (`-1` for roots)
+	- `post`, the post-order rank of the node
+
+	along with `byName` (name id → sorted positions) and `byAttribute`
+	(attribute name → sorted positions) inverted indexes. As positions
+	are in pre-order, the descendants of `p` are the positions in
+	`(p, p + size[p])`, which makes descendant lookups a range search.
+
+	The index is a snapshot: it needs to be rebuilt when the tree changes.
+	Columnar trees are indexed using their own positions."""
+
+	def __init__( self, tree:Union[Node,Iterable[Node],ColumnarTree] ):
+		self.columnar:Optional[ColumnarTree] = None
+		self.nodes:List[Node] = []
+		self.positions:Dict[int,int] = {}
+		self.count  = 0
+		self.depth  = array("I")
+		self.size   = array("I")
+		self.parent = array("i")
+		self.post   = array("I")
+		self.roots  = array("I")
+		self.byName:Dict[int,array] = {}
+		self.byAttribute:Dict[str,array] = {}
+		if isinstance(tree, ColumnarTree):
+			self.columnar = tree
+			self.addColumnar(tree)
+		else:
+			for root in ([tree] if isinstance(tree, Node) else tree):
+				self.add(root)
+
+	def add( self, root:Node ) -> 'TreeIndex':
+		"""Indexes the given tree, which is added to the forest."""
+		assert not self.columnar, "Columnar tree indexes cannot be extended"
+		start = self.count
+		self.roots.append(start)
+		numbering = root._numbering
+		if numbering and numbering.root is root:
+			return self.addNumbered(numbering.update())
+		stack:List[Tuple[Node,int,int]] = [(root, -1, 0)]
+		while stack:
+			node, parent, depth = stack.pop()
+			position = self.register(node.nameId, parent, depth, node._attributes if node.hasAttributes else ())
+			self.nodes.append(node)
+			self.positions[id(node)] = position
+			children = node.children
+			for j in range(len(children) - 1, -1, -1):
+				stack.append((children[j], position, depth + 1))
+		self.number(start)
+		return self
+
+	def addNumbered( self, numbering:TreeNumbering ) -> 'TreeIndex':
+		"""Indexes a numbered tree, reusing its numbering instead of
+		traversing it."""
+		start = self.count
+		for i, node in enumerate(numbering.nodes):
+			parent = numbering.parent[i]
+			self.register(node.nameId, start + parent if parent >= 0 else -1, numbering.depth[i], node._attributes or ())
+			self.nodes.append(node)
+			self.positions[id(node)] = start + i
+		for i in range(len(numbering.nodes)):
+			self.size[start + i] = numbering.size[i]
+			self.post[start + i] = start + numbering.post[i]
+		return self
+
+	def addColumnar( self, tree:ColumnarTree ) -> 'TreeIndex':
+		"""Indexes the given columnar tree, the positions being the same
+		as the columnar tree's indexes, so that no view is created."""
+		self.roots.extend(tree.roots)
+		for i in range(len(tree)):
+			self.register(tree.nodeNameId(i), tree.parent[i], tree.depth[i],
+				(tree.attributeKey(j) for j in range(tree.attrStart[i], tree.attrStart[i + 1])))
+		self.number(0)
+		return self
+
+	def register( self, nameId:int, parent:int, depth:int, attributes:Iterable[str] ) -> int:
+		position = self.count
+		self.count += 1
+		self.depth.append(depth)
+		self.size.append(1)
+		self.parent.append(parent)
+		self.post.append(0)
+		self.byName.setdefault(nameId, array("I")).append(position)
+		for key in attributes:
+			self.byAttribute.setdefault(key, array("I")).append(position)
+		return position
+
+	def number( self, start:int ):
+		"""Computes the subtree sizes and post-order ranks of the nodes
+		added since `start`."""
+		end = self.count
+		for i in range(end - 1, start - 1, -1):
+			p = self.parent[i]
+			if p >= 0:
+				self.size[p] += self.size[i]
+		for i in range(start, end):
+			# In a forest numbered in pre-order, the post-order rank is
+			# the number of nodes that end before this one ends.
+			self.post[i] = i + self.size[i] - 1 - self.depth[i]
+
+	# =========================================================================
+	# ACCESSORS
+	# =========================================================================
+
+	def position( self, node:Any ) -> int:
+		"""Returns the position of the given node, or `-1` if it is not
+		part of the index."""
+		if isinstance(node, ColumnarNode):
+			return node.position if node.tree is self.columnar else -1
+		return self.positions.get(id(node), -1)
+
+	def node( self, position:int ) -> Union[Node,ColumnarNode]:
+		return ColumnarNode(self.columnar, position) if self.columnar else self.nodes[position]
+
+	def withName( self, name:str ) -> array:
+		"""Returns the sorted positions of the nodes with the given name."""
+		return self.byName.get(Names.IDS.get(name, -1), EMPTY)
+
+	def withAttribute( self, name:str ) -> array:
+		"""Returns the sorted positions of the nodes with the given attribute."""
+		return self.byAttribute.get(name, EMPTY)
+
+	# =========================================================================
+	# RELATIONS
+	# =========================================================================
+
+	def isAncestor( self, ancestor:int, position:int ) -> bool:
+		return ancestor < position and position < ancestor + self.size[ancestor]
+
+	def range( self, candidates:array, position:int ) -> array:
+		"""Returns the candidates that are descendants of the given position,
+		`-1` denoting the (virtual) document that contains the forest."""
+		if position < 0:
+			return candidates
+		lo = bisect_right(candidates, position)
+		hi = bisect_left(candidates, position + self.size[position], lo)
+		return candidates[lo:hi]
+
+	def descendants( self, candidates:array, positions:Iterable[int] ) -> List[int]:
+		"""Returns the candidates that are descendants of any of the given
+		(sorted) positions, in document order."""
+		res:List[int] = []
+		end = -1
+		for p in positions:
+			# Positions nested in a previous one are already covered
+			if p < 0:
+				return list(candidates)
+			elif p < end:
+				continue
+			res.extend(self.range(candidates, p))
+			end = p + self.size[p]
+		return res
+
+	def children( self, candidates:array, positions:Iterable[int] ) -> List[int]:
+		"""Returns the candidates that are children of any of the given
+		(sorted) positions, in document order."""
+		# The descendants are restricted to the outermost positions, so
+		# we only need to check the parent of each.
+		parents = set(positions)
+		parent  = self.parent
+		return [_ for _ in self.descendants(candidates, positions) if parent[_] in parents]
+
+	def parents( self, positions:Iterable[int] ) -> List[int]:
+		return sorted(set(self.parent[p] for p in positions if p >= 0 and self.parent[p] >= 0))
+
+	def ancestors( self, positions:Iterable[int] ) -> List[int]:
+		res = set()
+		for p in positions:
+			p = self.parent[p] if p >= 0 else -1
+			while p >= 0 and p not in res:
+				res.add(p)
+				p = self.parent[p]
+		return sorted(res)
+
+	def __len__( self ):
+		return self.count
+
+EMPTY = array("I")
+
+# EOF - vim: ts=4 sw=4 noet
@@ -1,9 +1,14 @@
 
-from typing import Optional,Any,List,Dict,Union,Iterator,Iterable,Callable
+from typing import Optional,Any,List,Dict,Union,Iterator,Iterable,Callable,Sequence
 from collections import OrderedDict
-from tlang.utils import NOTHING
+from array import array
+import weakref
 import json, inspect
 
+# NOTE: This is re-exported by `tlang.utils`, it is defined here so that
+# the tree model does not depend on the parsing utilities.
+NOTHING = object()
+
 # TODO: XML and JSON interop
 # TODO: Source reference as attributes
 # TODO: Nice tree formatter
@@ -15,28 +20,153 @@ The core model representing trees and nodes.
 # TODO: The operations should probably be made by a manipulator, and the
 # core data structure should be kept as minimal as possible.
 
+# NOTE: Shared by all the leaves, so that they don't need to allocate
+# an empty list.
+EMPTY_CHILDREN:Sequence['Node'] = ()
+
+# -----------------------------------------------------------------------------
+#
+# NAMES
+#
+# -----------------------------------------------------------------------------
+
+class Names:
+	"""The global name table, which interns node names and attribute keys
+	as small integers. Nodes store the id of their name, so that all the
+	trees share a single copy of each name and predicates can compare
+	integers instead of strings."""
+
+	ALL:List[str] = []
+	IDS:Dict[str,int] = {}
+
+	@classmethod
+	def Id( cls, name:str ) -> int:
+		"""Returns the id of the given name, registering it if needed."""
+		i = cls.IDS.get(name)
+		if i is None:
+			i = len(cls.ALL)
+			cls.ALL.append(name)
+			cls.IDS[name] = i
+		return i
+
+	@classmethod
+	def Intern( cls, name:str ) -> str:
+		"""Returns the shared copy of the given name."""
+		return cls.ALL[cls.Id(name)]
+
+	@classmethod
+	def Name( cls, id:int ) -> str:
+		return cls.ALL[id]
+
 # -----------------------------------------------------------------------------
 #
 # NODE
 #
 # -----------------------------------------------------------------------------
 
+class SharedAttributes(OrderedDict):
+	"""An attributes map shared by a node and its copies, which is copied
+	before being written to (see `Node.copy`)."""
+	__slots__ = ()
+
+class PendingCopies:
+	"""The pending copies of a source node (see `Node.copy`), which are
+	weakly referenced. The set is released from its source once it is
+	empty, including when its copies are garbage collected, so that
+	`Node.SOURCES` only counts the sources that do have pending copies."""
+
+	__slots__ = ("source", "refs")
+
+	def __init__( self, source:'Node' ):
+		self.source = source
+		self.refs:Dict[int,weakref.ref] = {}
+		source._cow = self
+		Node.SOURCES += 1
+
+	def __iter__( self ):
+		for ref in list(self.refs.values()):
+			node = ref()
+			if node is not None:
+				yield node
+
+	def __len__( self ):
+		return len(self.refs)
+
+	def add( self, node:'Node' ):
+		key = id(node)
+		self.refs[key] = weakref.ref(node, lambda _:self.discard(key))
+
+	def discard( self, key:int ):
+		if self.refs.pop(key, None) is not None and not self.refs:
+			self.release()
+
+	def release( self ):
+		if self.source._cow is self:
+			self.source._cow = None
+			Node.SOURCES -= 1
+
 class Node:
 	"""A node is an uniquely identified, named object with zero or one parent,
-	a set of attributes and a list of children."""
+	a set of attributes and a list of children.
+
+	Nodes are slotted and only allocate their attributes, children and
+	metadata containers once something is actually stored in them, so that
+	leaves (which make up most of a tree) stay small.
+
+	Copies are copy-on-write (see `copy`): `_cow` is the source of a
+	copy whose children are yet to be copied, and the set of these
+	pending copies on the source."""
+
+	__slots__ = ("nameId", "id", "parent", "_attributes", "_children", "metadata", "_numbering", "_cow", "__weakref__")
 
 	IDS = 0
+	# The number of nodes with pending copies (see `PendingCopies`), so
+	# that mutations only look for them when there are some.
+	SOURCES = 0
 
 	def __init__( self, name:str ):
 		# FIXME: This does not support namespace
 		assert isinstance(name,str), f"Node name must be a string, got: {name}"
-		self.name = name
+		self.nameId = Names.Id(name)
 		self.id   = Node.IDS ; Node.IDS += 1
 		self.parent:Optional['Node'] = None
 		# FIXME: This does not support namespaces for attributes
-		self.attributes:Dict[str,Any] = OrderedDict()
-		self._children:List['Node'] = []
+		self._attributes:Optional[Dict[str,Any]] = None
+		self._children:Optional[List['Node']] = None
 		self.metadata:Optional[Dict[str,Any]] = None
+		self._numbering:Optional['TreeNumbering'] = None
+		self._cow:Union[None,'Node',PendingCopies] = None
+
+	def __getattr__( self, name:str ):
+		# NOTE: This is only called for unset slots, the only one being
+		# the `_children` of a copy that has not copied them yet.
+		if name != "_children":
+			raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+		return self.materialize()
+
+	@property
+	def name( self ) -> str:
+		return Names.ALL[self.nameId]
+
+	@name.setter
+	def name( self, name:str ):
+		if Node.SOURCES:
+			self.unshare()
+		self.nameId = Names.Id(name)
+
+	@property
+	def attributes( self ) -> Dict[str,Any]:
+		# NOTE: The attributes map is allocated on access, as callers
+		# may mutate it directly. Internal read paths use `_attributes`
+		# so that leaves never allocate it and shared maps are not copied.
+		if Node.SOURCES:
+			self.unshare()
+		attributes = self._attributes
+		if attributes is None:
+			attributes = self._attributes = OrderedDict()
+		elif type(attributes) is SharedAttributes:
+			attributes = self._attributes = OrderedDict(attributes)
+		return attributes
 
 	@property
 	def head( self ) -> Optional['Node']:
@@ -44,18 +174,41 @@ class Node:
 
 	@property
 	def tail( self ) -> List['Node']:
-		return self._children[1:]
+		return self._children[1:] if self._children else []
 
 	@property
-	def children( self ) -> List['Node']:
-		return self._children
+	def children( self ) -> Sequence['Node']:
+		# NOTE: Leaves share an empty tuple, children must be
+		# added through `add`/`insert`.
+		return self._children or EMPTY_CHILDREN
 
 	@property
 	def childrenCount( self ) -> int:
-		return len(self._children)
+		return len(self._children) if self._children else 0
+
+	@property
+	def numbering( self ) -> Optional['TreeNumbering']:
+		"""The up-to-date numbering of the tree this node belongs to, if
+		the tree was numbered (see `number`)."""
+		return self._numbering.update() if self._numbering else None
+
+	def number( self ) -> 'TreeNumbering':
+		"""Numbers the tree this node belongs to, returning the numbering,
+		which is then kept up to date as the tree is mutated."""
+		root = self
+		while root.parent:
+			root = root.parent
+		numbering = root._numbering
+		if not numbering or numbering.root is not root:
+			numbering = TreeNumbering(root)
+		return numbering.update()
 
 	@property
 	def root( self ) -> Optional['Node']:
+		# A valid numbering knows the root, otherwise we walk up
+		numbering = self._numbering
+		if numbering and numbering.isValid:
+			return numbering.root if numbering.root is not self else None
 		root   = None
 		parent = self.parent
 		while parent:
@@ -77,18 +230,18 @@ class Node:
 
 	@property
 	def isLeaf( self ) -> bool:
-		return len(self._children) == 0
+		return not self._children
 
 	@property
 	def isNode( self ) -> bool:
-		return len(self._children) > 0
+		return bool(self._children)
 
 	@property
 	def hasAttributes( self ) -> bool:
-		return len(self.attributes) > 0
+		return bool(self._attributes)
 
 	def hasAttribute( self, name:str ) -> bool:
-		return name in self.attributes
+		return name in self._attributes if self._attributes else False
 
 	def setAttribute( self, name, value=None ):
 		self.attributes[name] = value
@@ -96,21 +249,95 @@ class Node:
 
 	def attr( self, name, value=NOTHING ):
 		if value is NOTHING:
-			return self.attributes.get(name)
+			return self._attributes.get(name) if self._attributes else None
 		else:
 			self.attributes[name] = value
 			return self
 
 	def copy( self, depth=-1 ):
 		"""Does a deep copy of this node. If a depth is given, it will
-		stop at the given depth."""
-		node = Node(self.name)
-		self.attributes = type(self.attributes)((k,v) for k,v in self.attributes.items())
-		if depth != 0:
+		stop at the given depth.
+
+		The copy is copy-on-write: a full copy only copies its children
+		(as copies) when they are first accessed, so that copying does not
+		depend on the size of the tree. Either side copies what it shares
+		before mutating it, so that mutations never show on the other
+		side. The attributes of this node are copied, as callers may hold
+		its map, but the copy shares them with its own copies."""
+		node = self.__class__(self.name)
+		attributes = self._attributes
+		if attributes:
+			node._attributes = attributes if type(attributes) is SharedAttributes else SharedAttributes(attributes)
+		if depth == -1:
+			# A copy of a pending copy is a copy of its source
+			source = self._cow if isinstance(self._cow, Node) else self
+			if source._children:
+				del node._children
+				node._cow = source
+				pending = source._cow
+				if pending is None:
+					pending = PendingCopies(source)
+				pending.add(node)
+		elif depth != 0 and self._children:
 			for child in self._children:
 				node.append(child.copy(depth - 1))
 		return node
 
+	def materialize( self ) -> Optional[List['Node']]:
+		"""Copies the children of this pending copy from its source, each
+		of them being itself a pending copy."""
+		source = self._cow
+		self._cow = None
+		source._cow.discard(id(self))
+		children = source._children
+		if children:
+			children = [_.copy() for _ in children]
+			for child in children:
+				child.parent = self
+		else:
+			children = None
+		self._children = children
+		return children
+
+	def unshare( self, children:bool=False ):
+		"""Called before this node (or its children list, when `children`
+		is set) is mutated, so that the pending copies of this node and its
+		ancestors copy what they need first."""
+		if not Node.SOURCES:
+			return
+		ancestors = []
+		node = self.parent
+		while node:
+			ancestors.append(node)
+			node = node.parent
+		# Materializing the copies of an ancestor creates pending copies
+		# of the next ancestor, so we go down from the root.
+		for node in reversed(ancestors):
+			if type(node._cow) is PendingCopies:
+				node.unshareCopies()
+		if children and type(self._cow) is PendingCopies:
+			self.unshareCopies()
+
+	def unshareCopies( self ):
+		pending = self._cow
+		for copy in pending:
+			copy.materialize()
+		# The set might only have had copies that are being collected
+		pending.release()
+
+	def __getstate__( self ):
+		# The pending copies are not pickled (they are weakly referenced),
+		# so a pending copy copies its children first. Name ids are
+		# specific to a process, so the name is pickled instead.
+		if isinstance(self._cow, Node):
+			self.materialize()
+		return (self.name, self.id, self.parent, self._attributes, self._children, self.metadata, self._numbering)
+
+	def __setstate__( self, state ):
+		name, self.id, self.parent, self._attributes, self._children, self.metadata, self._numbering = state
+		self.nameId = Names.Id(name)
+		self._cow   = None
+
 	def meta( self, name:str, value=NOTHING ):
 		"""Sets/accesses the node's metadata."""
 		if value is NOTHING:
@@ -123,6 +350,8 @@ class Node:
 			return self
 
 	def index( self, node ) -> int:
+		if not self._children:
+			raise ValueError(f"Node has no children: {self}")
 		return self._children.index(node)
 
 	def detach( self ) -> 'Node':
@@ -131,7 +360,7 @@ class Node:
 		return self
 
 	def merge( self, node:'Node' ) -> 'Node':
-		children = [_ for _ in node._children]
+		children = [_ for _ in node.children]
 		for c in children:
 			self.add(c.detach())
 		return self
@@ -139,8 +368,15 @@ class Node:
 	def add( self, node:'Node' ) -> 'Node':
 		assert isinstance(node, Node), f"Expected a Node, got: {node}"
 		assert not node.parent, "Cannot add node to {0}, it already has a parent: {1}".format(self, node)
+		if Node.SOURCES:
+			self.unshare(True)
+		if self._numbering or node._numbering:
+			TreeNumbering.Attach(self, node)
 		node.parent = self
-		self._children.append(node)
+		if self._children is None:
+			self._children = [node]
+		else:
+			self._children.append(node)
 		return node
 
 	def append( self, node:'Node') -> 'Node':
@@ -153,50 +389,69 @@ class Node:
 
 	def remove( self, node:'Node' ) -> 'Node':
 		assert node.parent is self, "Cannot remove node from {0}, it has a different parent: {1}".format(self, node.parent)
+		if Node.SOURCES:
+			self.unshare(True)
+		if self._numbering:
+			TreeNumbering.Detach(self, node)
 		node.parent = None
 		self._children.remove(node)
+		if not self._children:
+			self._children = None
 		return node
 
 	def insert( self, index:int, node:'Node' ) -> 'Node':
-		index = index if index >= 0 else len(self._children) + index
-		assert index >=0 and index <= len(self._children), "Index out of bounds {0} in: {1}".format(index, self)
+		count = self.childrenCount
+		index = index if index >= 0 else count + index
+		assert index >=0 and index <= count, "Index out of bounds {0} in: {1}".format(index, self)
 		assert not node.parent, "Cannot add node to {0}, it already has a parent: {1}".format(self, node)
+		if Node.SOURCES:
+			self.unshare(True)
+		if self._numbering or node._numbering:
+			TreeNumbering.Attach(self, node)
 		node.parent = self
-		if index == len(self._children):
+		if self._children is None:
+			self._children = [node]
+		elif index == count:
 			self._children.append(node)
 		else:
 			self._children.insert(index, node)
 		return node
 
 	def walk( self, functor=None ):
-		if not functor or functor(self) is not False:
-			yield self
-			for c in self._children:
-				yield from c.walk(functor)
+		"""Yields this node and its descendants in pre-order, skipping the
+		subtrees of the nodes for which the functor returns `False`."""
+		cursor = TreeCursor(self)
+		while True:
+			node = cursor.node
+			if not functor or functor(node) is not False:
+				yield node
+				if not cursor.next():
+					break
+			elif not cursor.skip():
+				break
 
 	def toPrimitive( self ):
 		res   = [self.name]
-		attr  = dict( (k,v) for k,v in self.attributes.items())
-		if attr:
-			res.append(attr)
-		for _ in self._children:
+		if self._attributes:
+			res.append(dict( (k,v) for k,v in self._attributes.items()))
+		for _ in self.children:
 			res.append(_.toPrimitive())
 		return res
 
 	def __getitem__( self, index:Union[int,str] ):
 		if isinstance(index, str):
-			if index not in self.attributes:
+			if not self.hasAttribute(index):
 				raise IndexError(f"Node has no attribute '{index}': {self}")
 			else:
-				return self.attributes[index]
+				return self._attributes[index]
 		else:
-			return self._children[index]
+			return self.children[index]
 
 	def toPrimtive(self):
 		res = {"id":self.id}
 		if self.name: res["name"] = self.name
 		if self.parent: res["parent"] = self.parent.id
-		if self.attributes: res["attributes"]  = self.attributes
+		if self._attributes: res["attributes"]  = self._attributes
 		if self.metadata: res["metadata"]  = self.metadata
 		if self._children: res["children"] = [_._asdict() for _ in self._children]
 		return res
@@ -205,7 +460,255 @@ class Node:
 		return "".join(Repr.Apply(self))
 
 	def __repr__( self ):
-		return f"<Node:{self.name} {' '.join(str(k)+'='+repr(v) for k,v in self.attributes.items())}{' …' + str(len(self.children)) if self._children else ''}>"
+		attributes = self._attributes.items() if self._attributes else ()
+		return f"<Node:{self.name} {' '.join(str(k)+'='+repr(v) for k,v in attributes)}{' …' + str(len(self._children)) if self._children else ''}>"
+
+# -----------------------------------------------------------------------------
+#
+# TREE NUMBERING
+#
+# -----------------------------------------------------------------------------
+
+class TreeNumbering:
+	"""Assigns each node of a tree its pre-order and post-order ranks, its
+	depth and the size of its subtree, so that structural relations become
+	integer comparisons: `a` is an ancestor of `b` when `pre[a] < pre[b]`
+	and `post[b] < post[a]`, the pre-order rank being the node's position
+	in `nodes`.
+
+	The numbering is kept up to date by `Node.add`, `insert` and `remove`,
+	which invalidate it. It is then recomputed (in linear time) the next
+	time it is accessed, so that building a tree does not renumber it on
+	every mutation."""
+
+	@classmethod
+	def Attach( cls, parent:Node, node:Node ):
+		"""Called when `node` is attached to `parent`, either of them
+		being part of a numbered tree."""
+		numbering = node._numbering
+		if numbering and numbering.root is node:
+			# The node becomes part of another tree, so its own numbering
+			# is discarded.
+			numbering.release()
+		if parent._numbering:
+			parent._numbering.invalidate()
+			node._numbering = parent._numbering
+
+	@classmethod
+	def Detach( cls, parent:Node, node:Node ):
+		"""Called when `node` is removed from `parent`, which is part of a
+		numbered tree: the nodes of its subtree are not part of the
+		numbering anymore."""
+		numbering = parent._numbering
+		numbering.invalidate()
+		stack = [node]
+		while stack:
+			node = stack.pop()
+			if node._numbering is numbering:
+				node._numbering = None
+				# NOTE: The children of a pending copy were never numbered,
+				# and accessing them would copy them.
+				if not isinstance(node._cow, Node) and node._children:
+					stack.extend(node._children)
+
+	def __init__( self, root:Node ):
+		self.root:Optional[Node] = root
+		self.isValid = False
+		self.nodes:List[Node] = []
+		self.positions:Dict[int,int] = {}
+		self.parent = array("i")
+		self.post   = array("I")
+		self.depth  = array("I")
+		self.size   = array("I")
+		root._numbering = self
+
+	def invalidate( self ):
+		self.isValid = False
+
+	def update( self ) -> 'TreeNumbering':
+		"""Renumbers the tree if it was mutated since it was numbered."""
+		if self.isValid:
+			return self
+		assert self.root, "Numbering was released"
+		# The nodes that were removed from the tree are detached from
+		# the numbering.
+		for node in self.nodes:
+			if node._numbering is self:
+				node._numbering = None
+		self.nodes  = nodes = []
+		self.positions = positions = {}
+		self.parent = array("i")
+		self.depth  = array("I")
+		stack = [(self.root, -1, 0)]
+		while stack:
+			node, parent, depth = stack.pop()
+			positions[id(node)] = len(nodes)
+			nodes.append(node)
+			node._numbering = self
+			self.parent.append(parent)
+			self.depth.append(depth)
+			children = node._children
+			if children:
+				i = len(nodes) - 1
+				for j in range(len(children) - 1, -1, -1):
+					stack.append((children[j], i, depth + 1))
+		count = len(nodes)
+		self.size = size = array("I", [1]) * count
+		for i in range(count - 1, 0, -1):
+			size[self.parent[i]] += size[i]
+		self.post = array("I", (i + size[i] - 1 - self.depth[i] for i in range(count)))
+		self.isValid = True
+		return self
+
+	def release( self ):
+		"""Detaches the numbering from the tree, which won't be kept up
+		to date anymore."""
+		for node in self.nodes:
+			if node._numbering is self:
+				node._numbering = None
+		if self.root and self.root._numbering is self:
+			self.root._numbering = None
+		self.root    = None
+		self.nodes   = []
+		self.positions = {}
+		self.isValid = False
+
+	# =========================================================================
+	# ACCESSORS
+	# =========================================================================
+
+	def position( self, node:Node ) -> int:
+		"""Returns the pre-order rank of the given node, or `-1` if it is
+		not part of the tree."""
+		return self.update().positions.get(id(node), -1)
+
+	def preOf( self, node:Node ) -> int:
+		i = self.position(node)
+		assert i >= 0, f"Node is not part of the numbered tree: {node}"
+		return i
+
+	def postOf( self, node:Node ) -> int:
+		return self.post[self.preOf(node)]
+
+	def depthOf( self, node:Node ) -> int:
+		return self.depth[self.preOf(node)]
+
+	def sizeOf( self, node:Node ) -> int:
+		return self.size[self.preOf(node)]
+
+	# =========================================================================
+	# RELATIONS
+	# =========================================================================
+
+	def isAncestor( self, ancestor:Node, node:Node ) -> bool:
+		a, b = self.preOf(ancestor), self.preOf(node)
+		return a < b and self.post[b] < self.post[a]
+
+	def isDescendant( self, descendant:Node, node:Node ) -> bool:
+		return self.isAncestor(node, descendant)
+
+	def isFollowing( self, following:Node, node:Node ) -> bool:
+		"""Tells if `following` is after `node` in document order and is
+		not one of its descendants."""
+		a, b = self.preOf(following), self.preOf(node)
+		return a > b and self.post[a] > self.post[b]
+
+	def isPreceding( self, preceding:Node, node:Node ) -> bool:
+		return self.isFollowing(node, preceding)
+
+# -----------------------------------------------------------------------------
+#
+# TREE CURSOR
+#
+# -----------------------------------------------------------------------------
+
+class TreeCursor:
+	"""A mutable position within a tree, moved with `down`, `right` and
+	`up`, so that a whole traversal uses a single object and no recursion.
+	The cursor keeps the path of ancestors from the node it was started
+	on, along with the index of each node of the path within its parent,
+	and never moves above its start node.
+
+	```
+	cursor = TreeCursor(tree)
+	while cursor.next():
+		print(cursor.depth, cursor.node)
+	```
+	"""
+
+	__slots__ = ("node", "path", "indexes")
+
+	def __init__( self, node:Optional[Node]=None ):
+		self.node:Optional[Node] = None
+		# The ancestors of the current node, the start node being first
+		self.path:List[Node] = []
+		# The index of the current node and its ancestors (but the start
+		# node) in their parent's children
+		self.indexes:List[int] = []
+		if node:
+			self.reset(node)
+
+	def reset( self, node:Node ) -> 'TreeCursor':
+		"""Moves the cursor to the given node, which becomes the start
+		node."""
+		self.node = node
+		self.path.clear()
+		self.indexes.clear()
+		return self
+
+	@property
+	def depth( self ) -> int:
+		"""The depth of the current node relative to the start node."""
+		return len(self.path)
+
+	@property
+	def index( self ) -> int:
+		"""The index of the current node in its parent's children."""
+		return self.indexes[-1] if self.indexes else 0
+
+	def down( self ) -> bool:
+		"""Moves to the first child of the current node, if any."""
+		children = self.node._children
+		if not children:
+			return False
+		self.path.append(self.node)
+		self.indexes.append(0)
+		self.node = children[0]
+		return True
+
+	def right( self ) -> bool:
+		"""Moves to the next sibling of the current node, if any."""
+		if not self.path:
+			return False
+		siblings = self.path[-1]._children
+		i = self.indexes[-1] + 1
+		if i >= len(siblings):
+			return False
+		self.indexes[-1] = i
+		self.node = siblings[i]
+		return True
+
+	def up( self ) -> bool:
+		"""Moves to the parent of the current node, unless it is the
+		start node."""
+		if not self.path:
+			return False
+		self.node = self.path.pop()
+		self.indexes.pop()
+		return True
+
+	def next( self ) -> bool:
+		"""Moves to the next node in pre-order, returning `False` once the
+		subtree of the start node is exhausted."""
+		return self.down() or self.skip()
+
+	def skip( self ) -> bool:
+		"""Moves to the next node in pre-order that is not a descendant of
+		the current node."""
+		while not self.right():
+			if not self.up():
+				return False
+		return True
 
 # -----------------------------------------------------------------------------
 #
@@ -215,7 +718,7 @@ class Node:
 
 # TODO: Shouldn't we wrap/compose nodes instead?
 class NodeTemplate(Node):
-	pass
+	__slots__ = ()
 
 # -----------------------------------------------------------------------------
 #
@@ -237,7 +740,10 @@ class Repr:
 			yield "("
 			yield node.name
 			if node.hasAttributes:
-				for k,v in node.attributes.items():
+				# NOTE: Nodes are read through `_attributes`, so that shared
+				# maps are not copied (see `Node.attributes`).
+				attributes = node._attributes if isinstance(node, Node) else node.attributes
+				for k,v in attributes.items():
 					yield f" ({k}: "
 					# TODO: We should support node references
 					if isinstance(v, Node):
@@ -343,7 +849,7 @@ class TreeBuilder:
 	def MakeNode( cls, nodeName, *content, **kwargs ):
 		node = Node(nodeName)
 		for k,v in kwargs.items():
-			node.attr(k,v)
+			node.attr(Names.Intern(k),v)
 		if not content:
 			return node
 		head = content[0]
@@ -352,7 +858,7 @@ class TreeBuilder:
 			for k in head:
 				v = head[k]
 				# TODO: Validate schema
-				node.attr(k, v)
+				node.attr(Names.Intern(k), v)
 		for child in content:
 			if isinstance(child, Iterable):
 				for c in child:
@@ -1,6 +1,7 @@
 from libparsing import Grammar, Symbols, Processor, ensure_string
 from typing import Optional
-from tlang.tree.model import Node,NodeTemplate
+from tlang.tree.model import Node,NodeTemplate,Names
+from tlang.tree.events import TOKENS
 import sys, os
 
 GRAMMAR = None
@@ -9,17 +10,10 @@ def symbols( g:Grammar ) -> Symbols:
 	"""Registers tokens and words that are shared by all the grammars
 	defined in this moddule."""
 	s      = g.symbols
-	tokens = {
-		"WS"            : "[\s\n]+",
-		"NUMBER"        : "[0-9]+(\.[0-9]+)?",
-		"STRING_DQ"     : "\"[^\"]*\"",
-		"EMPTY_LINE"    : "s*\n",
-		"NODE_NAME"     : "[a-z][\-a-z0-9]*",
-		"NODE_COMMENT"  : ";;[^\n]*[\n]?",
-		"NODE_SYMBOL_Q" : "'([a-zA-Z][\-_A-Za-z0-9]*)",
-		"NODE_ATTRIBUTE_VALUE" : "[^\s\)\(\[\]\{\}]+",
-		"NODE_TEMPLATE" : "(…|\.\.\.)?([A-Z][_A-Z]*)",
-	}
+	# NOTE: The tokens are shared with the scanners of `tlang.tree.events`
+	# and `tlang.tree.reader`, so that the three parsers can't drift apart.
+	tokens = dict(TOKENS)
+	tokens["EMPTY_LINE"] = "s*\n"
 	words = {
 		"LP"       : "(",
 		"RP"       : ")",
@@ -126,17 +120,20 @@ class TreeProcessor(Processor):
 	def onNode( self, match, name, attributes, children ):
 		name = ensure_string(name[0])
 		node = Node(name)
-		node.children = children
 		if attributes:
 			for key, value in attributes:
-				node.attributes[key] = value
+				node.setAttribute(key, value)
+		for child in children or ():
+			node.add(child)
 		return node
 
 	def onNodeAttributes( self, match, attributes ):
 		return attributes or ()
 
 	def onNodeAttribute( self, match, key, value ):
-		key   = key[0]
+		# Attribute keys are interned, so that trees share a single
+		# copy of each key.
+		key   = Names.Intern(ensure_string(key[0]))
 		return (key, value)
 
 	def onNodeAttributeValue( self, match ):
@@ -0,0 +1,239 @@
+from typing import Optional,Any,List,Dict,Union,Iterator,Iterable,Sequence,Tuple,Callable,Mapping
+from types import MappingProxyType
+from tlang.tree.model import Node, Names, TreeTransform, NOTHING
+
+__doc__ = """
+A persistent (immutable) tree, where "modifying" a node returns a new
+version of the tree that shares all the untouched subtrees with the
+previous one. Changes are made by *path copying*: only the node and its
+ancestors are copied, so that keeping the previous versions of a tree
+(like the successive results of a transform) costs `O(depth)` per change
+instead of a full copy.
+
+Nodes are located by their *path*, the sequence of the child indexes
+from the root. Trees are transformed either with `PersistentNode.transform`
+or with a `PersistentTransform`, which is a `TreeTransform`.
+"""
+
+TPath = Sequence[int]
+
+EMPTY_ATTRIBUTES:Mapping[str,Any] = MappingProxyType({})
+
+# -----------------------------------------------------------------------------
+#
+# PERSISTENT NODE
+#
+# -----------------------------------------------------------------------------
+
+class PersistentNode:
+	"""An immutable node. The `attrs` map is shared between versions and
+	must never be mutated, `attributes` being a read-only view of it.
+	Like `Node`, nodes are only equal to themselves."""
+
+	__slots__ = ("nameId", "attrs", "children")
+
+	def __init__( self, nameId:int, attrs:Optional[Dict[str,Any]]=None, children:Tuple['PersistentNode',...]=() ):
+		setSlot = object.__setattr__
+		setSlot(self, "nameId", nameId)
+		setSlot(self, "attrs", attrs)
+		setSlot(self, "children", children)
+
+	def __setattr__( self, name:str, value:Any ):
+		raise AttributeError(f"'{self.__class__.__name__}' is immutable, cannot set '{name}'")
+
+	def __delattr__( self, name:str ):
+		raise AttributeError(f"'{self.__class__.__name__}' is immutable, cannot delete '{name}'")
+
+	@classmethod
+	def Make( cls, name:str, attributes:Optional[Mapping[str,Any]]=None, children:Iterable['PersistentNode']=() ) -> 'PersistentNode':
+		return cls(Names.Id(name), dict((Names.Intern(k), v) for k,v in attributes.items()) if attributes else None, tuple(children))
+
+	@classmethod
+	def FromNode( cls, node:Node ) -> 'PersistentNode':
+		"""Creates a persistent copy of the given tree."""
+		# The children are built before their parent, in a post-order walk
+		# where `built` is the stack of the nodes built so far.
+		built:List[PersistentNode] = []
+		stack:List[Tuple[Node,bool]] = [(node, False)]
+		while stack:
+			n, isBuilt = stack.pop()
+			if not isBuilt:
+				stack.append((n, True))
+				stack.extend((_, False) for _ in reversed(n.children))
+				continue
+			count = n.childrenCount
+			children = tuple(built[len(built) - count:]) if count else ()
+			if count:
+				del built[len(built) - count:]
+			built.append(cls(n.nameId, dict(n._attributes) if n._attributes else None, children))
+		return built[0]
+
+	# =========================================================================
+	# ACCESSORS
+	# =========================================================================
+
+	@property
+	def name( self ) -> str:
+		return Names.ALL[self.nameId]
+
+	@property
+	def attributes( self ) -> Mapping[str,Any]:
+		return MappingProxyType(self.attrs) if self.attrs else EMPTY_ATTRIBUTES
+
+	@property
+	def hasAttributes( self ) -> bool:
+		return bool(self.attrs)
+
+	@property
+	def isLeaf( self ) -> bool:
+		return not self.children
+
+	def hasAttribute( self, name:str ) -> bool:
+		return name in self.attrs if self.attrs else False
+
+	def attr( self, name:str, default:Any=None ) -> Any:
+		return self.attrs.get(name, default) if self.attrs else default
+
+	def get( self, path:TPath ) -> 'PersistentNode':
+		"""Returns the node at the given path."""
+		node = self
+		for i in path:
+			node = node.children[i]
+		return node
+
+	def walk( self ) -> Iterator['PersistentNode']:
+		"""Yields this node and its descendants in pre-order."""
+		stack = [self]
+		while stack:
+			node = stack.pop()
+			yield node
+			stack.extend(reversed(node.children))
+
+	# =========================================================================
+	# VERSIONS
+	# =========================================================================
+	# All the following return a new node, leaving this one untouched.
+
+	def setAttribute( self, name:str, value:Any=None ) -> 'PersistentNode':
+		attributes = dict(self.attrs) if self.attrs else {}
+		attributes[Names.Intern(name)] = value
+		return self._derive(attrs=attributes)
+
+	def removeAttribute( self, name:str ) -> 'PersistentNode':
+		if not self.hasAttribute(name):
+			return self
+		attributes = dict(self.attrs)
+		del attributes[name]
+		return self._derive(attrs=attributes or None)
+
+	def add( self, node:'PersistentNode' ) -> 'PersistentNode':
+		return self._derive(children=self.children + (node,))
+
+	def insert( self, index:int, node:'PersistentNode' ) -> 'PersistentNode':
+		children = self.children
+		return self._derive(children=children[:index] + (node,) + children[index:])
+
+	def remove( self, index:int ) -> 'PersistentNode':
+		children = self.children
+		return self._derive(children=children[:index] + children[index + 1:])
+
+	def replace( self, index:int, node:'PersistentNode' ) -> 'PersistentNode':
+		children = self.children
+		return self._derive(children=children[:index] + (node,) + children[index + 1:])
+
+	def _derive( self, attrs:Any=NOTHING, children:Any=NOTHING ) -> 'PersistentNode':
+		return self.__class__(self.nameId, self.attrs if attrs is NOTHING else attrs, self.children if children is NOTHING else children)
+
+	def update( self, path:TPath, functor:Callable[['PersistentNode'],'PersistentNode'] ) -> 'PersistentNode':
+		"""Returns a new version of this tree where the node at the given
+		path is replaced by the result of `functor(node)`. Only the node's
+		ancestors are copied, all the other subtrees being shared."""
+		ancestors:List[PersistentNode] = []
+		node = self
+		for i in path:
+			ancestors.append(node)
+			node = node.children[i]
+		node = functor(node)
+		for i in range(len(path) - 1, -1, -1):
+			node = ancestors[i].replace(path[i], node)
+		return node
+
+	def set( self, path:TPath, node:'PersistentNode' ) -> 'PersistentNode':
+		"""Returns a new version of this tree with the given node at the
+		given path."""
+		return self.update(path, lambda _:node)
+
+	def transform( self, functor:Callable[['PersistentNode'],'PersistentNode'] ) -> 'PersistentNode':
+		"""Returns a new version of this tree where each node is replaced
+		by `functor(node)`, children being transformed before their parent.
+		The subtrees that the functor leaves untouched (by returning the
+		node it was given) are shared with this version."""
+		built:List[PersistentNode] = []
+		stack:List[Tuple[PersistentNode,bool]] = [(self, False)]
+		while stack:
+			node, isBuilt = stack.pop()
+			if not isBuilt:
+				stack.append((node, True))
+				stack.extend((_, False) for _ in reversed(node.children))
+				continue
+			count = len(node.children)
+			if count:
+				children = tuple(built[len(built) - count:])
+				del built[len(built) - count:]
+				if any(a is not b for a,b in zip(children, node.children)):
+					node = node._derive(children=children)
+			built.append(functor(node))
+		return built[0]
+
+	# =========================================================================
+	# CONVERSION
+	# =========================================================================
+
+	def toNode( self ) -> Node:
+		"""Returns a mutable copy of this tree."""
+		root = Node(self.name)
+		stack:List[Tuple[PersistentNode,Node]] = [(self, root)]
+		while stack:
+			p, n = stack.pop()
+			if p.attrs:
+				for k,v in p.attrs.items():
+					n.setAttribute(k, v)
+			for c in p.children:
+				stack.append((c, n.add(Node(c.name))))
+		return root
+
+	def toPrimitive( self ):
+		return self.toNode().toPrimitive()
+
+	def __str__( self ):
+		return str(self.toNode())
+
+	def __reduce__( self ):
+		# Name ids are specific to a process, so nodes are pickled by name
+		return (self.__class__.Make, (self.name, self.attrs, self.children))
+
+	def __repr__( self ):
+		return f"<PersistentNode {self.name} {len(self.children)} children>"
+
+# -----------------------------------------------------------------------------
+#
+# PERSISTENT TRANSFORM
+#
+# -----------------------------------------------------------------------------
+
+class PersistentTransform(TreeTransform):
+	"""A `TreeTransform` of persistent trees. The handlers (`on_<name>`)
+	return the new version of the node they are given, or `None` to
+	remove it, processing its children as they see fit. The other nodes
+	are kept, with their children processed: the subtrees that are left
+	untouched are shared with the transformed tree."""
+
+	def catchall( self, node:PersistentNode ) -> Iterable[PersistentNode]:
+		children = node.children
+		if children:
+			processed = tuple(_ for _ in (self.process(_) for _ in children) if _ is not None)
+			if len(processed) != len(children) or any(a is not b for a,b in zip(processed, children)):
+				node = node._derive(children=processed)
+		yield node
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,193 @@
+from typing import List,Iterator,Union,BinaryIO,TextIO
+from collections import OrderedDict
+from tlang.tree.model import Node,NodeTemplate,Names
+from tlang.tree.events import TreeScanner, TreeSyntaxError, RE_CHILD, K_CLOSE, K_SYMBOL, K_NUMBER, K_STRING, K_NODE, K_ATTRIBUTES, K_TEMPLATE, K_LEAF, K_COMMENT, parseNumber
+import re, codecs, mmap
+
+__doc__ = """
+A hand-written parser for the tree notation, which builds the nodes
+directly in a single pass over the source instead of going through the
+generic grammar and processor of `tlang.tree.parser`. Both parsers
+produce the same trees, and this one does not depend on `libparsing`. The
+reader shares its tokenizer (`TreeScanner`) with the event parser of
+`tlang.tree.events`, whose tokens are also those of the grammar.
+
+Forests can also be read from a file (or memory map) in chunks with
+`readTrees`, so that files larger than the memory can be processed one
+top-level tree at a time.
+"""
+
+# What the rest of the text can be when an error is due to the text being
+# cut by the end of a chunk: the start of a string, comment, symbol,
+# template, node or attribute.
+RE_TRUNCATED = re.compile(r"""[\s\n]*(?:
+	;|'|…|\.\.?
+	|\(?[\s\n]*(?:[a-z][\-a-z0-9]*[\s\n]*)?(?:"[^"]*"?|[^\s\)\(\[\]\{\}]+)?[\s\n]*
+)?""", re.X)
+
+VALUE  = Names.Intern("value")
+EXPAND = Names.Intern("expand")
+
+# The default size of the chunks read by `readTrees`
+CHUNK_SIZE = 1024 * 1024
+
+# -----------------------------------------------------------------------------
+#
+# READER
+#
+# -----------------------------------------------------------------------------
+
+class TreeReader(TreeScanner):
+	"""Parses tree notation source, yielding each top-level tree once it
+	is closed. The reader is iterative, so that deeply nested trees don't
+	hit the recursion limit.
+
+	When `isFinal` is false, the text is only the beginning of the source
+	(see `readTrees`): the reader then stops before the first tree that is
+	not complete (or could be continued, like a leaf at the end of the
+	text) instead of failing, `offset` being where it starts."""
+
+	def __init__( self, text:str="", isFinal:bool=True ):
+		super().__init__(text)
+		self.isFinal = isFinal
+
+	def read( self ) -> Iterator[Node]:
+		"""Yields the trees of the whole text, which is a forest."""
+		try:
+			yield from self.readTrees()
+		except TreeSyntaxError as e:
+			# The error may be due to the text being cut, in which case
+			# we'll try again with more text. Otherwise, we fail now, as
+			# reading on would only buffer the rest of the source.
+			if self.isFinal or not self.isTruncated(e.offset - self.base):
+				raise
+
+	def isTruncated( self, offset:int ) -> bool:
+		"""Tells if an error at the given offset can be due to the text
+		being cut by the end of the chunk."""
+		return RE_TRUNCATED.fullmatch(self.text, offset) is not None
+
+	def readTrees( self ) -> Iterator[Node]:
+		text    = self.text
+		end     = len(text)
+		match   = RE_CHILD.match
+		offset  = self.offset
+		isFinal = self.isFinal
+		# The open nodes, the last one being the current node
+		stack:List[Node] = []
+		while True:
+			m      = match(text, offset)
+			kind   = m.lastindex
+			offset = m.end()
+			if kind is None:
+				if offset < end:
+					self.error("Unexpected character", offset)
+				elif stack and isFinal:
+					self.error(f"Unexpected end of input, unclosed node '{stack[-1].name}'", offset)
+				elif not stack:
+					self.offset = offset
+				return
+			elif kind == K_CLOSE:
+				if not stack:
+					self.error("Unexpected ')'", offset - 1)
+				node = stack.pop()
+				if not stack:
+					self.offset = offset
+					yield node
+				continue
+			elif kind == K_COMMENT:
+				if stack:
+					self.error("Unexpected comment in node", m.start(K_COMMENT))
+				elif offset == end and not isFinal:
+					return
+				self.offset = offset
+				continue
+			elif kind == K_NODE or kind == K_ATTRIBUTES:
+				node = Node(m.group(K_NODE))
+				if kind == K_ATTRIBUTES:
+					node._attributes, offset = self.attributes(offset)
+			elif kind == K_LEAF:
+				node = Node(m.group(K_LEAF))
+			elif kind == K_SYMBOL:
+				node = Node("symbol")
+				node._attributes = OrderedDict(((VALUE, m.group(K_SYMBOL + 1)),))
+			elif kind == K_NUMBER:
+				node = Node("number")
+				node._attributes = OrderedDict(((VALUE, parseNumber(m.group(K_NUMBER))),))
+			elif kind == K_STRING:
+				# NOTE: Like the grammar processor, the quotes are kept
+				node = Node("string")
+				node._attributes = OrderedDict(((VALUE, m.group(K_STRING)),))
+			else:
+				node = NodeTemplate("template")
+				node._attributes = OrderedDict(((VALUE, m.group(K_TEMPLATE + 2)),))
+				# The groups of the template token follow its own
+				if m.group(K_TEMPLATE + 1):
+					node._attributes[EXPAND] = True
+			# The new node is added to the current one, nodes being fresh
+			# we can skip the checks done by `Node.add`.
+			if stack:
+				parent   = stack[-1]
+				children = parent._children
+				node.parent = parent
+				if children is None:
+					parent._children = [node]
+				else:
+					children.append(node)
+			if kind == K_NODE or kind == K_ATTRIBUTES:
+				stack.append(node)
+			elif not stack:
+				# A number may go on after a dot, hence the extra character
+				if offset >= end - 1 and not isFinal:
+					return
+				self.offset = offset
+				yield node
+
+# -----------------------------------------------------------------------------
+#
+# API
+#
+# -----------------------------------------------------------------------------
+
+def parseString( text:str ) -> List[Node]:
+	"""Parses the given tree notation source, returning the forest."""
+	return list(TreeReader(text).read())
+
+def parseFile( path:str ) -> List[Node]:
+	return list(readFile(path))
+
+def readTrees( source:Union[BinaryIO,TextIO,mmap.mmap], chunkSize:int=CHUNK_SIZE ) -> Iterator[Node]:
+	"""Yields the trees of the forest read from the given file object (in
+	text or binary mode, binary sources being UTF-8) or memory map. The
+	source is read in chunks of `chunkSize`, and only the text of the
+	trees that are not complete yet is kept in memory. Syntax errors are
+	reported as soon as they can't be due to the chunk being cut."""
+	reader  = TreeReader(isFinal=False)
+	decoder = None
+	size    = chunkSize
+	while not reader.isFinal:
+		chunk   = source.read(size)
+		isFinal = not chunk
+		if isinstance(chunk, bytes):
+			decoder = decoder or codecs.getincrementaldecoder("utf8")()
+			chunk   = decoder.decode(chunk, final=isFinal)
+		# The text that was not read yet is kept with the new chunk
+		reader.base   += reader.offset
+		reader.lines  += reader.text.count("\n", 0, reader.offset)
+		reader.text    = reader.text[reader.offset:] + chunk
+		reader.offset  = 0
+		reader.isFinal = isFinal
+		count = 0
+		for tree in reader.read():
+			count += 1
+			yield tree
+		# When the chunk did not complete a tree, the next one is bigger,
+		# so that a large tree is not reparsed too many times.
+		size = chunkSize if count else size * 2
+
+def readFile( path:str, chunkSize:int=CHUNK_SIZE ) -> Iterator[Node]:
+	"""Yields the trees of the forest in the given file, see `readTrees`."""
+	with open(path, "rb") as f:
+		yield from readTrees(f, chunkSize)
+
+# EOF - vim: ts=4 sw=4 noet
@@ -1,8 +1,7 @@
 import os, sys
 BASE = os.path.normpath(os.path.abspath(__file__) + "/../../../../")
-NOTHING = object()
 from libparsing import Processor
-from tlang.tree.model import Node
+from tlang.tree.model import Node, NOTHING
 
 try:
 	from texto.main import run as texto
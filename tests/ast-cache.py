@@ -0,0 +1,68 @@
+from tlang.parser import parseString
+from tlang.cache import ASTCache
+from tlang.tree.model import Node, NodeTemplate
+import tempfile, os
+
+__doc__ = """
+Exercises the tlang.cache module.
+"""
+
+SOURCE = """(out! "Hello, world!")
+(let (A 1) (add A 2))
+"""
+
+def test_roundtrip():
+	ast = parseString(SOURCE)
+	loaded = ASTCache.Load(ASTCache.Dump(ast))
+	assert str(ast) == str(loaded)
+	# Source positions must survive, as they're used to report errors
+	for original, cached in zip(ast.walk(), loaded.walk()):
+		for key in ("line", "offset", "length"):
+			assert original.meta(key) == cached.meta(key)
+
+def test_cache():
+	cache  = ASTCache(tempfile.mkdtemp())
+	source = SOURCE.encode("utf8")
+	assert cache.get(source) is None
+	cache.set(source, parseString(SOURCE))
+	assert str(cache.get(source)) == str(parseString(SOURCE))
+	assert cache.get(source + b" ") is None
+
+def test_classes():
+	tree = Node("ex:seq")
+	tree.add(NodeTemplate("template")).attr("value", "NAME")
+	tree.add(Node("ex:number")).attr("value", 1.5)
+	loaded = ASTCache.Load(ASTCache.Dump(tree))
+	assert [_.__class__ for _ in loaded.walk()] == [Node, NodeTemplate, Node]
+	assert loaded.toPrimitive() == tree.toPrimitive()
+
+def test_integrity():
+	cache  = ASTCache(tempfile.mkdtemp())
+	source = SOURCE.encode("utf8")
+	cache.set(source, Node("ex:seq"))
+	path   = cache.entryPath(cache.key(source))
+	with open(path, "rb") as f:
+		data = f.read()
+	# Entries are not pickles, and altered entries are cache misses
+	assert data.startswith(b"TLAST ")
+	for altered in (data.replace(b"ex:seq", b"ex:ser"), data[:-1], b"\x80\x04" + data):
+		with open(path, "wb") as f:
+			f.write(altered)
+		assert cache.get(source) is None
+
+def test_version():
+	# The entries depend on the tree and query models, as well as on the
+	# grammar.
+	import tlang.cache
+	assert {"tlang/tree/model.py", "tlang/query/model.py"} <= set(tlang.cache.GRAMMAR_MODULES)
+	tlang.cache.GRAMMAR_VERSION = None
+	assert tlang.cache.grammarVersion()
+
+if __name__ == "__main__":
+	test_roundtrip()
+	test_cache()
+	test_classes()
+	test_integrity()
+	test_version()
+
+# EOF - vim: ts=4 sw=4 noet
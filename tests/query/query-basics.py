@@ -2,8 +2,10 @@
 
 from tlang.query.parser import parseString as parseQuery
 from tlang.query.model import processQuery
-from tlang.compiler.query import QueryInterpreter
+from tlang.compiler.query import QueryInterpreter, IndexedQueryInterpreter, runQuery, compileQuery, normalizeQuery
 from tlang.tree import node
+from tlang.tree.columnar import ColumnarTree
+from tlang.tree.index import TreeIndex
 
 query = lambda _:processQuery(parseQuery(_))
 
@@ -29,4 +31,40 @@ def test_engine():
 	}.items():
 		assert (qs, expected) == (qs, [_[1] for _ in QueryInterpreter().register(query(qs)).run(tree)])
 
+def test_engine_columnar():
+	columnar = ColumnarTree.FromNode(tree)
+	for qs in ("/file", "//file", "//dir", "//dir/file"):
+		expected = [_[1].toPrimitive() for _ in QueryInterpreter().register(query(qs)).run(tree)]
+		assert (qs, expected) == (qs, [_[1].toPrimitive() for _ in QueryInterpreter().register(query(qs)).run(columnar)])
+
+def test_engine_indexed():
+	index = TreeIndex(tree)
+	for qs in ("/file", "//file", "//dir", "//dir/file", "/dir/dir"):
+		expected = [_[1] for _ in QueryInterpreter().register(query(qs)).run(tree)]
+		assert (qs, expected) == (qs, [_[1] for _ in IndexedQueryInterpreter().register(query(qs)).run(index)])
+
+def test_engine_join():
+	index = TreeIndex(tree)
+	for qs in ("/file", "//file", "//dir", "//dir/file", "/dir/dir", "//dir//file"):
+		expected = [_[1] for _ in runQuery(query(qs), tree, "walk")]
+		assert (qs, expected) == (qs, [_[1] for _ in runQuery(query(qs), index, "join")])
+
+def test_engine_codegen():
+	for qs in ("/file", "//file", "//dir", "//dir/file", "/dir/dir", "//dir//file", "/dir/dir/file", "//dir/dir//file"):
+		expected = [_[1] for _ in runQuery(query(qs), tree, "walk")]
+		assert (qs, expected) == (qs, [_[1] for _ in runQuery(query(qs), tree, "codegen")])
+
+def test_compile():
+	plan = compileQuery("//dir/file")
+	assert compileQuery("  //dir/file\n") is plan
+	assert str(plan) == "//dir/file"
+	# Plans are reusable across trees and interpreters
+	interpreter = QueryInterpreter().register(plan)
+	for _ in range(2):
+		assert [_[1] for _ in interpreter.run(tree)] == [file0, file1, file2]
+	assert [_[1] for _ in plan.run(tree, "join")] == [file0, file1, file2]
+	# Whitespace is only normalized outside of string literals
+	assert normalizeQuery(' //file [ "a  b" ]\n') == '//file [ "a  b" ]'
+	assert normalizeQuery('//file["a  b"]') != normalizeQuery('//file["a b"]')
+
 # EOF
@@ -0,0 +1,71 @@
+#!/usr/bin/env pytest
+
+from tlang.query.model import Select, With, processQuery
+from tlang.compiler.query import PathAutomaton, runQuery
+from tlang.tree.model import Node
+from tlang.tree import node
+import re
+
+__doc__ = """
+Exercises the query engines with selections of three steps and more, in
+the shape given by the query parser: the steps of `a/b//c` are the `then`
+list of `a`, not nested selections. The query ASTs are built like the
+parser builds them, so that `libparsing` is not needed.
+"""
+
+tree = node("dir", {"name":"tlang"},
+	node("dir", {"name":"src"},
+		node("dir", {"name":"py"},
+			node("file", {"name":"model.py"}),
+			node("dir", {"name":"tree"},
+				node("file", {"name":"reader.py"}))),
+		node("file", {"name":"README"})),
+	node("file", {"name":"setup.py"}))
+root, src, py, model, tree_dir, reader, readme, setup = tree.walk()
+
+# The engines that are expected to give the same results as `index`
+ENGINES = ("walk", "join", "codegen", "stream", "automaton")
+
+def parsed( text:str ) -> Node:
+	"""Returns the AST of a query made of `/name` and `//name` steps, as
+	the query parser gives it."""
+	query = Node("q:query")
+	for axis, name in re.findall(r"(//?)([a-z]+)", text):
+		selection = query.add(Node("q:selection"))
+		selection.add(Node("q:axis")).attr("axis", axis)
+		selection.add(Node("q:node")).attr("name", name)
+	return query
+
+QUERIES = {
+	"/dir/dir/dir"      : [py],
+	"/dir/dir//file"    : [model, reader, readme],
+	"//dir/dir/file"    : [model, reader, readme],
+	"//dir//dir//file"  : [model, reader, readme],
+	"/dir/dir/dir/file" : [model],
+	"//dir/dir/dir/dir/file" : [reader],
+}
+
+def test_parsed_shape():
+	selection = processQuery(parsed("/dir/dir//file"))
+	assert len(selection._then) == 2 and str(selection) == "/dir/dir//file"
+	assert [str(_) for _ in selection.steps()] == ["/dir/dir//file", "/dir", "//file"]
+	# Nested selections are the same chain
+	nested = Select.Children(With.Name("dir")).then(Select.Children(With.Name("dir")).then(Select.Descendants(With.Name("file"))))
+	assert [_.predicate.name for _ in nested.steps()] == ["dir", "dir", "file"]
+	# Parsed paths are matched by the automaton
+	assert PathAutomaton.IsPath(selection) and PathAutomaton.IsPath(nested)
+
+def test_engines():
+	for text, expected in QUERIES.items():
+		assert (text, [_[1] for _ in runQuery(processQuery(parsed(text)), tree, "index")]) == (text, expected)
+		# NOTE: The streaming engine yields new nodes, so we compare values
+		expected = [_.toPrimitive() for _ in expected]
+		for engine in ENGINES:
+			actual = [_[1].toPrimitive() for _ in runQuery(processQuery(parsed(text)), tree, engine)]
+			assert (text, engine, actual) == (text, engine, expected)
+
+if __name__ == "__main__":
+	test_parsed_shape()
+	test_engines()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,125 @@
+#!/usr/bin/env pytest
+
+from tlang.query.model import Select, Selection, With, Axis
+from tlang.compiler.query import ENGINES, runQuery
+from tlang.compiler.parallel import PARALLEL_ENGINES, runQueryParallel, runQueryPartitioned, partitionTree, isPartitionable
+from tlang.tree import node
+from tlang.tree.binary import writeFile
+import os, sys, pickle, subprocess
+
+__doc__ = """
+Exercises the parallel execution of queries over a forest.
+"""
+
+def makeTree( i:int ):
+	return node("dir", {"name":f"dir-{i}"},
+		node("dir", {"name":"research"},
+			*(node("file", {"name":f"file-{j}"}) for j in range(i % 4)),
+			node("file", {"name":"interpreter.py"}, node("meta"))),
+		node("file", {"name":"README"}))
+
+QUERIES = (
+	lambda:Select.Descendants(With.Name("file")),
+	lambda:Select.Descendants(With.Name("dir")).then(Select.Children(With.Name("file"))),
+	lambda:Select.Descendants(With.Name("meta")).where(Select.Ancestors(With.Name("dir"))),
+	lambda:Select.Descendants(With.Name("file")).where(Selection(Axis.PARENT, With.Name("dir")).where(Select.Self(With.Attribute("name")))),
+	lambda:Select.Children(With.Name("dir")).then(Select.Children(With.Name("dir"))),
+)
+
+def test_pickle():
+	query = QUERIES[1]().captures("_")
+	assert str(pickle.loads(pickle.dumps(query))) == str(query)
+
+def test_parallel():
+	trees = [makeTree(i) for i in range(50)]
+	for query in QUERIES:
+		expected = [_ for t in trees for _ in runQuery(query().captures("_"), t)]
+		assert expected == list(runQueryParallel(query().captures("_"), trees, workers=2, chunkSize=7))
+
+def test_parallel_files( tmp_path ):
+	trees = [makeTree(i) for i in range(10)]
+	paths = []
+	for i, tree in enumerate(trees):
+		paths.append(os.path.join(str(tmp_path), f"tree-{i}.tltree"))
+		writeFile(tree, paths[-1])
+	for query in QUERIES:
+		expected = [_[1].toPrimitive() for t in trees for _ in runQuery(query().captures("_"), t)]
+		assert expected == [_[1].toPrimitive() for _ in runQueryParallel(query().captures("_"), paths, workers=2)]
+
+def test_parallel_engines( tmp_path ):
+	# The engines give the same captures as in the current process, but the
+	# streaming one, which captures new nodes.
+	trees = [makeTree(i) for i in range(10)]
+	paths = []
+	for i, tree in enumerate(trees):
+		paths.append(os.path.join(str(tmp_path), f"tree-{i}.tltree"))
+		writeFile(tree, paths[-1])
+	for engine in ENGINES:
+		for query in QUERIES:
+			if engine not in PARALLEL_ENGINES:
+				for source in (trees, paths):
+					try:
+						runQueryParallel(query().captures("_"), source, workers=2, engine=engine)
+						assert False, f"Expected engine '{engine}' to be rejected"
+					except ValueError as e:
+						pass
+				continue
+			expected = [_ for t in trees for _ in runQuery(query().captures("_"), t)]
+			assert (engine, expected) == (engine, list(runQueryParallel(query().captures("_"), trees, workers=2, engine=engine)))
+			expected = [_[1].toPrimitive() for _ in expected]
+			assert (engine, expected) == (engine, [_[1].toPrimitive() for _ in runQueryParallel(query().captures("_"), paths, workers=2, engine=engine)])
+
+def test_partition():
+	tree = node("root", *(makeTree(i) for i in range(8)))
+	top, partitions = partitionTree(tree, 2)
+	assert [tree.number().nodes[_] for _ in top] == [tree] + list(tree.children)
+	assert [_.node for _ in partitions] == [c for t in tree.children for c in t.children]
+	assert all(_.path == [tree, _.node.parent] for _ in partitions)
+
+def test_partitioned():
+	tree = node("dir", *(makeTree(i) for i in range(8)))
+	for query in QUERIES:
+		expected = [_ for _ in runQuery(query().captures("_"), tree)]
+		for depth in (1, 2, 3, 10):
+			assert expected == list(runQueryPartitioned(query().captures("_"), tree, depth, workers=2, chunkSize=3))
+	# The children of the ancestors are not part of the partitions
+	query = lambda:Select.Descendants(With.Name("meta")).where(Select.Ancestors(With.Name("dir")).where(Select.Children(With.Name("file"))))
+	assert not isPartitionable(query())
+	expected = [_ for _ in runQuery(query().captures("_"), tree, "index")]
+	assert expected == list(runQueryPartitioned(query().captures("_"), tree, 2, workers=2, engine="index"))
+
+def test_partitioned_engines():
+	tree = node("dir", *(makeTree(i) for i in range(8)))
+	for engine in ENGINES:
+		for query in QUERIES:
+			if engine not in PARALLEL_ENGINES:
+				try:
+					runQueryPartitioned(query().captures("_"), tree, 2, workers=2, engine=engine)
+					assert False, f"Expected engine '{engine}' to be rejected"
+				except ValueError as e:
+					pass
+				continue
+			expected = [_ for _ in runQuery(query().captures("_"), tree)]
+			assert (engine, expected) == (engine, list(runQueryPartitioned(query().captures("_"), tree, 2, workers=2, engine=engine)))
+
+def test_imports():
+	# The query model and engines (which the workers import) don't need
+	# `libparsing`, which we hide to make sure.
+	modules = ("tlang.tree.columnar", "tlang.tree.index", "tlang.tree.binary", "tlang.query", "tlang.query.model", "tlang.compiler.query", "tlang.compiler.parallel")
+	script  = f"import sys ; sys.modules['libparsing'] = None\nimport {', '.join(modules)}"
+	subprocess.run([sys.executable, "-c", script], env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)), check=True)
+
+if __name__ == "__main__":
+	import tempfile
+	test_pickle()
+	test_parallel()
+	with tempfile.TemporaryDirectory() as path:
+		test_parallel_files(path)
+	with tempfile.TemporaryDirectory() as path:
+		test_parallel_engines(path)
+	test_partition()
+	test_partitioned()
+	test_partitioned_engines()
+	test_imports()
+
+# EOF
@@ -0,0 +1,62 @@
+#!/usr/bin/env pytest
+
+from tlang.query.model import Select, Selection, With, Axis
+from tlang.compiler.query import QueryInterpreter, QuerySet, PathAutomaton, runQuery
+from tlang.tree import node
+
+__doc__ = """
+Exercises query sets, which run many queries in a single pass over the
+tree.
+"""
+
+tree = node("dir", {"name":"tlang"},
+	node("dir", {"name":"research"},
+		node("file", {"name":"compiler-query.py"}),
+		node("file", {"name":"interpreter.py"}, node("meta"))),
+	node("file", {"name":"README"}))
+
+QUERIES = {
+	"files"    : lambda:Select.Descendants(With.Name("file")),
+	"dirs"     : lambda:Select.Descendants(With.Name("dir")),
+	"dir/file" : lambda:Select.Children(With.Name("dir")).then(Select.Children(With.Name("file"))),
+	"meta"     : lambda:Select.Descendants(With.Name("dir")).then(Select.Descendants(With.Name("meta"))),
+	"named"    : lambda:Select.Descendants(With.Name("file")).where(Select.Self(With.Attribute("name"))),
+	"top"      : lambda:Select.Descendants(With.Name("dir")).where(Select.Self(With.Attribute("name"))).where(Selection(Axis.PARENT, With.Name("dir"))),
+}
+
+def test_query_set():
+	queries = QuerySet().registerMany({k:v().captures("_") for k,v in QUERIES.items()})
+	matches = list(queries.run(tree))
+	for k,v in QUERIES.items():
+		expected = [_[1] for _ in QueryInterpreter().register(v().captures("_")).run(tree)]
+		assert (k, expected) == (k, [_[2] for _ in matches if _[0] == k])
+	# The terminals are shared, `dir` and `@name` being tested only once,
+	# while the simple paths are matched by the automaton.
+	assert len(queries.terminals) == 3
+	assert queries.automaton.count == 4
+
+def test_query_set_ids():
+	queries = QuerySet()
+	queries.register(Select.Descendants(With.Name("meta")).captures("m"))
+	queries.register(Select.Descendants(With.Name("meta")).captures("n"))
+	assert [(_[0], _[1]) for _ in queries.run(tree)] == [(0, "m"), (1, "n")]
+
+def test_automaton():
+	assert PathAutomaton.IsPath(QUERIES["dir/file"]())
+	assert PathAutomaton.IsPath(QUERIES["meta"]())
+	assert not PathAutomaton.IsPath(QUERIES["named"]())
+	automaton = PathAutomaton()
+	for k in ("files", "dirs", "dir/file", "meta"):
+		automaton.add(QUERIES[k]().captures("_"), k)
+	matches = list(automaton.run(tree))
+	for k in ("files", "dirs", "dir/file", "meta"):
+		expected = [_[1] for _ in QueryInterpreter().register(QUERIES[k]().captures("_")).run(tree)]
+		assert (k, expected) == (k, [_[2] for _ in matches if _[0] == k])
+		assert (k, expected) == (k, [_[1] for _ in runQuery(QUERIES[k]().captures("_"), tree, "automaton")])
+
+if __name__ == "__main__":
+	test_query_set()
+	test_query_set_ids()
+	test_automaton()
+
+# EOF
@@ -0,0 +1,66 @@
+#!/usr/bin/env pytest
+
+from tlang.query.model import Select, With
+from tlang.compiler.query import QueryInterpreter, StreamingQueryInterpreter
+from tlang.tree import node
+import tracemalloc
+
+__doc__ = """
+Exercises the streaming query interpreter, which runs on the events of
+`tlang.tree.events` instead of on trees.
+"""
+
+tree = node("dir", {"name":"tlang"},
+	node("dir", {"name":"research"},
+		node("file", {"name":"compiler-query.py"}),
+		node("file", {"name":"interpreter.py"}, node("meta"))),
+	node("file", {"name":"README"}))
+
+SOURCE = """
+(dir (@ (name tlang))
+	(dir (@ (name research))
+		(file (@ (name compiler-query.py)))
+		(file (@ (name interpreter.py)) (meta)))
+	(file (@ (name README))))
+"""
+
+QUERIES = (
+	lambda:Select.Descendants(With.Name("file")),
+	lambda:Select.Descendants(With.Name("dir")),
+	lambda:Select.Children(With.Name("dir")).then(Select.Children(With.Name("file"))),
+	lambda:Select.Descendants(With.Name("dir")).then(Select.Descendants(With.Name("meta"))),
+	# Like the query parser gives `/dir/dir/file`
+	lambda:Select.Children(With.Name("dir")).then(Select.Children(With.Name("dir"))).then(Select.Children(With.Name("file"))),
+	lambda:Select.Descendants(With.Name("file")).where(Select.Ancestors(With.Name("dir")).where(Select.Self(With.Attribute("name")))),
+)
+
+def test_streaming():
+	for query in QUERIES:
+		expected = [_[1].toPrimitive() for _ in QueryInterpreter().register(query().captures("_")).run(tree)]
+		assert expected == [_[1].toPrimitive() for _ in StreamingQueryInterpreter().register(query().captures("_")).run(tree)]
+		assert expected == [_[1].toPrimitive() for _ in StreamingQueryInterpreter().register(query().captures("_")).run(SOURCE)]
+
+def test_bounded_memory():
+	# A large forest where only the last tree matches, the memory used
+	# should not depend on the number of trees.
+	def source( count ):
+		for i in range(count):
+			yield "(dir (file) (file (@ (size 1))))\n"
+		yield "(dir (invoice (item)))"
+	def peak( count ):
+		text = "".join(source(count))
+		tracemalloc.start()
+		matches = list(StreamingQueryInterpreter().register(Select.Descendants(With.Name("invoice")).captures("_")).run(text))
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+		assert [_[1].toPrimitive() for _ in matches] == [["invoice", ["item"]]]
+		return peak
+	# The first run compiles the query
+	small = peak(1_000) and peak(1_000)
+	assert peak(10_000) < small * 2
+
+if __name__ == "__main__":
+	test_streaming()
+	test_bounded_memory()
+
+# EOF
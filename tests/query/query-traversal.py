@@ -0,0 +1,36 @@
+#!/usr/bin/env pytest
+
+from tlang.compiler.query import Traversal
+from tlang.tree import node
+
+__doc__ = """
+Exercises the depth-first and level-order traversals used by the query
+interpreters.
+"""
+
+tree = node("a",
+	node("b", node("d"), node("e", node("g"))),
+	node("c", node("f")))
+
+def test_depth():
+	assert [(_.node.name, _.depth, _.breadth, _.index) for _ in Traversal.DownDepth(tree)] == [
+		("a", 0, 0, 0), ("b", 1, 0, 1), ("d", 2, 0, 2), ("e", 2, 1, 3),
+		("g", 3, 0, 4), ("c", 1, 1, 5), ("f", 2, 0, 6),
+	]
+
+def test_breadth():
+	assert [(_.node.name, _.depth, _.breadth, _.index) for _ in Traversal.DownBreadth(tree)] == [
+		("a", 0, 0, 0), ("b", 1, 0, 1), ("c", 1, 1, 2), ("d", 2, 0, 3),
+		("e", 2, 1, 4), ("f", 2, 0, 5), ("g", 3, 0, 6),
+	]
+	assert [_.node.name for _ in Traversal.DownBreadth(tree, maxDepth=0)] == ["a"]
+	assert [_.node.name for _ in Traversal.DownBreadth(tree, maxDepth=1)] == ["a", "b", "c"]
+	# Pruned nodes are skipped along with their descendants
+	assert [_.node.name for _ in Traversal.DownBreadth(tree, functor=lambda _:_.name != "b")] == ["a", "c", "f"]
+	assert [_.node.name for _ in Traversal.DownBreadth(tree, functor=lambda _:_.name != "a")] == []
+
+if __name__ == "__main__":
+	test_depth()
+	test_breadth()
+
+# EOF
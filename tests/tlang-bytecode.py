@@ -0,0 +1,171 @@
+from tlang.tree.model import Node
+from tlang.interpreter.core import ValueInterpreter
+from tlang.interpreter.primitives import Primitives
+from tlang.interpreter.vm import BytecodeInterpreter
+from tlang.compiler.bytecode import Compiler
+from contextlib import redirect_stdout
+import io, re
+
+__doc__ = """
+Exercises the bytecode compiler and interpreter, making sure that they
+evaluate programs like the tree-walking `ValueInterpreter`. The programs
+are built as ASTs, so that the parser is not needed.
+"""
+
+# -----------------------------------------------------------------------------
+#
+# AST
+#
+# -----------------------------------------------------------------------------
+
+def ex( type, *children, **attributes ):
+	node = Node(f"ex:{type}")
+	for k,v in attributes.items():
+		node.attr(k, v)
+	for _ in children:
+		node.add(_)
+	return node
+
+def ref( name ):
+	return ex("ref", name=name)
+
+def num( value ):
+	return ex("number", value=value)
+
+def string( value ):
+	return ex("string", value=value)
+
+def call( *children ):
+	return ex("list", *children)
+
+def program( *children ):
+	return ex("seq", *children)
+
+PROGRAMS = {
+	"helloworld": program(call(ref("out!"), string("Hello, world!"))),
+	"math": program(
+		call(ref("out!"),
+			call(ref("add"), num(10), num(100)),
+			ex("comment", value=";; @expect 110"),
+			call(ref("sub"), num(100), num(100)),
+			call(ref("mul"), num(100), num(3)),
+			call(ref("div"), num(100), num(4))),
+		call(ref("round"), call(ref("add"), num(0.5), num(100)))),
+	"literals": program(
+		num(1), string("one"), call(), ex("comment", value=";; A comment"),
+		ex("quote", call(num(1), num(2), string("three"))),
+		ex("quote", num(1), num(2)),
+		call(ref("list"), num(1), num(2), num(3))),
+	"let": program(
+		call(ref("let"), call(ref("A"), num(1)), call(ref("B"), num(10)),
+			call(ref("out!"), string("A="), ref("A"), string(" B="), ref("B"))),
+		# Arguments see the names of the previous ones
+		call(ref("let"), call(ref("a"), num(1)), call(ref("add"), num(5), ref("a")))),
+	"set": program(
+		call(ref("set!"), ref("L"), ex("quote", call(num(1), num(2)))),
+		ref("L"),
+		# A primitive can be shadowed by the program
+		call(ref("let"), call(ref("out!"), num(42)), ref("out!"))),
+	"logic": program(
+		call(ref("and"), num(1), call(ref("out!"), string("OK"))),
+		call(ref("or"), num(0), num(2)),
+		call(ref("cond"),
+			call(call(ref("out!"), string("ONE")), string("NOT OK")),
+			call(num(1), string("OK")))),
+	"lambda": program(
+		call(ref("out!"), call(call(ref("lambda"), call(ref("A")), ref("A")), string("Hello, World"))),
+		call(ref("set!"), ref("twice"), call(ref("lambda"), call(ref("X")), call(ref("mul"), ref("X"), num(2)))),
+		call(ref("twice"), call(ref("twice"), num(3)))),
+	"template": program(
+		ex("template", string("hello"), ex("template", string("world"), num(1)), num(3)),
+		call(ref("tree"), call(ref("node"), ex("template", call(ref("add"), num(1), num(2)))))),
+	"lazy": program(
+		call(ref("let"), call(ref("C"), call(ref("lazy"), num(1), call(ref("add"), num(1), num(1)))),
+			call(ref("list"), call(ref("next"), ref("C")), call(ref("next"), ref("C")), call(ref("next?"), ref("C"))))),
+	"unresolved": program(call(ref("out!"), string("Before")), call(ref("undefined"), num(1))),
+	"not-invocable": program(call(num(1), num(2))),
+}
+
+# -----------------------------------------------------------------------------
+#
+# HELPERS
+#
+# -----------------------------------------------------------------------------
+
+def evaluate( tree, interpreter ):
+	"""Returns the values yielded by the interpreter and its output."""
+	Primitives().bind(interpreter.context)
+	out = io.StringIO()
+	res = []
+	with redirect_stdout(out):
+		try:
+			for _ in interpreter.feed(tree):
+				# NOTE: Functions are compared without their address
+				res.append(str(_) if isinstance(_, Node) else re.sub(" at 0x[0-9a-f]+", "", repr(_)))
+		except Exception as e:
+			res.append(f"{e.__class__.__name__}: {e}")
+	return (res, out.getvalue())
+
+# -----------------------------------------------------------------------------
+#
+# TESTS
+#
+# -----------------------------------------------------------------------------
+
+def test_passes():
+	tree     = PROGRAMS["helloworld"]
+	compiler = Compiler()
+	inter    = BytecodeInterpreter(compiler=compiler)
+	Primitives().bind(inter.context)
+	node     = tree.head
+	# (out! "Hello") becomes (invoke (resolve "out!") "Hello") …
+	form     = compiler.lower.process(node)
+	assert [_.name for _ in form.walk()] == ["invoke", "resolve", "const"]
+	assert form.children[0].symbol == "out!"
+	# … then (primitive "out!") …
+	form     = compiler.resolve.apply(form, inter.context, set())
+	assert form.children[0].name == "primitive"
+	# … and a call that needs no invocation context
+	form     = compiler.specialize.apply(form, set())
+	assert [_.name for _ in form.walk()] == ["call", "primitive", "arg", "const"]
+	assert form.value is False
+	code     = compiler.compile(node, inter.context)
+	assert code.disassemble() == ["PRIMITIVE 0", "CONST 0", "CALL 1"]
+	assert code.primitives == ("out!",) and compiler.slots == {"out!":0}
+	# The code is compiled once
+	assert compiler.compile(node, inter.context) is code
+
+def test_context():
+	compiler = Compiler()
+	inter    = BytecodeInterpreter(compiler=compiler)
+	Primitives().bind(inter.context)
+	# The names bound by the program are not resolved statically, and
+	# the invocation context is created when its names are referenced.
+	tree     = PROGRAMS["let"]
+	code     = compiler.compile(tree.children[1].children[2], inter.context)
+	assert code.disassemble()[:2] == ["PRIMITIVE 0", "ENTER 0"]
+	tree     = PROGRAMS["set"]
+	code     = compiler.compile(tree.children[2].children[2], inter.context)
+	assert code.disassemble() == ["RESOLVE 0"]
+
+def test_programs():
+	for name, tree in PROGRAMS.items():
+		expected = evaluate(tree, ValueInterpreter())
+		actual   = evaluate(tree, BytecodeInterpreter())
+		assert actual == expected, f"Program '{name}': {actual} != {expected}"
+
+def test_shared():
+	# A compiler can be shared by interpreters with the same primitives
+	compiler = Compiler()
+	for name, tree in PROGRAMS.items():
+		expected = evaluate(tree, ValueInterpreter())
+		for _ in range(2):
+			assert evaluate(tree, BytecodeInterpreter(compiler=compiler)) == expected
+
+if __name__ == "__main__":
+	test_passes()
+	test_context()
+	test_programs()
+	test_shared()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,28 @@
+from tlang.command import parseFiles
+import glob, os
+
+__doc__ = """
+Exercises the parsing of multiple files by tlang.command, sequentially
+and in a process pool.
+"""
+
+BASE  = os.path.dirname(os.path.abspath(__file__))
+FILES = sorted(glob.glob(os.path.join(BASE, "tlang", "*.tlang")))
+
+def test_jobs():
+	sequential = [(path, str(ast), error) for path, ast, error in parseFiles(FILES)]
+	parallel   = [(path, str(ast), error) for path, ast, error in parseFiles(FILES, jobs=4)]
+	# Files are yielded in order, with the same ASTs
+	assert [_[0] for _ in parallel] == FILES
+	assert parallel == sequential
+
+def test_metadata():
+	# The ASTs keep their source positions, used to report errors
+	for (_, a, _), (_, b, _) in zip(parseFiles(FILES[:2]), parseFiles(FILES[:2], jobs=2)):
+		assert [_.metadata for _ in a.walk()] == [_.metadata for _ in b.walk()]
+
+if __name__ == "__main__":
+	test_jobs()
+	test_metadata()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,117 @@
+from tlang.tree.model import Node
+from tlang.incremental import TextEdit, reparseString, spliceList
+
+__doc__ = """
+Exercises the tlang.incremental module, making sure that incremental
+reparsing produces the same AST as parsing the edited source.
+"""
+
+SOURCE = """(set! L '(1 2 3))
+(map L (lambda (V I)
+	(add I (mul V 10))))
+(out! "Hello")
+42
+"""
+
+def dump( tree ):
+	return [(_.name, _.toPrimitive() if _.isLeaf else None, _.meta("offset"), _.meta("length"), _.meta("line")) for _ in tree.walk()]
+
+def located( name:str, offset:int, length:int, line:int, *children ):
+	"""Creates a node with the metadata that the parser would set."""
+	node = Node(name)
+	node.meta("offset", offset)
+	node.meta("length", length)
+	node.meta("line", line)
+	for _ in children:
+		node.add(_)
+	return node
+
+def assertReparse( source:str, edit:TextEdit, kept:int=-1 ):
+	"""Reparses the edited source, `kept` being the index of a top-level
+	form that is not edited and must keep its identity, if any."""
+	# NOTE: Imported here so that the tests that don't parse run without
+	# libparsing.
+	from tlang.parser import parseString
+	tree     = parseString(source)
+	nodes    = list(tree.children[kept].walk()) if kept >= 0 else []
+	result   = reparseString(tree, source, edit)
+	expected = parseString(edit.apply(source))
+	assert str(result) == str(expected)
+	assert dump(result) == dump(expected)
+	if kept >= 0:
+		assert result is tree
+		assert list(result.children[kept].walk()) == nodes
+	return result
+
+def test_edit():
+	edit = TextEdit(4, 2, "xyz")
+	assert edit.end == 6 and edit.delta == 1
+	assert edit.apply("abcdefgh") == "abcdxyzgh"
+
+def test_splice():
+	# The AST of "(f (g 1) 2)\n(h)", built by hand so that the splice
+	# doesn't need the parser.
+	source = "(f (g 1) 2)\n(h)"
+	inner  = located("ex:list", 3, 5, 1,
+		located("ex:ref", 4, 1, 1),
+		located("ex:number", 6, 1, 1))
+	outer  = located("ex:list", 0, 11, 1,
+		located("ex:ref", 1, 1, 1),
+		inner,
+		located("ex:number", 9, 1, 1))
+	last   = located("ex:list", 12, 3, 2, located("ex:ref", 13, 1, 2))
+	tree   = located("ex:seq", 0, len(source), 1, outer, last)
+	edit   = TextEdit(6, 1, "10\n")
+	assert edit.apply(source) == "(f (g 10\n) 2)\n(h)"
+	# The fragment "(g 10\n)" as parsed on its own
+	fragment = located("ex:list", 0, 7, 1,
+		located("ex:ref", 1, 1, 1),
+		located("ex:number", 3, 3, 1))
+	kept   = [_ for _ in tree.walk() if _.parent is not inner]
+	result = spliceList(tree, inner, fragment, edit, 1)
+	assert result is tree
+	assert tree.children[0] is outer and tree.children[1] is last
+	assert outer.children[1] is inner
+	assert [(_.name, _.meta("offset"), _.meta("length"), _.meta("line")) for _ in tree.walk()] == [
+		("ex:seq",    0,  17, 1),
+		("ex:list",   0,  13, 1),
+		("ex:ref",    1,  1,  1),
+		("ex:list",   3,  7,  1),
+		("ex:ref",    4,  1,  1),
+		("ex:number", 6,  3,  1),
+		("ex:number", 11, 1,  2),
+		("ex:list",   14, 3,  3),
+		("ex:ref",    15, 1,  3),
+	]
+	# Only the children of the edited list are new
+	assert [_ for _ in tree.walk() if _.parent is not inner] == kept
+	assert not any(_ in kept for _ in inner.children)
+
+def test_list():
+	# Changes a number inside the innermost list
+	offset = SOURCE.index("10")
+	assertReparse(SOURCE, TextEdit(offset, 2, "100"), kept=2)
+	# Adds a line inside the lambda, which shifts the following form
+	offset = SOURCE.index("(add")
+	assertReparse(SOURCE, TextEdit(offset, 0, "(out! I)\n\t"), kept=2)
+
+def test_form():
+	# Edits a top-level value that is not in a list
+	offset = SOURCE.index("42")
+	assertReparse(SOURCE, TextEdit(offset, 2, "420"), kept=0)
+	offset = SOURCE.index("\"Hello\"")
+	assertReparse(SOURCE, TextEdit(offset, 7, "\"Hello, World\""), kept=0)
+
+def test_fallback():
+	# An edit that spans two forms is reparsed as a whole
+	offset = SOURCE.index("3))")
+	assertReparse(SOURCE, TextEdit(offset, len("3))\n(map"), "4))\n(map"))
+
+if __name__ == "__main__":
+	test_edit()
+	test_splice()
+	test_list()
+	test_form()
+	test_fallback()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -1,5 +1,6 @@
 from tlang.parser import parseString
 from tlang.utils import TestUtils
+import os, sys, subprocess
 
 __doc__ = """
 Exercises the tlang.query module.
@@ -19,7 +20,18 @@ QUERY_EXPR = """
 def test_query_expr():
 	TestUtils.ParseLines(QUERY_EXPR, parseString)
 
+def test_grammar_order():
+	# The query and tlang parsers share one grammar, whichever is built
+	# first, so that queries parse the same way. Each order is run in its
+	# own process, as the grammars are built once.
+	script = "import tlang.query.parser as q, tlang.parser as t\n{}\nprint(q.parseString('./node'))"
+	outputs = []
+	for first in ("g = q.grammar() ; assert g is t.getGrammar()", "g = t.getGrammar() ; assert g is q.grammar()"):
+		outputs.append(subprocess.run([sys.executable, "-c", script.format(first)], env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)), check=True, capture_output=True, text=True).stdout)
+	assert outputs[0] == outputs[1]
+
 if __name__ == "__main__":
 	test_query_expr()
+	test_grammar_order()
 
 # EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,64 @@
+from tlang.tree.parser import parseString
+from tlang.tree.binary import writeFile, openFile
+from tlang.tree.model import Node, NodeTemplate
+from tlang.utils import TestUtils
+import tempfile, os
+
+__doc__ = """
+Exercises the tlang.tree.binary module, making sure that trees survive
+a round-trip through the binary format.
+"""
+
+TREES = """
+(program
+  (let 'text "hello, world!")
+  (invoke (resolve 'print) (resolve 'text)))
+(node (@ (key "value") (count 10) (ratio 0.5) (symbol value)))
+(a (b (c (d))) e f)
+leaf
+"""
+
+def assertRoundTrip( text:str ):
+	forest = parseString(text)
+	fd, path = tempfile.mkstemp(suffix=".tlt")
+	os.close(fd)
+	try:
+		writeFile(forest, path)
+		with openFile(path) as tree:
+			assert len(tree.trees) == len(forest)
+			for original, mapped in zip(forest, tree.trees):
+				assert str(original) == str(mapped)
+				assert str(original) == str(mapped.toNode())
+				assert original.toPrimitive() == mapped.toPrimitive()
+	finally:
+		os.unlink(path)
+
+def test_roundtrip():
+	assertRoundTrip(TREES)
+
+def test_roundtrip_examples():
+	for example in TestUtils.GetExamples("tree.txto", "tree"):
+		assertRoundTrip(example)
+
+def test_roundtrip_classes():
+	# Templates are stored as such, like in the AST cache
+	tree = Node("ex:seq")
+	tree.add(NodeTemplate("template")).attr("value", "NAME").attr("expand", True)
+	tree.add(Node("template")).attr("value", "OTHER")
+	fd, path = tempfile.mkstemp(suffix=".tlt")
+	os.close(fd)
+	try:
+		writeFile(tree, path)
+		with openFile(path) as mapped:
+			loaded = mapped.toNode()
+			assert [_.__class__ for _ in loaded.walk()] == [Node, NodeTemplate, Node]
+			assert loaded.toPrimitive() == tree.toPrimitive()
+	finally:
+		os.unlink(path)
+
+if __name__ == "__main__":
+	test_roundtrip()
+	test_roundtrip_examples()
+	test_roundtrip_classes()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,40 @@
+from tlang.tree.columnar import ColumnarTree
+from tlang.tree import node
+
+__doc__ = """
+Exercises the tlang.tree.columnar module.
+"""
+
+forest = [
+	node("dir", {"name":"tlang"},
+		node("file", {"name":"a.py", "size":10}),
+		node("dir", node("file"))),
+	node("file", {"name":"b.py"}),
+]
+
+def test_columns():
+	tree = ColumnarTree.FromNode(forest)
+	assert len(tree) == 5
+	assert list(tree.roots) == [0, 4]
+	assert [tree.names[_] for _ in tree.name] == ["dir", "file", "dir", "file", "file"]
+	assert list(tree.parent) == [-1, 0, 0, 2, -1]
+	assert list(tree.firstChild) == [1, -1, 3, -1, -1]
+	assert list(tree.nextSibling) == [-1, 2, -1, -1, -1]
+	assert list(tree.size) == [4, 1, 2, 1, 1]
+
+def test_views():
+	tree = ColumnarTree.FromNode(forest)
+	root = tree.trees[0]
+	assert root.isTree and root.childrenCount == 2
+	assert root.head["name"] == "a.py" and root.head.attr("size") == 10
+	assert root.children[1].head.root == root
+	assert [_.name for _ in root.walk()] == ["dir", "file", "dir", "file"]
+	for original, view in zip(forest, tree.trees):
+		assert str(original) == str(view)
+		assert original.toPrimitive() == view.toNode().toPrimitive()
+
+if __name__ == "__main__":
+	test_columns()
+	test_views()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,57 @@
+from tlang.tree.events import parseEvents, treeEvents, buildTrees, TreeSyntaxError, OPEN, ATTR, CLOSE, TEMPLATE
+from tlang.tree.model import NodeTemplate
+from tlang.tree import node
+
+__doc__ = """
+Exercises the tlang.tree.events module.
+"""
+
+SOURCE = """
+;; An abstract representation of "hello, world!"
+(program
+  (let 'text "hello, world!")
+  (invoke (resolve 'print) (resolve 'text)))
+(item (@ (size 10) (name "a.py") (kind file)) leaf 1.5 ...REST)
+"""
+
+def test_events():
+	events = list(parseEvents("(dir (@ (size 10)) (file) 'x)"))
+	assert events == [
+		(OPEN, "dir", None), (ATTR, "size", 10),
+		(OPEN, "file", None), (CLOSE, "file", None),
+		(OPEN, "symbol", None), (ATTR, "value", "x"), (CLOSE, "symbol", None),
+		(CLOSE, "dir", None),
+	]
+
+def test_build():
+	program, item = buildTrees(parseEvents(SOURCE))
+	assert program.toPrimitive() == ["program",
+		["let", ["symbol", {"value":"text"}], ["string", {"value":'"hello, world!"'}]],
+		["invoke", ["resolve", ["symbol", {"value":"print"}]], ["resolve", ["symbol", {"value":"text"}]]]]
+	assert item.attributes == {"size":10, "name":'"a.py"', "kind":"file"}
+	assert [_.name for _ in item.children] == ["leaf", "number", "template"]
+	assert item.children[1]["value"] == 1.5
+	assert isinstance(item.children[2], NodeTemplate) and item.children[2]["expand"]
+	# Trees can be turned back into events
+	assert [_.toPrimitive() for _ in buildTrees(treeEvents([program, item]))] == [program.toPrimitive(), item.toPrimitive()]
+
+def test_deep():
+	depth = 100_000
+	events = parseEvents("(a " * depth + ")" * depth)
+	assert sum(1 for _ in events) == depth * 2
+
+def test_errors():
+	for source in ("(dir (file)", "(dir (@))", "(Dir)", "(dir (@ (size)))"):
+		try:
+			list(parseEvents(source))
+			assert False, f"Expected syntax error for: {source}"
+		except TreeSyntaxError as e:
+			assert e.line == 1
+
+if __name__ == "__main__":
+	test_events()
+	test_build()
+	test_deep()
+	test_errors()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,45 @@
+from tlang.tree.index import TreeIndex
+from tlang.tree.columnar import ColumnarTree
+from tlang.tree import node
+
+__doc__ = """
+Exercises the tlang.tree.index module.
+"""
+
+forest = [
+	node("dir", {"name":"tlang"},
+		node("file", {"name":"a.py", "size":10}),
+		node("dir", node("file"))),
+	node("file", {"name":"b.py"}),
+]
+
+def test_numbering():
+	index = TreeIndex(forest)
+	assert len(index) == 5
+	assert list(index.roots) == [0, 4]
+	assert list(index.parent) == [-1, 0, 0, 2, -1]
+	assert list(index.size) == [4, 1, 2, 1, 1]
+	assert list(index.post) == [3, 0, 2, 1, 4]
+	assert index.isAncestor(0, 3) and not index.isAncestor(2, 1)
+	for i, n in enumerate(forest[0].walk()):
+		assert index.position(n) == i and index.node(i) is n
+
+def test_lookups():
+	for index in (TreeIndex(forest), TreeIndex(ColumnarTree.FromNode(forest))):
+		assert list(index.withName("file")) == [1, 3, 4]
+		assert list(index.withName("nothing")) == []
+		assert list(index.withAttribute("name")) == [0, 1, 4]
+		assert index.descendants(index.withName("file"), [0]) == [1, 3]
+		assert index.descendants(index.withName("file"), [-1]) == [1, 3, 4]
+		assert index.children(index.withName("file"), [-1, 2]) == [3, 4]
+		assert index.parents([1, 3]) == [0, 2]
+		assert index.ancestors([3]) == [0, 2]
+	columnar = ColumnarTree.FromNode(forest)
+	index = TreeIndex(columnar)
+	assert index.position(columnar.node(3)) == 3 and index.node(3) == columnar.node(3)
+
+if __name__ == "__main__":
+	test_numbering()
+	test_lookups()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,208 @@
+from tlang.tree.model import Node, NodeTemplate, Names, TreeCursor
+from tlang.tree import node
+import pickle
+
+__doc__ = """
+Exercises the tlang.tree.model module.
+"""
+
+def test_compact():
+	n = Node("leaf")
+	assert not hasattr(n, "__dict__")
+	assert not hasattr(NodeTemplate("template"), "__dict__")
+	# Containers are only allocated when something is stored
+	assert n.isLeaf and not n.hasAttributes
+	assert n.attr("missing") is None
+	assert n._attributes is None and n._children is None and n.metadata is None
+	assert len(n.children) == 0 and n.head is None and n.tail == []
+
+def test_mutation():
+	parent = node("parent", {"key":"value"})
+	child  = parent.add(Node("child"))
+	assert parent.children[0] is child and child.parent is parent
+	parent.remove(child)
+	assert parent.isLeaf and parent.childrenCount == 0
+	parent.insert(0, child)
+	assert parent.index(child) == 0
+	assert parent["key"] == "value"
+	assert parent.toPrimitive() == ["parent", {"key":"value"}, ["child"]]
+
+def test_copy():
+	original = node("a", {"x":1}, node("b"))
+	copy     = original.copy()
+	copy.attr("y", 2)
+	assert original.attr("y") is None
+	assert copy.toPrimitive() == ["a", {"x":1, "y":2}, ["b"]]
+	assert original.copy(0).isLeaf
+
+def test_copy_on_write():
+	original = node("a", {"x":1}, node("b", node("c", {"y":2})), node("d"))
+	before   = original.toPrimitive()
+	copies   = [original.copy() for _ in range(3)]
+	# Copies share the attributes map with their own copies, and don't copy
+	# their children yet
+	assert copies[0].copy()._attributes is copies[0]._attributes
+	assert copies[0]._attributes is not original._attributes
+	assert all(_._cow is original for _ in copies)
+	# Mutations of the copies don't show on the original…
+	copies[0].setAttribute("z", 3)
+	copies[0].head.head.attr("y", 4)
+	copies[0].head.add(Node("e"))
+	copies[0].remove(copies[0].children[1])
+	assert original.toPrimitive() == before
+	assert copies[0].toPrimitive() == ["a", {"x":1, "z":3}, ["b", ["c", {"y":4}], ["e"]]]
+	# …nor do the original's on the pending copies, even deep down
+	original.head.head.add(Node("f"))
+	original.head.head.attr("y", 5)
+	original.head.insert(0, Node("g"))
+	original.attributes["x"] = 6
+	for copy in copies[1:]:
+		assert copy.toPrimitive() == before
+		assert all(_ is not n for _ in copy.walk() for n in original.walk())
+	# Copies of copies, and copies that stop at a depth
+	copy = copies[1].copy()
+	copies[1].head.head.attr("y", 7)
+	copies[1].add(Node("h"))
+	assert copy.toPrimitive() == before
+	assert copies[2].copy(1).toPrimitive() == ["a", {"x":1}, ["b"], ["d"]]
+	# Pending copies are released once collected
+	del copies, copy
+	original.add(Node("i"))
+	assert original._cow is None
+
+def test_copy_discarded():
+	# A copy that is collected before it is materialized releases its
+	# source, so that mutations no longer look for pending copies.
+	sources  = Node.SOURCES
+	original = node("a", node("b", node("c")))
+	original.copy()
+	assert Node.SOURCES == sources and original._cow is None
+	calls    = []
+	unshare  = Node.unshare
+	Node.unshare = lambda self, children=False:calls.append(self) or unshare(self, children)
+	try:
+		chain = Node("chain")
+		for _ in range(1000):
+			chain = chain.add(Node("chain"))
+	finally:
+		Node.unshare = unshare
+	assert not calls
+
+def test_copy_rename():
+	original = node("a", node("b", node("c")))
+	copy     = original.copy()
+	original.head.head.name = "zzz"
+	assert copy.head.head.name == "c"
+	copy.head.name = "yyy"
+	assert original.head.name == "b"
+	assert original.toPrimitive() == ["a", ["b", ["zzz"]]]
+	assert copy.toPrimitive() == ["a", ["yyy", ["c"]]]
+
+def test_copy_source():
+	# The source keeps its attributes map, which callers may hold
+	original   = node("a", {"k":1}, node("b", {"k":1}))
+	attributes = original.attributes
+	copy       = original.copy()
+	attributes["k"] = 2
+	assert original.attr("k") == 2 and copy.attr("k") == 1
+	# Printing a copy does not copy its shared map
+	assert str(copy) == str(copy.copy()) and type(copy._attributes).__name__ == "SharedAttributes"
+	# Sources and copies can be pickled, the copies being materialized
+	other = pickle.loads(pickle.dumps([original, copy]))
+	assert [_.toPrimitive() for _ in other] == [original.toPrimitive(), copy.toPrimitive()]
+	assert other[1].head.parent is other[1] and other[1]._cow is None
+	assert original._cow is None and copy._cow is None
+
+def test_names():
+	a, b = Node("".join(("na", "me"))), Node("name")
+	assert a.nameId == b.nameId == Names.Id("name")
+	assert a.name is b.name
+	a.name = "other"
+	assert a.nameId == Names.Id("other") and a.name == "other"
+	assert Names.Name(b.nameId) == "name"
+
+def test_numbering():
+	tree = node("a", node("b", node("c")), node("d"))
+	a, b, c, d = tree.walk()
+	numbering = tree.number()
+	assert numbering.nodes == [a, b, c, d]
+	assert list(numbering.post) == [3, 1, 0, 2]
+	assert list(numbering.size) == [4, 2, 1, 1]
+	assert numbering.isAncestor(a, c) and numbering.isDescendant(c, b)
+	assert not numbering.isAncestor(b, d) and numbering.isFollowing(d, c)
+	assert numbering.isPreceding(c, d) and not numbering.isFollowing(c, b)
+	assert c.root is a and a.root is None
+	# Mutations invalidate the numbering, which is renumbered on access
+	b.remove(c)
+	assert not numbering.isValid and c.root is None
+	d.add(c)
+	assert numbering.preOf(c) == 3 and numbering.isAncestor(d, c)
+	assert c.root is a and numbering.isValid
+	# A numbered tree that is attached to another one loses its numbering
+	other = node("e", node("f"))
+	released = other.number()
+	b.insert(0, other)
+	assert released.root is None and other.numbering is numbering
+	assert numbering.isAncestor(b, other.head) and other.head.root is a
+
+def test_numbering_detached():
+	# Detached subtrees are not part of the numbering anymore, and are
+	# traversed without it.
+	from tlang.compiler.query import Traversal
+	tree = node("a", node("b", node("c")), node("d"))
+	a, b, c, d = tree.walk()
+	numbering = tree.number()
+	b.detach()
+	assert b._numbering is None and c._numbering is None and d._numbering is numbering
+	assert [(_.node, _.depth) for _ in Traversal.DownDepth(b)] == [(b, 0), (c, 1)]
+	assert [_.node for _ in Traversal.DownDepth(a)] == [a, d]
+	# Even when the numbering is stale
+	tree = node("a", node("b", node("c")), node("d"))
+	a, b, c, d = tree.walk()
+	tree.number()
+	a._children.remove(b) ; b.parent = None ; a._numbering.invalidate()
+	assert [_.node for _ in Traversal.DownDepth(b)] == [b, c]
+
+def test_cursor():
+	tree = node("a", node("b", node("c")), node("d"))
+	a, b, c, d = tree.walk()
+	cursor = TreeCursor(b)
+	assert cursor.down() and cursor.node is c and cursor.depth == 1
+	assert not cursor.down() and not cursor.right()
+	assert cursor.up() and cursor.node is b
+	# The cursor does not move above its start node
+	assert not cursor.up() and not cursor.right() and not cursor.skip()
+	assert cursor.next() and not cursor.next() and cursor.node is b
+	cursor.reset(a)
+	assert cursor.next() and cursor.next() and cursor.node is c
+	assert cursor.skip() and cursor.node is d and cursor.index == 1
+	assert [_.name for _ in tree.walk(lambda _:_ is not b)] == ["a", "d"]
+
+def test_cursor_deep():
+	# Deep trees don't hit the recursion limit
+	root = Node("a")
+	current = root
+	for _ in range(1_000_000 - 1):
+		current = current.add(Node("b"))
+	cursor = TreeCursor(root)
+	while cursor.down():
+		pass
+	assert cursor.depth == 999_999 and cursor.node is current
+	assert not cursor.next() and cursor.node is root
+	assert sum(1 for _ in root.walk()) == 1_000_000
+
+if __name__ == "__main__":
+	test_compact()
+	test_mutation()
+	test_copy()
+	test_copy_on_write()
+	test_copy_discarded()
+	test_copy_rename()
+	test_copy_source()
+	test_names()
+	test_numbering()
+	test_numbering_detached()
+	test_cursor()
+	test_cursor_deep()
+
+# EOF - vim: ts=4 sw=4 noet
@@ -0,0 +1,101 @@
+from tlang.tree.persistent import PersistentNode, PersistentTransform
+from tlang.tree.model import TreeTransform
+from tlang.tree import node
+import pickle
+
+__doc__ = """
+Exercises the persistent trees of tlang.tree.persistent.
+"""
+
+tree = node("dir", {"name":"tlang"},
+	node("dir", {"name":"research"},
+		node("file", {"name":"compiler-query.py"}),
+		node("file", {"name":"interpreter.py"})),
+	node("file", {"name":"README"}))
+
+def test_conversion():
+	p = PersistentNode.FromNode(tree)
+	assert p.toPrimitive() == tree.toPrimitive()
+	assert [_.name for _ in p.walk()] == [_.name for _ in tree.walk()]
+	assert p.get((0, 1)).attr("name") == "interpreter.py"
+
+def test_path_copying():
+	v1 = PersistentNode.FromNode(tree)
+	v2 = v1.update((0, 1), lambda _:_.setAttribute("size", 10))
+	# The previous version is untouched
+	assert not v1.get((0, 1)).hasAttribute("size") and v2.get((0, 1)).attr("size") == 10
+	# Only the path is copied, the other subtrees are shared
+	assert v2 is not v1 and v2.children[0] is not v1.children[0]
+	assert v2.children[1] is v1.children[1]
+	assert v2.get((0, 0)) is v1.get((0, 0))
+	v3 = v2.update((0,), lambda _:_.remove(0).add(PersistentNode.Make("meta")))
+	assert [_.name for _ in v3.get((0,)).children] == ["file", "meta"]
+	assert [_.name for _ in v2.get((0,)).children] == ["file", "file"]
+	assert v3.get((0, 0)) is v2.get((0, 1))
+	assert v1.toPrimitive() == tree.toPrimitive()
+
+def test_transform():
+	v1 = PersistentNode.FromNode(tree)
+	v2 = v1.transform(lambda _:_.setAttribute("name", "README.md") if _.attr("name") == "README" else _)
+	assert v2.children[1].attr("name") == "README.md" and v1.children[1].attr("name") == "README"
+	assert v2.children[0] is v1.children[0]
+	assert v1.transform(lambda _:_) is v1
+
+def test_node():
+	# Nodes are not tuples, and are only equal to themselves
+	p = PersistentNode.FromNode(tree)
+	q = PersistentNode.FromNode(tree)
+	assert p != q and p == p and len({p, q, p.children[1]}) == 3
+	for f in (len, iter):
+		try:
+			f(p)
+			assert False, f"Expected {f.__name__} to fail"
+		except TypeError as e:
+			pass
+	try:
+		p.children = ()
+		assert False, "Expected node to be immutable"
+	except AttributeError as e:
+		pass
+	assert pickle.loads(pickle.dumps(p)).toPrimitive() == tree.toPrimitive()
+
+class Rename(PersistentTransform):
+
+	def on_file( self, node ):
+		return node.setAttribute("name", "README.md") if node.attr("name") == "README" else node
+
+	def on_meta( self, node ):
+		return None
+
+def test_tree_transform():
+	v1 = PersistentNode.FromNode(tree)
+	assert isinstance(Rename(), TreeTransform)
+	v2 = Rename().process(v1)
+	assert v2.children[1].attr("name") == "README.md" and v1.children[1].attr("name") == "README"
+	# The untouched subtrees are shared with the source
+	assert v2.children[0] is v1.children[0]
+	assert Rename().process(v2) is v2
+	# Nodes for which the handler returns nothing are removed
+	v3 = v2.update((0,), lambda _:_.add(PersistentNode.Make("meta")))
+	assert Rename().process(v3).toPrimitive() == v2.toPrimitive()
+
+def test_deep():
+	root = node("a")
+	current = root
+	for _ in range(100_000):
+		current = current.add(node("b"))
+	p = PersistentNode.FromNode(root)
+	path = (0,) * 100_000
+	q = p.set(path, PersistentNode.Make("c"))
+	assert q.get(path).name == "c" and p.get(path).name == "b"
+	assert sum(1 for _ in q.walk()) == 100_001
+
+if __name__ == "__main__":
+	test_conversion()
+	test_path_copying()
+	test_transform()
+	test_node()
+	test_tree_transform()
+	test_deep()
+
+# EOF - vim: ts=4 sw=4 noet
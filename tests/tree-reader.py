@@ -0,0 +1,166 @@
+from tlang.tree.reader import TreeReader, parseString, readTrees, readFile
+from tlang.tree.events import parseEvents, buildTrees, TreeSyntaxError
+from tlang.tree.model import NodeTemplate
+from tlang.utils import TestUtils
+import io, os, mmap, tempfile
+
+__doc__ = """
+Exercises the tlang.tree.reader module, which must produce the same trees
+as the grammar-based parser in tlang.tree.parser.
+"""
+
+SOURCE = """
+;; An abstract representation of "hello, world!"
+(program
+  (let 'text "hello, world!")
+  (invoke (resolve 'print) (resolve 'text)))
+;; Attributes, shorthands and templates
+(item (@ (size 10) (name "a.py") (kind file)) leaf 1.5 ...REST X)
+"""
+
+def test_read():
+	program, item = parseString(SOURCE)
+	assert program.toPrimitive() == ["program",
+		["let", ["symbol", {"value":"text"}], ["string", {"value":'"hello, world!"'}]],
+		["invoke", ["resolve", ["symbol", {"value":"print"}]], ["resolve", ["symbol", {"value":"text"}]]]]
+	assert item.attributes == {"size":10, "name":'"a.py"', "kind":"file"}
+	assert [_.name for _ in item.children] == ["leaf", "number", "template", "template"]
+	assert item.children[1]["value"] == 1.5 and item.children[1].parent is item
+	assert isinstance(item.children[2], NodeTemplate) and item.children[2]["expand"]
+	assert not item.children[3].hasAttribute("expand")
+
+# The sources that the reader, the event parser and the grammar must parse
+# the same way, and those that they must all reject.
+CASES = (
+	SOURCE, "a b 'c", "(a (@ (k v)) (b (c 1abc)))", "( a (@(k \"x)) )",
+	"1.5 12 ...REST …X 'Sym-bol_1", "\"a (b)\" (a \"b\" 'c 1)",
+	"(a\n(@\n(k 1.0)\n(l \"v w\")\n(m -x.y))\n(b))", ";; c\n(a) ;; d\n;; e",
+)
+ERRORS = (
+	"(dir (file)", "(dir (@))", "(Dir)", "(dir (@ (size)))", "(dir ;; comment\n)",
+	")", "(a) $", "(a\n (b (@ (k v)\n x)))", "(a (@ (k v) x))", "1.a", "(a)\n.",
+)
+
+def test_events():
+	# The reader and the event parser share their tokenizer, and must give
+	# the same trees and the same errors.
+	for source in CASES:
+		assert [str(_) for _ in parseString(source)] == [str(_) for _ in buildTrees(parseEvents(source))]
+	for source in ERRORS:
+		errors = []
+		for parse in (parseString, lambda _:list(buildTrees(parseEvents(_)))):
+			try:
+				parse(source)
+				assert False, f"Expected syntax error for: {source}"
+			except TreeSyntaxError as e:
+				errors.append((e.offset, e.line))
+		assert (source, errors[0]) == (source, errors[1])
+
+def test_incremental():
+	reader = TreeReader("(a) (b (c)) d")
+	trees  = reader.read()
+	assert next(trees).name == "a" and reader.offset == 3
+	assert [_.name for _ in trees] == ["b", "d"]
+
+def test_chunks():
+	# Chunks may cut trees, tokens and UTF-8 sequences anywhere
+	expected = [str(_) for _ in parseString(SOURCE)]
+	for size in (1, 2, 3, 7, 64):
+		assert [str(_) for _ in readTrees(io.StringIO(SOURCE), size)] == expected
+		assert [str(_) for _ in readTrees(io.BytesIO(SOURCE.encode("utf8")), size)] == expected
+	assert [_["value"] for _ in readTrees(io.StringIO("1.5 12 1.25"), 2)] == [1.5, 12, 1.25]
+	try:
+		list(readTrees(io.StringIO("(a) (b (c)"), 2))
+		assert False, "Expected syntax error"
+	except TreeSyntaxError as e:
+		pass
+
+def test_chunks_errors():
+	# Errors are raised on the first chunk, at their offset in the source
+	class Source(io.StringIO):
+		reads = 0
+		def read( self, size=-1 ):
+			self.reads += 1
+			return super().read(size)
+	source = Source("(a)\n)" + "\n(b (c))" * 100_000)
+	try:
+		list(readTrees(source, 64))
+		assert False, "Expected syntax error"
+	except TreeSyntaxError as e:
+		assert (e.offset, e.line) == (4, 2)
+	assert source.reads == 1
+	# The offsets account for the chunks that were already read
+	source = "(a)\n" * 100 + "(b $)"
+	for size in (1, 7, 64):
+		try:
+			list(readTrees(io.StringIO(source), size))
+			assert False, "Expected syntax error"
+		except TreeSyntaxError as e:
+			assert (e.offset, e.line) == (source.index("$"), 101)
+
+def test_file():
+	source = "\n".join(f"(item (@ (n {i})) 'x \"…\" …REST)" for i in range(1000))
+	fd, path = tempfile.mkstemp(suffix=".tree")
+	os.write(fd, source.encode("utf8"))
+	os.close(fd)
+	try:
+		expected = [str(_) for _ in parseString(source)]
+		assert [str(_) for _ in readFile(path, 1000)] == expected
+		with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+			assert [str(_) for _ in readTrees(m, 1000)] == expected
+	finally:
+		os.unlink(path)
+
+def test_deep():
+	depth = 100_000
+	tree, = parseString("(a " * depth + ")" * depth)
+	assert sum(1 for _ in tree.walk()) == depth
+
+def test_errors():
+	for source in ("(dir (file)", "(dir (@))", "(Dir)", "(dir (@ (size)))", "(dir ;; comment\n)", ")"):
+		try:
+			parseString(source)
+			assert False, f"Expected syntax error for: {source}"
+		except TreeSyntaxError as e:
+			assert e.line == 1
+
+def test_parsing_transparency():
+	TestUtils.ReparseExamples("tree.txto", "tree", parseString)
+
+def test_grammar():
+	from tlang.tree.parser import parseString as parseGrammar
+	for example in TestUtils.GetExamples("tree.txto", "tree") + [SOURCE]:
+		assert [str(_) for _ in parseString(example)] == [str(_) for _ in parseGrammar(example)]
+
+def test_differential():
+	# The same sources are fed to the reader, the event parser and the
+	# grammar, which are built on the same tokens.
+	from tlang.tree.parser import parseString as parseGrammar
+	parsers = (parseString, lambda _:list(buildTrees(parseEvents(_))), parseGrammar)
+	for source in CASES:
+		trees = [[str(_) for _ in parse(source)] for parse in parsers]
+		assert (source, trees[0]) == (source, trees[1]) == (source, trees[2])
+	for source in ERRORS:
+		for parse in parsers:
+			try:
+				parse(source)
+				assert False, f"Expected syntax error for: {source}"
+			except AssertionError:
+				raise
+			except Exception as e:
+				pass
+
+if __name__ == "__main__":
+	test_read()
+	test_events()
+	test_incremental()
+	test_chunks()
+	test_chunks_errors()
+	test_file()
+	test_deep()
+	test_errors()
+	test_parsing_transparency()
+	test_grammar()
+	test_differential()
+
+# EOF - vim: ts=4 sw=4 noet